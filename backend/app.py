@@ -11,8 +11,19 @@ from routes.teams import teams_bp
 from routes.timeoff import timeoff_bp
 from routes.regions import regions_bp
 from routes.timesheet import timesheet_bp
+from routes.availability import availability_bp
+from routes.assignments import assignments_bp
+from routes.metrics import metrics_bp
 from config import Config
+from db import (
+    PoolExhausted, database_busy_response, release_db, remember_recent_write, replace_pool_exhausted_errors
+)
 from extensions import mail
+from utils.booking_events import notify_booking_change
+from utils.search_cache import expire_search_cache
+from utils.auth_claims import expire_membership_version
+from utils.db_metrics import record_request_queries
+from routes.auth import refresh_auth_cookie
 import logging
 
 def create_app():
@@ -31,6 +42,7 @@ def create_app():
              "http://localhost:8080",    # Common dev server port
          ],
          allow_headers=["Content-Type", "Authorization", "X-API-Key"],
+         expose_headers=["ETag", "X-Sync-Token"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     )
 
@@ -46,13 +58,33 @@ def create_app():
     app.register_blueprint(timeoff_bp)
     app.register_blueprint(regions_bp)
     app.register_blueprint(timesheet_bp)
+    app.register_blueprint(availability_bp)
+    app.register_blueprint(assignments_bp)
+    app.register_blueprint(metrics_bp)
+    
+    # Wake open booking streams after requests that changed bookings
+    app.after_request(notify_booking_change)
+    # Send cached searches through revalidation after requests that bumped cache versions
+    app.after_request(expire_search_cache)
+    app.after_request(expire_membership_version)
+    # Reissue tokens whose team/region claims were outdated
+    app.after_request(refresh_auth_cookie)
+    # Read-your-writes: pin the session's reads to the primary after a write
+    app.after_request(remember_recent_write)
+    # Registered last so it runs first: an exhausted pool answers 503, not the route's error
+    app.after_request(replace_pool_exhausted_errors)
+    app.register_error_handler(PoolExhausted, database_busy_response)
+    # Return the request's database connection (if one was taken) to the pool
+    app.teardown_appcontext(release_db)
+    app.teardown_request(record_request_queries)
     
     app.config["MAIL_SERVER"] = Config.MAIL_SERVER
     app.config["MAIL_PORT"] = Config.MAIL_PORT
-    app.config["MAIL_USE_TLS"] = True
+    app.config["MAIL_USE_TLS"] = Config.SMTP_USE_TLS
     app.config["MAIL_USERNAME"] = Config.MAIL_USERNAME
     app.config["MAIL_PASSWORD"] = Config.MAIL_PASSWORD
     app.config["MAIL_DEFAULT_SENDER"] = Config.MAIL_DEFAULT_SENDER
+    app.config["MAIL_MAX_EMAILS"] = Config.SMTP_MAX_EMAILS_PER_CONNECTION
 
     mail.init_app(app)
     
@@ -0,0 +1,87 @@
+"""
+Benchmark: per-request auth overhead of the middleware.
+
+Compares a route behind @require_any_role with the verified-token cache
+bypassed (every request re-runs HS256 verification, as before) against the
+same route with the cache warm (a polling tab presenting the same cookie).
+An admin token is used so no membership claims have to be loaded.
+
+Needs the backend environment (.env) for config; no MySQL server is used.
+
+Usage (from backend/):
+    python -m benchmarks.auth_overhead [--requests 20000]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import types
+from datetime import datetime, timedelta
+
+# Keep db.py from creating a MySQL pool on import
+sys.modules.setdefault("db", types.SimpleNamespace(get_connection=None, get_db=None))
+
+import jwt  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from config import Config  # noqa: E402
+from utils.middleware import require_any_role, token_cache, verify_jwt_token  # noqa: E402
+
+Config.JWT_SECRET_KEY = Config.JWT_SECRET_KEY or "benchmark-secret"
+
+
+def make_token():
+    payload = {
+        'user_id': 1,
+        'role': 'admin',
+        'exp': datetime.utcnow() + timedelta(hours=24),
+        'iat': datetime.utcnow()
+    }
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+
+
+@require_any_role('admin', 'dispatcher')
+def view():
+    return "ok"
+
+
+def time_requests(app, token, count, warm):
+    """Microseconds spent in the decorated view per request (request context excluded)"""
+    timings = []
+    for _ in range(count):
+        with app.test_request_context("/api/bookings", headers={"Cookie": f"auth_token={token}"}):
+            if not warm:
+                token_cache.clear()
+            started = time.perf_counter()
+            view()
+            timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    token = make_token()
+
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        verify_jwt_token(token)
+    verify_us = (time.perf_counter() - started) * 1e6 / args.requests
+    print(f"verify_jwt_token alone: {verify_us:6.2f} us")
+
+    results = {}
+    for label, warm in (("verify every request", False), ("verified-token cache", True)):
+        timings = time_requests(app, token, args.requests, warm)
+        results[label] = statistics.median(timings)
+        print(f"  {label:<21} median {statistics.median(timings):6.2f} us   "
+              f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:6.2f} us")
+
+    print(f"  speedup: {results['verify every request'] / results['verified-token cache']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
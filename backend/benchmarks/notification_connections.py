@@ -0,0 +1,191 @@
+"""
+Benchmark: per-notification latency with a new SMTP session / Twilio client per
+message (as before) vs the reused connections of utils.notifier.
+
+Runs against local stubs started here: a minimal SMTP server and an HTTP
+server answering Twilio's Messages endpoint. Both wait --handshake-ms on every
+new connection, standing in for the TCP + TLS setup of the real providers.
+The stubs can also be run on their own (--serve) to point a development
+backend at them:
+
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_USE_TLS=false
+    TWILIO_API_URL=http://127.0.0.1:8025 FLASK_ENV=production
+
+Needs the backend environment (.env) for config; no MySQL server is used.
+
+Usage (from backend/):
+    python -m benchmarks.notification_connections [--messages 200] [--handshake-ms 40]
+    python -m benchmarks.notification_connections --serve
+"""
+
+import argparse
+import json
+import socketserver
+import statistics
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keep db.py from creating a MySQL pool on import
+sys.modules.setdefault("db", types.SimpleNamespace(get_connection=None, get_db=None))
+
+from flask import Flask  # noqa: E402
+from flask_mail import Message  # noqa: E402
+from twilio.rest import Client  # noqa: E402
+
+from config import Config  # noqa: E402
+from extensions import mail  # noqa: E402
+from utils import notifier  # noqa: E402
+
+SMTP_PORT = 2525
+HTTP_PORT = 8025
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Accepts every message; understands just enough SMTP for smtplib"""
+
+    handshake_seconds = 0.0
+    messages = 0
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        time.sleep(self.handshake_seconds)
+        self.reply("220 localhost SMTP stub")
+        for raw in self.rfile:
+            command = raw.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                SMTPStubHandler.messages += 1
+                self.reply("250 OK: queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class TwilioStubHandler(BaseHTTPRequestHandler):
+    """Answers POST .../Messages.json like Twilio; keeps connections alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+    handshake_seconds = 0.0
+    messages = 0
+
+    def setup(self):
+        time.sleep(self.handshake_seconds)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        TwilioStubHandler.messages += 1
+        body = json.dumps({"sid": f"SM{TwilioStubHandler.messages:032d}", "status": "queued"}).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stubs(handshake_seconds):
+    SMTPStubHandler.handshake_seconds = handshake_seconds
+    TwilioStubHandler.handshake_seconds = handshake_seconds
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    servers = [
+        socketserver.ThreadingTCPServer(("127.0.0.1", SMTP_PORT), SMTPStubHandler),
+        ThreadingHTTPServer(("127.0.0.1", HTTP_PORT), TwilioStubHandler),
+    ]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers
+
+
+def make_app():
+    Config.FLASK_ENV = "production"  # notifier only sends in production
+    Config.TWILIO_ACCOUNT_SID = "AC" + "0" * 32
+    Config.TWILIO_AUTH_TOKEN = "benchmark"
+    Config.TWILIO_PHONE_NUMBER = "+15550000000"
+    Config.TWILIO_API_URL = f"http://127.0.0.1:{HTTP_PORT}"
+
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=SMTP_PORT, MAIL_USE_TLS=False,
+        MAIL_DEFAULT_SENDER="dispatch@example.com",
+        MAIL_MAX_EMAILS=Config.SMTP_MAX_EMAILS_PER_CONNECTION
+    )
+    mail.init_app(app)
+    return app
+
+
+def email_per_message(index):
+    mail.send(Message(subject="Booking Confirmation", recipients=[f"customer{index}@example.com"],
+                      body="", html="<p>Your booking has been confirmed.</p>"))
+
+
+def email_reused(index):
+    assert notifier.send_email(f"customer{index}@example.com", "Booking Confirmation",
+                               "<p>Your booking has been confirmed.</p>")
+
+
+def sms_per_message(index):
+    client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
+    client.api.base_url = Config.TWILIO_API_URL
+    client.messages.create(body="Your booking has been confirmed.",
+                           from_=Config.TWILIO_PHONE_NUMBER, to=f"+1555{index:07d}")
+
+
+def sms_reused(index):
+    assert notifier.send_sms(f"+1555{index:07d}", "Your booking has been confirmed.")
+
+
+def time_sends(send, count):
+    """Milliseconds per send"""
+    timings = []
+    for index in range(count):
+        started = time.perf_counter()
+        send(index)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=40)
+    parser.add_argument("--serve", action="store_true", help="only run the stubs")
+    args = parser.parse_args()
+
+    start_stubs(args.handshake_ms / 1000)
+    if args.serve:
+        print(f"SMTP stub on 127.0.0.1:{SMTP_PORT}, Twilio stub on http://127.0.0.1:{HTTP_PORT} (Ctrl+C to stop)")
+        threading.Event().wait()
+
+    app = make_app()
+    with app.app_context():
+        for label, send in (("email, session per message", email_per_message),
+                            ("email, reused session", email_reused),
+                            ("sms, client per message", sms_per_message),
+                            ("sms, shared client", sms_reused)):
+            timings = time_sends(send, args.messages)
+            print(f"  {label:<27} median {statistics.median(timings):7.2f} ms   "
+                  f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.2f} ms")
+        notifier.smtp_connections.close()
+
+    print(f"  stubs received {SMTPStubHandler.messages} emails, {TwilioStubHandler.messages} sms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: agent search on a normal day vs a fully booked day.
+
+The old search ran its heavy query twice when nobody was available (strict
+query, then the fallback). The availability engine computes every agent's
+status in one pass, so a fully booked day should cost the same as a normal one.
+
+The engine is fed from an in-memory connection holding synthetic agents,
+timesheets, time-off and bookings, so no MySQL server is needed.
+
+Usage (from backend/):
+    python -m benchmarks.search_availability [--agents 2000] [--runs 200]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import types
+from datetime import date, timedelta
+
+# The engine refreshes through the connection it is handed; keep db.py from
+# creating a MySQL pool on import.
+sys.modules.setdefault("db", types.SimpleNamespace(get_connection=None, get_db=None))
+
+from utils.availability import AvailabilityEngine, DAYS_OF_WEEK, rank_search_results, week_scope  # noqa: E402
+
+SEARCH_DATE = date(2026, 10, 14)  # A Wednesday
+SEARCH_TIME = "14:00:00"
+ORIGIN = (43.65, -79.38)
+
+
+class InMemoryCursor:
+    """Answers the engine's refresh queries from a dict of synthetic tables"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.rows = []
+
+    def execute(self, query, params=()):
+        if "FROM cache_versions" in query:
+            self.rows = [{"scope": scope, "version": 1} for scope in params]
+        elif "FROM booking_sync_state" in query:
+            self.rows = [{"version": 1}]
+        elif "FROM field_agents" in query:
+            self.rows = self.tables["agents"]
+        elif "FROM timesheets" in query:
+            self.rows = self.tables["timesheets"]
+        elif "FROM time_off_requests" in query:
+            self.rows = self.tables["time_off"]
+        elif "FROM bookings" in query:
+            self.rows = self.tables["bookings"]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class InMemoryConnection:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def cursor(self, dictionary=True):
+        return InMemoryCursor(self.tables)
+
+    def commit(self):
+        pass
+
+
+def build_tables(agent_count, booked_share, seed=7):
+    """Synthetic week where booked_share of the agents already have a booking at SEARCH_TIME"""
+    rng = random.Random(seed)
+    agents, timesheets, time_off, bookings = [], [], [], []
+    for agent_id in range(1, agent_count + 1):
+        agents.append({
+            "agentId": agent_id,
+            "name": f"Agent {agent_id:05d}",
+            "team_id": agent_id % 10 + 1,
+            "region_id": agent_id % 3 + 1,
+            "latitude": ORIGIN[0] + rng.uniform(-1.5, 1.5),
+            "longitude": ORIGIN[1] + rng.uniform(-1.5, 1.5),
+        })
+        for day in DAYS_OF_WEEK[:5]:
+            for hour in (10, 12, 14, 16, 18):
+                timesheets.append({
+                    "agentId": agent_id, "status": "approved", "day_of_week": day,
+                    "start_time": timedelta(hours=hour), "end_time": timedelta(hours=hour + 2),
+                })
+        if agent_id % 50 == 0:
+            time_off.append({
+                "requestId": agent_id, "agentId": agent_id, "request_date": SEARCH_DATE,
+                "start_time": None, "end_time": None, "is_full_day": True,
+            })
+        if rng.random() < booked_share:
+            bookings.append({
+                "bookingId": agent_id, "agentId": agent_id, "booking_date": SEARCH_DATE,
+                "booking_time": timedelta(hours=14),
+            })
+    return {"agents": agents, "timesheets": timesheets, "time_off": time_off, "bookings": bookings}
+
+
+def time_searches(tables, runs):
+    """Per-search latency in milliseconds (engine warm, as in steady state)"""
+    engine = AvailabilityEngine()
+    conn = InMemoryConnection(tables)
+    engine.evaluate(conn, SEARCH_DATE, SEARCH_TIME, origin=ORIGIN)  # Initial load
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        agents = engine.evaluate(conn, SEARCH_DATE, SEARCH_TIME, origin=ORIGIN)
+        rank_search_results(agents, by_distance=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    available = sum(agent["availability_status"] == "available" for agent in agents)
+    return timings, available
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.agents} agents, {args.runs} searches per case, week {week_scope(SEARCH_DATE)}")
+    results = {}
+    for label, booked_share in (("normal day", 0.3), ("fully booked day", 1.0)):
+        timings, available = time_searches(build_tables(args.agents, booked_share), args.runs)
+        results[label] = statistics.median(timings)
+        print(f"  {label:<17} median {statistics.median(timings):7.2f} ms   "
+              f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.2f} ms   available {available}")
+
+    ratio = results["fully booked day"] / results["normal day"]
+    print(f"  fully booked / normal: {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,28 @@ class Config:
     MYSQL_DB = os.getenv("MYSQL_DB")
     MYSQL_POOL_NAME = "mypool"
     MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE"))
+    MYSQL_POOL_OVERFLOW = int(os.getenv("MYSQL_POOL_OVERFLOW", 4))  # Extra short-lived connections past the pool
+    MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", 3))  # Seconds a checkout may wait
+    MYSQL_POOL_MAX_WAITERS = int(os.getenv("MYSQL_POOL_MAX_WAITERS", 32))  # Checkouts allowed to wait at once
+
+    # Read replica for routes marked @read_only (db.py); unset keeps every read on the primary
+    MYSQL_REPLICA_HOST = os.getenv("MYSQL_REPLICA_HOST")
+    MYSQL_REPLICA_PORT = int(os.getenv("MYSQL_REPLICA_PORT", MYSQL_PORT))
+    MYSQL_REPLICA_USER = os.getenv("MYSQL_REPLICA_USER", MYSQL_USER)
+    MYSQL_REPLICA_PASSWORD = os.getenv("MYSQL_REPLICA_PASSWORD", MYSQL_PASSWORD)
+    MYSQL_REPLICA_DB = os.getenv("MYSQL_REPLICA_DB", MYSQL_DB)
+    MYSQL_REPLICA_POOL_SIZE = int(os.getenv("MYSQL_REPLICA_POOL_SIZE", MYSQL_POOL_SIZE))
+    READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))  # Reads stay on the primary after a write
+
+    # Deleted-booking tombstones kept for delta sync; older sync tokens get 410 and reload the full list
+    BOOKING_TOMBSTONE_RETENTION_DAYS = int(os.getenv("BOOKING_TOMBSTONE_RETENTION_DAYS", 30))
+
+    # Booking streams (GET /bookings/stream) each hold a gunicorn thread: keep the cap below --threads
+    BOOKING_STREAMS_PER_WORKER = int(os.getenv("BOOKING_STREAMS_PER_WORKER", 4))
+    BOOKING_STREAM_MAX_SECONDS = int(os.getenv("BOOKING_STREAM_MAX_SECONDS", 600))  # Then the client reconnects
+
+    DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))  # Logged with their EXPLAIN plan
+    DB_EXPLAIN_SLOW_QUERIES = os.getenv("DB_EXPLAIN_SLOW_QUERIES", "true").lower() == "true"
 
     # SMTP
     SMTP_HOST = os.getenv("SMTP_HOST")
@@ -20,11 +42,25 @@ class Config:
     SMTP_USER = os.getenv("SMTP_USER")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
     EMAIL_FROM = os.getenv("EMAIL_FROM")
+    SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"  # false for a local test SMTP server
+    SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 10))  # Connect and each SMTP command
+    SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS", 60))  # Reconnect instead of reusing older sessions
+    SMTP_MAX_EMAILS_PER_CONNECTION = int(os.getenv("SMTP_MAX_EMAILS_PER_CONNECTION", 100))
 
     # Twilio
     TWILIO_ACCOUNT_SID=os.getenv("TWILIO_ACCOUNT_SID")
     TWILIO_AUTH_TOKEN=os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_PHONE_NUMBER=os.getenv("TWILIO_PHONE_NUMBER")
+    TWILIO_API_URL = os.getenv("TWILIO_API_URL")  # e.g. a local HTTP stub for testing
+    TWILIO_HTTP_TIMEOUT = float(os.getenv("TWILIO_HTTP_TIMEOUT", 10))
+
+    # Provider guards (utils.provider_guard), enforced by the notification sender: divide by the number of senders
+    SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", 1))  # Twilio long code: 1 message per second
+    SMS_RATE_BURST = int(os.getenv("SMS_RATE_BURST", 5))
+    EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", 0.5))  # Office 365 SMTP: 30 messages per minute
+    EMAIL_RATE_BURST = int(os.getenv("EMAIL_RATE_BURST", 5))
+    NOTIFY_BREAKER_FAILURES = int(os.getenv("NOTIFY_BREAKER_FAILURES", 5))  # Consecutive failures that open the circuit
+    NOTIFY_BREAKER_RESET_SECONDS = float(os.getenv("NOTIFY_BREAKER_RESET_SECONDS", 30))
 
     # MAIL
     MAIL_SERVER = os.getenv("SMTP_HOST")
@@ -33,6 +69,25 @@ class Config:
     MAIL_PASSWORD = os.getenv("SMTP_PASSWORD")
     MAIL_DEFAULT_SENDER = os.getenv("SMTP_USER")
 
+    # Notification outbox sender (notification_sender.py)
+    NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", 4))  # Sending threads per channel
+    NOTIFY_OUTBOX_BATCH_SIZE = int(os.getenv("NOTIFY_OUTBOX_BATCH_SIZE", 50))
+    NOTIFY_OUTBOX_POLL_SECONDS = float(os.getenv("NOTIFY_OUTBOX_POLL_SECONDS", 2))
+    NOTIFY_OUTBOX_LEASE_SECONDS = int(os.getenv("NOTIFY_OUTBOX_LEASE_SECONDS", 300))  # Claimed rows retried after this
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 6))
+    NOTIFY_RETRY_BASE_SECONDS = int(os.getenv("NOTIFY_RETRY_BASE_SECONDS", 30))  # Doubled after each failed attempt
+    NOTIFY_RETRY_MAX_SECONDS = int(os.getenv("NOTIFY_RETRY_MAX_SECONDS", 3600))
+    # Booking notifications wait this long; only the latest per booking and recipient is sent (0: each at once)
+    NOTIFY_COALESCE_SECONDS = int(os.getenv("NOTIFY_COALESCE_SECONDS", 30))
+
     # JWT
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 86400))  # 24 hours in seconds
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 86400))  # 24 hours in seconds
+
+    # Password hashing (utils.passwords)
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))  # Per gunicorn worker
+    PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 4))  # Running + queued, per gunicorn worker
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+    PASSWORD_REHASH_WORKERS = int(os.getenv("PASSWORD_REHASH_WORKERS", os.cpu_count() or 2))  # Background rehash job
+    PASSWORD_REHASH_BATCH_SIZE = int(os.getenv("PASSWORD_REHASH_BATCH_SIZE", 200))
\ No newline at end of file
@@ -1,12 +1,159 @@
+import logging
+import re
+import threading
+import time
+from functools import wraps
+
 import mysql.connector
 from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from flask import g, jsonify, request
 from config import Config
+from utils.db_metrics import InstrumentedCursor, db_metrics
 
-# Create a connection pool once and reuse across requests
-db_pool = pooling.MySQLConnectionPool(
-    pool_name=Config.MYSQL_POOL_NAME,
-    pool_size=Config.MYSQL_POOL_SIZE,
-    pool_reset_session=True,
+logger = logging.getLogger(__name__)
+
+# Seconds clients are asked to wait before retrying a 503
+POOL_RETRY_AFTER_SECONDS = 1
+
+# Cookie holding the time until which the session's reads stay on the primary
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+WRITE_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+
+
+class PoolExhausted(Exception):
+    """No connection became available before the checkout deadline"""
+
+
+class PooledConnection:
+    """A checked-out connection; close() hands it back and wakes a waiting checkout"""
+
+    def __init__(self, pool, conn, overflow):
+        self._pool = pool
+        self._conn = conn
+        self._overflow = overflow
+
+    def cursor(self, instrumented=True, **options):
+        cursor = self._conn.cursor(**options)
+        return InstrumentedCursor(cursor) if instrumented else cursor
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if self._overflow:
+                conn.rollback()
+            conn.close()  # Pooled: reset and queued for reuse; overflow: disconnected
+        finally:
+            self._pool.checked_in(self._overflow)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """
+    MySQLConnectionPool with a bounded wait for a free connection.
+
+    A checkout that finds the pool empty opens one of up to `overflow`
+    short-lived extra connections, or else waits up to `timeout` seconds for a
+    connection to be returned. At most `max_waiters` checkouts wait at once;
+    past that, or when the deadline passes, PoolExhausted is raised.
+
+    Pooled connections are pinged on checkout (and reconnected if the server
+    dropped them) by MySQLConnectionPool itself.
+    """
+
+    def __init__(self, pool, connect_args, overflow=0, timeout=3.0, max_waiters=32):
+        self._pool = pool
+        self._connect_args = connect_args
+        self.overflow = overflow
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self._overflow_in_use = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._returns = 0  # Bumped on every check-in, so a return racing a failed checkout is not missed
+        self._available = threading.Condition()
+
+    def get_connection(self):
+        started = time.monotonic()
+        deadline = None
+        try:
+            while True:
+                with self._available:
+                    returns_seen = self._returns
+
+                conn = self._checkout()
+                if conn is not None:
+                    with self._available:
+                        self._in_use += 1
+                    db_metrics.record_checkout(time.monotonic() - started)
+                    return conn
+
+                with self._available:
+                    if self._returns != returns_seen:
+                        continue
+                    if deadline is None:
+                        if self._waiters >= self.max_waiters:
+                            db_metrics.record_checkout_timeout()
+                            raise PoolExhausted("Too many requests waiting for a database connection")
+                        self._waiters += 1
+                        deadline = time.monotonic() + self.timeout
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        db_metrics.record_checkout_timeout()
+                        raise PoolExhausted(f"No database connection available within {self.timeout:g}s")
+                    self._available.wait(remaining)
+        finally:
+            if deadline is not None:
+                with self._available:
+                    self._waiters -= 1
+
+    def checked_in(self, overflow):
+        with self._available:
+            self._in_use -= 1
+            if overflow:
+                self._overflow_in_use -= 1
+            self._returns += 1
+            self._available.notify()
+
+    def stats(self):
+        with self._available:
+            return {
+                "size": self._pool.pool_size,
+                "in_use": self._in_use,
+                "overflow_in_use": self._overflow_in_use,
+                "overflow_limit": self.overflow,
+                "waiting": self._waiters,
+                "max_waiters": self.max_waiters,
+                "timeout_seconds": self.timeout
+            }
+
+    def _checkout(self):
+        """A connection if one is free right now (pooled first, then overflow), else None"""
+        try:
+            return PooledConnection(self, self._pool.get_connection(), overflow=False)
+        except PoolError:
+            pass  # Pool exhausted
+
+        with self._available:
+            if self._overflow_in_use >= self.overflow:
+                return None
+            self._overflow_in_use += 1
+        try:
+            conn = mysql.connector.connect(**self._connect_args)
+        except Exception:
+            with self._available:
+                self._overflow_in_use -= 1
+                self._returns += 1
+                self._available.notify()
+            raise
+        return PooledConnection(self, conn, overflow=True)
+
+
+DB_SETTINGS = dict(
     host=Config.MYSQL_HOST,
     port=Config.MYSQL_PORT,
     user=Config.MYSQL_USER,
@@ -14,6 +161,239 @@ db_pool = pooling.MySQLConnectionPool(
     database=Config.MYSQL_DB
 )
 
+# Create a connection pool once and reuse across requests
+db_pool = ConnectionPool(
+    pooling.MySQLConnectionPool(
+        pool_name=Config.MYSQL_POOL_NAME,
+        pool_size=Config.MYSQL_POOL_SIZE,
+        pool_reset_session=True,
+        **DB_SETTINGS
+    ),
+    connect_args=DB_SETTINGS,
+    overflow=Config.MYSQL_POOL_OVERFLOW,
+    timeout=Config.MYSQL_POOL_TIMEOUT,
+    max_waiters=Config.MYSQL_POOL_MAX_WAITERS
+)
+
+# Optional read replica (None: read-only routes use the primary)
+replica_pool = None
+if Config.MYSQL_REPLICA_HOST:
+    REPLICA_SETTINGS = dict(
+        host=Config.MYSQL_REPLICA_HOST,
+        port=Config.MYSQL_REPLICA_PORT,
+        user=Config.MYSQL_REPLICA_USER,
+        password=Config.MYSQL_REPLICA_PASSWORD,
+        database=Config.MYSQL_REPLICA_DB
+    )
+    replica_pool = ConnectionPool(
+        pooling.MySQLConnectionPool(
+            pool_name=f"{Config.MYSQL_POOL_NAME}_replica",
+            pool_size=Config.MYSQL_REPLICA_POOL_SIZE,
+            pool_reset_session=True,
+            **REPLICA_SETTINGS
+        ),
+        connect_args=REPLICA_SETTINGS,
+        overflow=Config.MYSQL_POOL_OVERFLOW,
+        timeout=Config.MYSQL_POOL_TIMEOUT,
+        max_waiters=Config.MYSQL_POOL_MAX_WAITERS
+    )
+
 def get_connection():
-    """Get a connection from the pool."""
+    """Get a connection from the pool (raises PoolExhausted after the pool timeout)."""
     return db_pool.get_connection()
+
+
+class RequestCursor:
+    """Cursor of a RequestConnection; the pooled connection is taken on its first use"""
+
+    def __init__(self, connection, options):
+        self._connection = connection
+        self._options = options
+        self._cursor = None
+        self._source = None
+
+    def _open(self):
+        conn = self._connection.acquire()
+        if self._cursor is None or self._source is not conn:  # Reopen after an early release_db()
+            self._cursor = conn.cursor(**self._options)
+            self._source = conn
+        return self._cursor
+
+    def execute(self, operation, *args, **kwargs):
+        self._connection.note_statement(operation)
+        return self._open().execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        self._connection.note_statement(operation)
+        return self._open().executemany(operation, *args, **kwargs)
+
+    def close(self):
+        if self._cursor is not None and self._source is self._connection._conn:
+            self._cursor.close()
+        self._cursor = None
+
+    def __getattr__(self, name):
+        return getattr(self._open(), name)
+
+
+class RequestConnection:
+    """
+    The connection shared by everything that runs for one request.
+
+    Nothing is taken from the pool until the first query, so requests that are
+    rejected by validation or answered from a cache never touch it. close() is a
+    no-op; the connection goes back to the pool in the teardown hook
+    (release_db), rolling back anything left uncommitted.
+
+    is_replica tells callers the data may trail the primary by the replication lag.
+    """
+
+    def __init__(self, pool, is_replica=False):
+        self._pool = pool
+        self.is_replica = is_replica
+        self._conn = None
+
+    @property
+    def acquired(self):
+        return self._conn is not None
+
+    def acquire(self):
+        if self._conn is None:
+            try:
+                self._conn = self._pool.get_connection()
+            except PoolExhausted:
+                g.pool_exhausted = True  # Answered with 503 whatever the route made of it
+                raise
+        return self._conn
+
+    def cursor(self, **options):
+        return RequestCursor(self, options)
+
+    def note_statement(self, operation):
+        if not self.is_replica and WRITE_STATEMENT.match(operation):
+            g.db_wrote = True  # Keeps this session's reads on the primary for a while
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None:
+            self._conn.rollback()
+
+    def close(self):
+        pass  # Released at the end of the request
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception as e:
+            logger.warning(f"Rollback before returning a request connection failed: {e}")
+        finally:
+            conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self.acquire(), name)
+
+
+def get_db(read_only=None):
+    """
+    The current request's connection (see RequestConnection).
+
+    Read-only requests (routes marked @read_only, or read_only=True for a
+    block) get the replica when one is configured, unless the session wrote
+    within READ_YOUR_WRITES_SECONDS or the request already wrote.
+    """
+    if read_only is None:
+        read_only = g.get("db_read_only", False)
+    if read_only and replica_readable():
+        if "replica_db" not in g:
+            g.replica_db = RequestConnection(replica_pool, is_replica=True)
+        return g.replica_db
+    if "db" not in g:
+        g.db = RequestConnection(db_pool)
+    return g.db
+
+
+def replica_readable():
+    """Whether this request's reads may go to the replica (read-your-writes)"""
+    if replica_pool is None or g.get("db_wrote"):
+        return False
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) <= time.time()
+    except ValueError:
+        return True
+
+
+def read_only(f):
+    """Route decorator: run the route's queries on the read replica (see get_db)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def release_db(exception=None):
+    """
+    Return the request's connections to their pools (teardown hook).
+
+    Routes may also call it early, before slow work that needs no database;
+    the next query takes a connection again.
+    """
+    for name in ("db", "replica_db"):
+        db = g.get(name)
+        if db is not None:
+            db.release()
+
+
+def remember_recent_write(response):
+    """after_request hook: keep the session's reads on the primary after it wrote"""
+    if replica_pool is not None and g.get("db_wrote"):
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            str(time.time() + Config.READ_YOUR_WRITES_SECONDS),
+            max_age=Config.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            secure=False,
+            samesite='Lax'
+        )
+    return response
+
+
+def database_busy_response(error=None):
+    """503 asking the client to retry (PoolExhausted error handler)"""
+    response = jsonify({"success": False, "error": "Server busy, please retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(POOL_RETRY_AFTER_SECONDS)
+    return response
+
+
+def replace_pool_exhausted_errors(response):
+    """
+    after_request hook: routes turn exceptions into 500s (and the auth
+    decorators into 401s); when the cause was an exhausted pool, answer 503
+    with Retry-After instead.
+    """
+    if g.get("pool_exhausted") and response.status_code >= 400:
+        return database_busy_response()
+    return response
+
+
+def database_operation(f):
+    """Decorator to handle database connection and cleanup consistently"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            return f(cursor, conn, *args, **kwargs)
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+    return decorated_function
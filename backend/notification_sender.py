@@ -0,0 +1,120 @@
+"""
+Notification sender: delivers the notification_outbox (see utils.notification_outbox).
+
+Runs as its own process next to the web workers; any number of senders can
+run at once. Each channel (sms, email) has its own loop and NOTIFY_WORKERS
+sending threads, so a slow or failing provider never holds up the other one.
+A loop claims as many due notifications as its provider guard currently
+allows (see utils.provider_guard), sends them, records the results and, when
+nothing was due, sleeps NOTIFY_OUTBOX_POLL_SECONDS. While the provider's
+circuit is open the loop claims nothing. SIGTERM / SIGINT finish the current
+batches first.
+
+Usage (from backend/):
+    python notification_sender.py
+"""
+
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from config import Config
+from db import get_connection
+from utils.async_notifier import deliver_notification
+from utils.notification_outbox import claim_batch, record_results, row_notification
+from utils.provider_guard import provider_guards
+
+logger = logging.getLogger("notification_sender")
+
+
+class ChannelSender:
+    """Claim, send and record loop over one channel of the outbox"""
+
+    def __init__(self, app, channel, stopping, workers=Config.NOTIFY_WORKERS,
+                 batch_size=Config.NOTIFY_OUTBOX_BATCH_SIZE, poll_seconds=Config.NOTIFY_OUTBOX_POLL_SECONDS):
+        self.app = app
+        self.channel = channel
+        self.guard = provider_guards[channel]
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._stopping = stopping
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"outbox-{channel}")
+
+    def _send(self, row):
+        """(row, error) with error None when the provider accepted the notification"""
+        try:
+            with self.app.app_context():  # Flask-Mail
+                if deliver_notification(row_notification(row)):
+                    return row, None
+            return row, f"{row['channel']} provider did not accept the notification"
+        except Exception as e:  # Including ProviderUnavailable: deferred
+            return row, e
+
+    def run_once(self):
+        """Deliver one batch; returns the seconds to wait before the next one"""
+        wait = self.guard.wait_time()
+        if wait:
+            return min(wait, self.poll_seconds)
+
+        conn = get_connection()
+        try:
+            rows = claim_batch(conn, self.channel, limit=min(self.batch_size, max(self.guard.available(), 1)))
+            if not rows:
+                return self.poll_seconds
+            results = list(self._executor.map(self._send, rows))
+            sent, retried, failed, deferred = record_results(conn, results)
+            logger.info(f"Outbox {self.channel} batch: {sent} sent, {retried} to retry, "
+                        f"{failed} failed, {deferred} deferred")
+            return 0
+        finally:
+            conn.close()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                wait = self.run_once()
+            except Exception:
+                logger.exception(f"Notification sender {self.channel} batch failed")
+                wait = self.poll_seconds
+            if wait:
+                self._stopping.wait(wait)
+        self._executor.shutdown(wait=True)
+
+
+class NotificationSender:
+    """One ChannelSender thread per channel"""
+
+    def __init__(self, app):
+        self._stopping = threading.Event()
+        self.channels = [ChannelSender(app, channel, self._stopping) for channel in provider_guards]
+
+    def stop(self, *_):
+        logger.info("Stopping after the current batches")
+        self._stopping.set()
+
+    def run(self):
+        logger.info("Notification sender started")
+        threads = [
+            threading.Thread(target=channel.run, name=f"outbox-{channel.channel}-loop")
+            for channel in self.channels
+        ]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)  # Short joins keep the main thread free for signals
+        logger.info("Notification sender stopped")
+
+
+def main():
+    app = create_app()
+    sender = NotificationSender(app)
+    signal.signal(signal.SIGTERM, sender.stop)
+    signal.signal(signal.SIGINT, sender.stop)
+    sender.run()
+
+
+if __name__ == "__main__":
+    main()
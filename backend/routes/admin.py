@@ -1,20 +1,12 @@
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_db, read_only
 from utils.middleware import require_auth
-import bcrypt
+from utils.booking_sync import mark_bookings_changed
+from utils.cache_versions import bump_cache_versions
+from utils.passwords import PasswordServiceBusy, hash_password, password_service_busy_response
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api")
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
 @admin_bp.route("/admins", methods=["GET"])
 @require_auth
 def get_admins():
@@ -23,7 +15,7 @@ def get_admins():
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -47,7 +39,6 @@ def get_admins():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/admins/<int:admin_id>", methods=["GET"])
 @require_auth
@@ -57,7 +48,7 @@ def get_admin(admin_id):
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -83,7 +74,6 @@ def get_admin(admin_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/admins", methods=["POST"])
 @require_auth
@@ -104,7 +94,7 @@ def create_admin():
         # Hash the password
         hashed_password = hash_password(password)
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if email already exists
@@ -141,13 +131,16 @@ def create_admin():
             "data": admin
         }), 201
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals(): conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/admins/<int:admin_id>", methods=["PUT"])
 @require_auth
@@ -165,7 +158,10 @@ def update_admin(admin_id):
         if not name and not email and not password:
             return jsonify({"success": False, "error": "At least one field (name, email, password) is required"}), 400
 
-        conn = get_connection()
+        # Hash a new password before any query, so no checked-out connection waits on bcrypt
+        hashed_password = hash_password(password) if password else None
+
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if admin exists
@@ -190,8 +186,7 @@ def update_admin(admin_id):
             update_fields.append("email = %s")
             update_values.append(email)
 
-        if password:
-            hashed_password = hash_password(password)
+        if hashed_password:
             update_fields.append("password = %s")
             update_values.append(hashed_password)
 
@@ -223,13 +218,16 @@ def update_admin(admin_id):
             "data": admin
         }), 200
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals(): conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/admins/<int:admin_id>", methods=["DELETE"])
 @require_auth
@@ -239,7 +237,7 @@ def delete_admin(admin_id):
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if admin exists
@@ -268,7 +266,6 @@ def delete_admin(admin_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/users/<int:user_id>/switch-role", methods=["PUT"])
 @require_auth
@@ -292,7 +289,7 @@ def switch_user_role(user_id):
         if current_role not in valid_roles or target_role not in valid_roles:
             return jsonify({"success": False, "error": f"Invalid role. Valid roles: {', '.join(valid_roles)}"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Map roles to their respective tables and ID fields
@@ -344,6 +341,14 @@ def switch_user_role(user_id):
 
         new_user_id = cursor.lastrowid
 
+        # Bookings assigned to the old account become unassigned; team membership moves
+        if current_table == 'field_agents':
+            mark_bookings_changed(cursor, "agentId = %s", (user_id,), extra_scopes=["teams", "agents", "membership"])
+        elif current_table == 'dispatchers':
+            mark_bookings_changed(cursor, "dispatcherId = %s", (user_id,), extra_scopes=["teams", "agents", "membership"])
+        else:
+            bump_cache_versions(cursor, ["teams", "agents", "membership"])
+
         # Delete user from current table
         cursor.execute(f"DELETE FROM {current_table} WHERE {current_id_field} = %s", (user_id,))
 
@@ -381,17 +386,17 @@ def switch_user_role(user_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @admin_bp.route("/users/all-roles", methods=["GET"])
 @require_auth
+@read_only
 def get_all_users_with_roles():
     """Get all users from all tables with their roles (admin access only)"""
     try:
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         all_users = []
@@ -439,4 +444,3 @@ def get_all_users_with_roles():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
\ No newline at end of file
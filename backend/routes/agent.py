@@ -1,16 +1,12 @@
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_db, release_db
 from utils.middleware import require_auth, require_dispatcher, require_admin
-import bcrypt
+from utils.booking_sync import mark_bookings_changed
+from utils.cache_versions import bump_cache_versions
+from utils.passwords import PasswordServiceBusy, hash_password, password_service_busy_response
 
 agent_bp = Blueprint("agent", __name__, url_prefix="/api")
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
 def serialize_agent_timestamps(agent):
     """Convert agent timestamps to ISO format for JSON serialization"""
     if agent.get('created_time'):
@@ -24,7 +20,7 @@ def serialize_agent_timestamps(agent):
 def get_agents():
     """Get all agents (dispatcher/admin access) or current agent info"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         if request.role == 'field_agent':
@@ -59,7 +55,6 @@ def get_agents():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @agent_bp.route("/agents/<int:agent_id>", methods=["GET"])
@@ -67,7 +62,7 @@ def get_agents():
 def get_agent(agent_id):
     """Get a specific agent by ID"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Agents can only see their own info
@@ -92,7 +87,6 @@ def get_agent(agent_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @agent_bp.route("/agents", methods=["POST"])
@@ -119,10 +113,11 @@ def create_agent():
         if not name or not email:
             return jsonify({"success": False, "error": "Missing required fields: name, email"}), 400
 
-        # Hash the password
+        # Hash the password before any query; a claims refresh may already hold a connection
+        release_db()
         hashed_password = hash_password(password)
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if email already exists
@@ -157,6 +152,7 @@ def create_agent():
         """, (name, email, hashed_password, phone, status, location_id))
 
         agent_id = cursor.lastrowid
+        bump_cache_versions(cursor, ["agents"])  # Search roster
         conn.commit()
 
         # Fetch the created agent (excluding password)
@@ -175,13 +171,16 @@ def create_agent():
             "data": agent
         }), 201
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals(): conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @agent_bp.route("/agents/<int:agent_id>", methods=["PUT"])
@@ -191,13 +190,19 @@ def update_agent(agent_id):
     try:
         data = request.get_json()
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Agents can only update their own info
         if request.role == 'field_agent' and request.user_id != agent_id:
             return jsonify({"success": False, "error": "Access denied"}), 403
 
+        # Hash a new password before any query; a claims refresh may already hold a connection
+        hashed_password = None
+        if data.get("password"):
+            release_db()
+            hashed_password = hash_password(data["password"])
+
         # Check if agent exists
         cursor.execute("SELECT agentId FROM field_agents WHERE agentId = %s", (agent_id,))
         if not cursor.fetchone():
@@ -256,8 +261,7 @@ def update_agent(agent_id):
             update_fields.append("status = %s")
             update_values.append(data["status"])
 
-        if data.get("password"):
-            hashed_password = hash_password(data["password"])
+        if hashed_password:
             update_fields.append("password = %s")
             update_values.append(hashed_password)
 
@@ -275,6 +279,13 @@ def update_agent(agent_id):
         # Execute update
         update_query = f"UPDATE field_agents SET {', '.join(update_fields)} WHERE agentId = %s"
         cursor.execute(update_query, update_values)
+
+        # Booking lists show the agent's name; team lists show their contact details and status
+        if data.get("name"):
+            mark_bookings_changed(cursor, "agentId = %s", (agent_id,), extra_scopes=["teams", "agents"])
+        else:
+            bump_cache_versions(cursor, ["teams", "agents"])
+
         conn.commit()
 
         # Fetch updated agent (excluding password)
@@ -293,13 +304,16 @@ def update_agent(agent_id):
             "data": agent
         }), 200
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals(): conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @agent_bp.route("/agents/<int:agent_id>", methods=["DELETE"])
@@ -307,7 +321,7 @@ def update_agent(agent_id):
 def delete_agent(agent_id):
     """Delete an agent (admin access only)"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if agent exists and get details for response
@@ -331,6 +345,9 @@ def delete_agent(agent_id):
                 "error": "Cannot delete agent with active bookings. Please reassign or complete bookings first."
             }), 400
 
+        # Bookings still referencing the agent become unassigned
+        mark_bookings_changed(cursor, "agentId = %s", (agent_id,), extra_scopes=["teams", "agents", "membership"])
+
         # Delete the agent (SET NULL will handle bookings reference)
         cursor.execute("DELETE FROM field_agents WHERE agentId = %s", (agent_id,))
         conn.commit()
@@ -346,7 +363,6 @@ def delete_agent(agent_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 # Legacy route for backward compatibility
@@ -366,7 +382,7 @@ def update_agent_status():
         if not agent_id or not booking_id or not new_status:
             return jsonify({"success": False, "error": "Missing required fields"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Update agent status
@@ -375,6 +391,7 @@ def update_agent_status():
             SET status = %s
             WHERE agentId = %s
         """, (new_status, agent_id))
+        bump_cache_versions(cursor, ["teams"])  # Team lists show agent status
 
         # Fetch customer details
         cursor.execute("""
@@ -397,4 +414,3 @@ def update_agent_status():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
@@ -0,0 +1,229 @@
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from db import get_db
+from utils.middleware import require_any_role
+from utils.availability import availability_engine, minute_of_day, APPOINTMENT_MINUTES
+from utils.assignment import plan_assignments, travel_cost
+from utils.booking_sync import mark_bookings_changed
+
+assignments_bp = Blueprint("assignments", __name__, url_prefix="/api")
+
+
+def format_minute(minute):
+    """'HH:MM:00' for a minute of the day"""
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
+
+
+def get_unassigned_bookings(cursor, booking_date, region_id=None, visible_region_id=None, booking_ids=None):
+    """Bookings on the date with neither an agent nor a dispatcher, with the customer's coordinates"""
+    where_conditions = ["b.booking_date = %s", "b.agentId IS NULL", "b.dispatcherId IS NULL"]
+    params = [booking_date]
+
+    if visible_region_id is not None:
+        # Same visibility as the dispatcher's booking list: their region or global
+        where_conditions.append("(b.region_id = %s OR r.is_global = TRUE)")
+        params.append(visible_region_id)
+    if region_id is not None:
+        where_conditions.append("b.region_id = %s")
+        params.append(region_id)
+    if booking_ids is not None:
+        where_conditions.append(f"b.bookingId IN ({', '.join(['%s'] * len(booking_ids))})")
+        params.extend(booking_ids)
+
+    cursor.execute(f"""
+        SELECT b.bookingId, b.booking_time, b.booking_type, c.name AS customer_name,
+               l.latitude, l.longitude
+        FROM bookings b
+        JOIN customers c ON b.customerId = c.customerId
+        LEFT JOIN locations l ON c.location_id = l.id
+        LEFT JOIN regions r ON b.region_id = r.regionId
+        WHERE {' AND '.join(where_conditions)}
+        ORDER BY b.booking_time, b.bookingId
+    """, params)
+    bookings = cursor.fetchall()
+    for booking in bookings:
+        booking["minute"] = minute_of_day(booking["booking_time"])
+    return bookings
+
+
+def get_available_agents(conn, booking_date, bookings, team_id):
+    """Agents available at each start minute used by the bookings"""
+    minutes = sorted({booking["minute"] for booking in bookings})
+    if not minutes:
+        return {}
+    slots = availability_engine.available_by_slot(conn, [booking_date], team_id=team_id, slot_minutes=minutes)
+    return dict(zip(minutes, slots[booking_date]))
+
+
+def validate_plan(plan, bookings, available):
+    """
+    Check a previewed plan against current state.
+
+    Returns:
+        tuple: (assignments as (booking, agent, distance), error message or None)
+    """
+    bookings_by_id = {booking["bookingId"]: booking for booking in bookings}
+    assignments, given = [], {}
+    for entry in plan:
+        booking = bookings_by_id.get(entry["bookingId"])
+        if booking is None:
+            return None, f"Booking {entry['bookingId']} is no longer unassigned"
+        agent = next((agent for agent in available.get(booking["minute"], [])
+                      if agent.agent_id == entry["agentId"]), None)
+        if agent is None:
+            return None, f"Agent {entry['agentId']} is no longer available for booking {booking['bookingId']}"
+        distance = travel_cost(booking, agent)
+        if distance is None:
+            return None, f"Agent {agent.agent_id} has no location for physical booking {booking['bookingId']}"
+        if any(abs(booking["minute"] - other) <= APPOINTMENT_MINUTES for other in given.get(agent.agent_id, [])):
+            return None, f"Agent {agent.agent_id} is given overlapping bookings"
+        given.setdefault(agent.agent_id, []).append(booking["minute"])
+        assignments.append((booking, agent, distance))
+    return assignments, None
+
+
+def commit_assignments(cursor, assignments):
+    """
+    Apply assignments in the current transaction.
+
+    Returns:
+        str or None: conflict message (the caller rolls back), None on success
+    """
+    for booking, agent, _ in assignments:
+        # Guarded: only bookings that are still unassigned
+        cursor.execute("""
+            UPDATE bookings SET agentId = %s, dispatcherId = NULL
+            WHERE bookingId = %s AND agentId IS NULL AND dispatcherId IS NULL
+        """, (agent.agent_id, booking["bookingId"]))
+        if cursor.rowcount == 0:
+            return f"Booking {booking['bookingId']} was assigned by someone else"
+
+    booking_ids = [booking["bookingId"] for booking, _, _ in assignments]
+    placeholders = ", ".join(["%s"] * len(booking_ids))
+
+    # Bookings made meanwhile for the same agents within two hours of an assignment
+    cursor.execute(f"""
+        SELECT b.bookingId, b.agentId
+        FROM bookings b
+        JOIN bookings other ON other.agentId = b.agentId
+            AND other.booking_date = b.booking_date
+            AND other.bookingId != b.bookingId
+            AND other.booking_time BETWEEN SUBTIME(b.booking_time, '02:00:00') AND ADDTIME(b.booking_time, '02:00:00')
+        WHERE b.bookingId IN ({placeholders}) AND other.bookingId NOT IN ({placeholders})
+        LIMIT 1
+    """, booking_ids + booking_ids)
+    conflict = cursor.fetchone()
+    if conflict:
+        return f"Agent {conflict['agentId']} was booked meanwhile for a time overlapping booking {conflict['bookingId']}"
+
+    mark_bookings_changed(cursor, f"bookingId IN ({placeholders})", booking_ids)
+    return None
+
+
+@assignments_bp.route("/assignments/optimize", methods=["POST"])
+@require_any_role('dispatcher', 'admin')
+def optimize_assignments():
+    """
+    Assign all unassigned bookings on a date to available agents, minimising
+    total travel distance under the same availability rules as search.
+
+    Body:
+        booking_date: date to optimise (YYYY-MM-DD)
+        region_id: only bookings in this region (optional)
+        team_id: only agents of this team (optional; dispatchers always use their own team)
+        commit: apply the assignments (default false: preview only)
+        assignments: [{bookingId, agentId}] from a preview to commit as-is (optional);
+            without it, commit applies a freshly computed plan
+
+    A commit runs in one transaction and answers 409 when the plan no longer holds.
+    """
+    try:
+        data = request.get_json() or {}
+
+        try:
+            booking_date = datetime.strptime(data.get("booking_date") or "", '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"success": False, "error": "booking_date is required (YYYY-MM-DD)"}), 400
+
+        region_id = data.get("region_id")
+        team_id = data.get("team_id")
+        plan = data.get("assignments")
+        commit = bool(data.get("commit"))
+        if region_id is not None and not isinstance(region_id, int):
+            return jsonify({"success": False, "error": "region_id must be an integer"}), 400
+        if team_id is not None and not isinstance(team_id, int):
+            return jsonify({"success": False, "error": "team_id must be an integer"}), 400
+        if plan is not None and (
+            not isinstance(plan, list) or not plan
+            or not all(isinstance(entry, dict) and isinstance(entry.get("bookingId"), int)
+                       and isinstance(entry.get("agentId"), int) for entry in plan)
+            or len({entry["bookingId"] for entry in plan}) != len(plan)
+        ):
+            return jsonify({"success": False, "error": "assignments must be a non-empty list of unique {bookingId, agentId}"}), 400
+
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+
+        # Dispatchers work on their own team's agents and the bookings they can see
+        visible_region_id = None
+        if request.role == 'dispatcher':
+            if request.team_id is None:
+                return jsonify({"success": False, "error": "You must be assigned to a team to optimize assignments"}), 400
+            if team_id is not None and team_id != request.team_id:
+                return jsonify({"success": False, "error": "Access denied to this team"}), 403
+            team_id = request.team_id
+            visible_region_id = request.region_id
+
+        booking_ids = [entry["bookingId"] for entry in plan] if plan else None
+        bookings = get_unassigned_bookings(cursor, booking_date, region_id, visible_region_id, booking_ids)
+        available = get_available_agents(conn, booking_date, bookings, team_id)
+
+        if plan is not None:
+            assignments, error = validate_plan(plan, bookings, available)
+            if error:
+                return jsonify({"success": False, "error": error}), 409
+            unassigned = []
+        else:
+            assignments, unassigned = plan_assignments(bookings, available)
+
+        if commit and assignments:
+            error = commit_assignments(cursor, assignments)
+            if error:
+                conn.rollback()
+                return jsonify({"success": False, "error": error}), 409
+            conn.commit()
+
+        return jsonify({
+            "success": True,
+            "booking_date": booking_date.isoformat(),
+            "committed": commit,
+            "assignments": [
+                {
+                    "bookingId": booking["bookingId"],
+                    "booking_time": format_minute(booking["minute"]),
+                    "customer_name": booking["customer_name"],
+                    "agentId": agent.agent_id,
+                    "agent_name": agent.name,
+                    "distance": distance if booking["booking_type"] != "virtual" else None,
+                }
+                for booking, agent, distance in assignments
+            ],
+            "unassigned": [
+                {
+                    "bookingId": booking["bookingId"],
+                    "booking_time": format_minute(booking["minute"]),
+                    "customer_name": booking["customer_name"],
+                }
+                for booking in unassigned
+            ],
+            "total_distance_km": round(sum(distance for _, _, distance in assignments), 1),
+        }), 200
+
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
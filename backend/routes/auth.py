@@ -1,32 +1,52 @@
-from flask import Blueprint, request, jsonify, make_response
-from db import get_connection
+from flask import Blueprint, request, jsonify, make_response, g
+from db import get_db, release_db
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 from config import Config
+from utils.auth_claims import membership_version
+from utils.passwords import (
+    PasswordServiceBusy, hash_password, verify_password, password_service_busy_response
+)
+from utils.password_rehash import password_rehash_job
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api")
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+def generate_jwt_token(user_id: int, role: str, claims: dict = None, expires_at: datetime = None) -> str:
+    """
+    Generate a JWT token for a user.
 
-def generate_jwt_token(user_id: int, role: str) -> str:
-    """Generate a JWT token for a user"""
+    claims (team_id, region_id and the membership version mv they were read
+    at, see utils.auth_claims) are embedded when given.
+    """
     payload = {
         'user_id': user_id,
         'role': role,
-        'exp': datetime.utcnow() + timedelta(hours=24),  # Token expires in 24 hours
+        'exp': expires_at or datetime.utcnow() + timedelta(hours=24),  # Token expires in 24 hours
         'iat': datetime.utcnow()  # Issued at time
     }
+    if claims:
+        payload.update({key: claims[key] for key in ('team_id', 'region_id', 'mv')})
     return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
 
+def refresh_auth_cookie(response):
+    """after_request hook: replace a token whose team/region claims were outdated"""
+    refreshed = g.get("refreshed_claims")
+    if not refreshed or 'auth_token' in response.headers.get('Set-Cookie', ''):
+        return response
+
+    payload, claims = refreshed
+    expires_at = datetime.utcfromtimestamp(payload['exp'])  # Keep the original expiry
+    token = generate_jwt_token(payload['user_id'], payload['role'], claims, expires_at)
+    response.set_cookie(
+        'auth_token',
+        token,
+        max_age=max(int((expires_at - datetime.utcnow()).total_seconds()), 0),
+        httponly=True,
+        secure=False,
+        samesite='Lax'
+    )
+    return response
+
 def verify_jwt_token(token: str) -> dict:
     """Verify and decode a JWT token"""
     try:
@@ -55,9 +75,6 @@ def login():
         if role not in ['dispatcher', 'field_agent', 'admin']:
             return jsonify({"success": False, "error": "Invalid role"}), 400
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
         # Define table and ID column mapping based on role
         role_config = {
             'dispatcher': {'table': 'dispatchers', 'id_column': 'dispatcherId'},
@@ -66,15 +83,34 @@ def login():
         }
 
         config = role_config[role]
-        
-        # Query the appropriate table based on role
-        query = f"SELECT {config['id_column']}, password FROM {config['table']} WHERE email = %s"
+
+        # Version first: a membership change made meanwhile bumps past it
+        membership = membership_version.current()
+
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+
+        # One lookup on the unique email index, team/region claims included
+        if role == 'admin':
+            query = "SELECT adminId, password, NULL AS team_id, NULL AS region_id FROM admins WHERE email = %s"
+        else:
+            query = f"""
+                SELECT u.{config['id_column']}, u.password, u.team_id, t.region_id
+                FROM {config['table']} u
+                LEFT JOIN teams t ON u.team_id = t.teamId
+                WHERE u.email = %s
+            """
         cursor.execute(query, (email,))
         user = cursor.fetchone()
-        
+
+        # Hand the connection back before the (slow) password check
+        cursor.close()
+        release_db()
+
         if user and verify_password(password, user['password']):
             user_id = user[config['id_column']]
-            token = generate_jwt_token(user_id, role)
+            claims = {'mv': membership, 'team_id': user['team_id'], 'region_id': user['region_id']}
+            token = generate_jwt_token(user_id, role, claims)
             response = make_response(jsonify({
                 "success": True,
                 "id": user_id,
@@ -93,12 +129,14 @@ def login():
 
         return jsonify({"success": False, "error": f"Invalid credentials for {role}"}), 401
 
+    except PasswordServiceBusy as e:
+        return password_service_busy_response(e)
+
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 @auth_bp.route("/logout", methods=["POST"])
 def logout():
@@ -155,7 +193,7 @@ def reset_password():
         if role not in ['dispatcher', 'field_agent', 'admin']:
             return jsonify({"success": False, "error": "Invalid role"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Define table and ID column mapping based on role
@@ -175,6 +213,10 @@ def reset_password():
         if not user:
             return jsonify({"success": False, "error": f"User not found with email {email}"}), 404
 
+        # Hand the connection back before the (slow) password check and hash, as login does
+        cursor.close()
+        release_db()
+
         # Verify old password
         if not verify_password(old_password, user['password']):
             return jsonify({"success": False, "error": "Invalid old password"}), 401
@@ -182,20 +224,26 @@ def reset_password():
         # Hash the new password
         hashed_new_password = hash_password(new_password)
         
-        # Update password
-        update_query = f"UPDATE {config['table']} SET password = %s WHERE email = %s"
-        cursor.execute(update_query, (hashed_new_password, email))
+        # Update password, unless it changed while the connection was released
+        update_query = f"UPDATE {config['table']} SET password = %s WHERE email = %s AND password = %s"
+        cursor.execute(update_query, (hashed_new_password, email, user['password']))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return jsonify({"success": False, "error": "Password was changed meanwhile, please retry"}), 409
         conn.commit()
 
         return jsonify({"success": True, "message": "Password reset successfully"}), 200
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals(): conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 # Utility function to create hashed passwords for existing users
 @auth_bp.route("/hash-existing-passwords", methods=["POST"])
@@ -203,57 +251,29 @@ def hash_existing_passwords():
     """
     One-time utility to hash existing plain text passwords.
     Remove this endpoint after running once in production!
+
+    Starts (or resumes) the background rehash job and returns right away;
+    poll GET /hash-existing-passwords/status for progress. Send
+    {"restart": true} to walk every table again from the start.
     """
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        data = request.get_json(silent=True) or {}
+        started = password_rehash_job.start(restart=bool(data.get("restart")))
+        status = password_rehash_job.status()
 
-        # Hash dispatcher passwords
-        cursor.execute("SELECT dispatcherId, password FROM dispatchers")
-        dispatchers = cursor.fetchall()
-        
-        for dispatcher in dispatchers:
-            if len(dispatcher['password']) < 50:  # Assume it's not hashed if less than 50 chars
-                hashed_pwd = hash_password(dispatcher['password'])
-                cursor.execute(
-                    "UPDATE dispatchers SET password = %s WHERE dispatcherId = %s",
-                    (hashed_pwd, dispatcher['dispatcherId'])
-                )
-
-        # Hash agent passwords
-        cursor.execute("SELECT agentId, password FROM field_agents")
-        agents = cursor.fetchall()
-        
-        for agent in agents:
-            if len(agent['password']) < 50:  # Assume it's not hashed if less than 50 chars
-                hashed_pwd = hash_password(agent['password'])
-                cursor.execute(
-                    "UPDATE field_agents SET password = %s WHERE agentId = %s",
-                    (hashed_pwd, agent['agentId'])
-                )
-
-        # Hash admin passwords (if admin table exists)
-        try:
-            cursor.execute("SELECT adminId, password FROM admins")
-            admins = cursor.fetchall()
-            
-            for admin in admins:
-                if len(admin['password']) < 50:  # Assume it's not hashed if less than 50 chars
-                    hashed_pwd = hash_password(admin['password'])
-                    cursor.execute(
-                        "UPDATE admins SET password = %s WHERE adminId = %s",
-                        (hashed_pwd, admin['adminId'])
-                    )
-        except Exception as e:
-            print(f"Admin table may not exist: {e}")
+        if not started:
+            return jsonify({"success": False, "error": "Password rehash already in progress", **status}), 409
 
-        conn.commit()
-        return jsonify({"success": True, "message": "Passwords hashed successfully"}), 200
+        return jsonify({"success": True, "message": "Password rehash started", **status}), 202
 
     except Exception as e:
-        if 'conn' in locals(): conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-    finally:
-        if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
\ No newline at end of file
+@auth_bp.route("/hash-existing-passwords/status", methods=["GET"])
+def hash_existing_passwords_status():
+    """Progress of the password rehash job"""
+    try:
+        return jsonify({"success": True, **password_rehash_job.status()}), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
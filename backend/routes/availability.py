@@ -0,0 +1,84 @@
+from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+from db import get_db
+from utils.middleware import require_any_role
+from utils.availability import availability_engine, SLOT_START_MINUTES, APPOINTMENT_MINUTES
+
+availability_bp = Blueprint("availability", __name__, url_prefix="/api")
+
+DEFAULT_RANGE_DAYS = 7
+MAX_RANGE_DAYS = 28
+
+
+@availability_bp.route("/availability", methods=["GET"])
+@require_any_role('dispatcher', 'admin')
+def get_availability():
+    """
+    Available agents for every two-hour slot between `from` and `to` (inclusive).
+
+    Query params:
+        from: first date (YYYY-MM-DD, defaults to today)
+        to: last date (YYYY-MM-DD, defaults to a week from `from`)
+        team_id: only agents of this team (dispatchers always get their own team)
+        region_id: only agents whose team is in this region
+
+    Each day carries per-slot arrays aligned with the top-level `slots` list.
+    """
+    try:
+        try:
+            from_date = request.args.get("from")
+            from_date = datetime.strptime(from_date, '%Y-%m-%d').date() if from_date else datetime.now().date()
+            to_date = request.args.get("to")
+            to_date = (datetime.strptime(to_date, '%Y-%m-%d').date() if to_date
+                       else from_date + timedelta(days=DEFAULT_RANGE_DAYS - 1))
+        except ValueError:
+            return jsonify({"success": False, "error": "from and to must be dates (YYYY-MM-DD)"}), 400
+
+        if to_date < from_date:
+            return jsonify({"success": False, "error": "to must not be before from"}), 400
+        if (to_date - from_date).days + 1 > MAX_RANGE_DAYS:
+            return jsonify({"success": False, "error": f"Date range cannot exceed {MAX_RANGE_DAYS} days"}), 400
+
+        team_id = request.args.get("team_id", type=int)
+        region_id = request.args.get("region_id", type=int)
+        if "team_id" in request.args and team_id is None:
+            return jsonify({"success": False, "error": "team_id must be an integer"}), 400
+        if "region_id" in request.args and region_id is None:
+            return jsonify({"success": False, "error": "region_id must be an integer"}), 400
+
+        # Dispatchers only see agents in their own team
+        if request.role == 'dispatcher':
+            if team_id is not None and team_id != request.team_id:
+                return jsonify({"success": False, "error": "Access denied to this team"}), 403
+            team_id = request.team_id
+            if team_id is None:
+                return jsonify({"success": False, "error": "You must be assigned to a team to view availability"}), 400
+
+        conn = get_db()
+
+        days = [from_date + timedelta(days=offset) for offset in range((to_date - from_date).days + 1)]
+        available = {
+            day: [[agent.agent_id for agent in agents] for agents in slots]
+            for day, slots in availability_engine.available_by_slot(
+                conn, days, team_id=team_id, region_id=region_id
+            ).items()
+        }
+
+        return jsonify({
+            "success": True,
+            "from": from_date.isoformat(),
+            "to": to_date.isoformat(),
+            "slot_minutes": APPOINTMENT_MINUTES,
+            "slots": [f"{minute // 60:02d}:{minute % 60:02d}:00" for minute in SLOT_START_MINUTES],
+            "days": [
+                {
+                    "date": day.isoformat(),
+                    "counts": [len(agent_ids) for agent_ids in available[day]],
+                    "agents": available[day],
+                }
+                for day in days
+            ],
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -1,12 +1,34 @@
-from flask import Blueprint, request, jsonify
-from db import get_connection
-from utils.async_notifier import send_notifications_async, prepare_booking_notifications
+from flask import Blueprint, Response, request, jsonify
+from db import get_connection, get_db, read_only, release_db
+from utils.async_notifier import prepare_booking_notifications
+from utils.notification_outbox import enqueue_notifications
 from utils.middleware import require_any_role
+from utils.auth_claims import membership_version
+from utils.booking_events import booking_watcher, stream_slots
+from utils.pagination import (
+    InvalidPageRequest, get_page_request, keyset_condition, split_page, KEYSET_ORDER_BY
+)
+from utils.booking_sync import (
+    InvalidSyncToken, parse_sync_token, get_sync_version, mark_booking_changed,
+    record_booking_deletions, get_pruned_version, MAX_DELTA_SIZE
+)
+from utils.region_counters import region_move
+from utils.cache_versions import (
+    build_etag, is_not_modified, not_modified_response, with_etag
+)
+from config import Config
 import datetime
+import json
 import os
+import time
 
 booking_bp = Blueprint("booking", __name__, url_prefix="/api")
 
+# Seconds between keepalive comments on idle booking streams
+STREAM_HEARTBEAT_SECONDS = 15
+# Seconds a client refused a stream (all slots taken) is asked to wait
+STREAM_RETRY_AFTER_SECONDS = 60
+
 # Call Center API Key (should be set in environment variables)
 CALL_CENTER_API_KEY = os.getenv('CALL_CENTER_API_KEY', 'cc_api_key_change_this_in_production')
 
@@ -39,18 +61,74 @@ def serialize_booking_timestamps(booking):
     return booking
 
 
+# Shared SELECT for booking list rows (GET /bookings, delta sync and the change stream)
+BOOKING_LIST_QUERY = """
+  SELECT b.bookingId, b.booking_date, b.booking_time, b.status, b.booking_type,
+    c.name AS customer_name, c.email AS customer_email, c.phone AS customer_phone,
+    fa.name AS agent_name,
+    disp.name AS dispatcher_name,
+    CASE 
+      WHEN b.agentId IS NOT NULL THEN fa.name
+      WHEN b.dispatcherId IS NOT NULL THEN CONCAT(disp.name, ' (Dispatcher)')
+      ELSE NULL
+    END AS assigned_to,
+    d.dispositionId AS disposition_id,
+    d.typeCode AS disposition_code,
+    d.note AS disposition_note,
+    dt.description AS disposition_description,
+    l.latitude AS customer_latitude,
+    l.longitude AS customer_longitude,
+    CASE 
+      WHEN b.booking_type = 'virtual' THEN CONCAT('Virtual - ', c.email, ' / ', c.phone)
+      ELSE CONCAT(
+        l.street_number, ' ', 
+        l.street_name, ', ', 
+        l.postal_code, ' ', 
+        l.city
+      )
+    END AS customer_address,
+    r.regionId, r.name AS region_name, r.is_global AS region_is_global,
+    b.call_center_agent_name, b.call_center_agent_email,
+    b.agentId, b.dispatcherId
+  FROM bookings b
+  JOIN customers c ON b.customerId = c.customerId
+  LEFT JOIN field_agents fa ON b.agentId = fa.agentId
+  LEFT JOIN dispatchers disp ON b.dispatcherId = disp.dispatcherId
+  LEFT JOIN dispositions d ON b.dispositionId = d.dispositionId
+  LEFT JOIN disposition_types dt ON d.typeCode = dt.typeCode
+  LEFT JOIN locations l ON c.location_id = l.id
+  LEFT JOIN regions r ON b.region_id = r.regionId
+"""
+
+
 @booking_bp.route("/bookings", methods=["GET"])
 @require_any_role('admin', 'dispatcher')
+@read_only
 def get_all_bookings():
     """
     Get all bookings (dispatcher/admin access only).
+    Paginated by keyset: pass the returned next_cursor as ?cursor= to get the next page.
+
+    Full list responses carry a sync token in the X-Sync-Token header. Passing it
+    back as ?since= returns only the bookings changed since then, plus the ids of
+    bookings that were deleted (or left the caller's view) as tombstones in "deleted".
+
+    Full list responses also carry an ETag built from the per-region booking
+    versions; a matching If-None-Match gets a 304 without running the list query.
     """
     try:
         # Only dispatchers and admins can see all bookings
         if request.role == 'field_agent':
             return jsonify({"success": False, "error": "Access denied - use /agents/{agentId}/bookings for agent bookings"}), 403
+
+        try:
+            position, limit = get_page_request(request.args)
+            since = request.args.get('since')
+            since_version = parse_sync_token(since) if since is not None else None
+        except (InvalidPageRequest, InvalidSyncToken) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
               
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Get filter parameters
@@ -58,76 +136,80 @@ def get_all_bookings():
         user_role = getattr(request, 'role', None)
         user_id = getattr(request, 'user_id', None)
         
-        base_query = """
-          SELECT b.bookingId, b.booking_date, b.booking_time, b.status, b.booking_type,
-            c.name AS customer_name, c.email AS customer_email, c.phone AS customer_phone,
-            fa.name AS agent_name,
-            disp.name AS dispatcher_name,
-            CASE 
-              WHEN b.agentId IS NOT NULL THEN fa.name
-              WHEN b.dispatcherId IS NOT NULL THEN CONCAT(disp.name, ' (Dispatcher)')
-              ELSE NULL
-            END AS assigned_to,
-            d.dispositionId AS disposition_id,
-            d.typeCode AS disposition_code,
-            d.note AS disposition_note,
-            dt.description AS disposition_description,
-            l.latitude AS customer_latitude,
-            l.longitude AS customer_longitude,
-            CASE 
-              WHEN b.booking_type = 'virtual' THEN CONCAT('Virtual - ', c.email, ' / ', c.phone)
-              ELSE CONCAT(
-                l.street_number, ' ', 
-                l.street_name, ', ', 
-                l.postal_code, ' ', 
-                l.city
-              )
-            END AS customer_address,
-            r.regionId, r.name AS region_name, r.is_global AS region_is_global,
-            b.call_center_agent_name, b.call_center_agent_email,
-            b.agentId, b.dispatcherId
-          FROM bookings b
-          JOIN customers c ON b.customerId = c.customerId
-          LEFT JOIN field_agents fa ON b.agentId = fa.agentId
-          LEFT JOIN dispatchers disp ON b.dispatcherId = disp.dispatcherId
-          LEFT JOIN dispositions d ON b.dispositionId = d.dispositionId
-          LEFT JOIN disposition_types dt ON d.typeCode = dt.typeCode
-          LEFT JOIN locations l ON c.location_id = l.id
-          LEFT JOIN regions r ON b.region_id = r.regionId
-        """
-        
         where_conditions = []
         query_params = []
+        visible_region_id = None
+        
+        # Read the token first: the rows below are read in the same snapshot
+        sync_token = get_sync_version(cursor)
         
         # Apply region filtering for dispatchers
         if user_role == 'dispatcher':
-            # Get dispatcher's team region
-            cursor.execute("""
-                SELECT DISTINCT r.regionId 
-                FROM dispatchers d 
-                JOIN teams t ON d.team_id = t.teamId 
-                JOIN regions r ON t.region_id = r.regionId 
-                WHERE d.dispatcherId = %s
-            """, (user_id,))
-            dispatcher_region = cursor.fetchone()
+            visible_region_id = request.region_id  # Region of the dispatcher's team, from the token claims
             
-            if dispatcher_region:
+            if visible_region_id is not None:
                 # Dispatcher can see bookings in their team's region OR global bookings
                 where_conditions.append("(b.region_id = %s OR r.is_global = TRUE)")
-                query_params.append(dispatcher_region['regionId'])
+                query_params.append(visible_region_id)
         
         # Apply specific region filter if requested (admin only)
         if region_filter and user_role == 'admin':
             where_conditions.append("b.region_id = %s")
             query_params.append(region_filter)
         
+        if since_version is not None and since_version > sync_token and conn.is_replica:
+            # The token came from the primary and the replica has not caught up yet
+            cursor.close()
+            conn = get_db(read_only=False)
+            cursor = conn.cursor(dictionary=True)
+            sync_token = get_sync_version(cursor)
+
+        if since_version is not None:
+            if since_version > sync_token:
+                return jsonify({"success": False, "error": "Sync token is no longer valid - reload the full list"}), 410
+
+            changes = fetch_booking_changes(cursor, since_version, visible_region_id,
+                                            region_filter if user_role == 'admin' else None)
+            if changes is None:
+                return jsonify({"success": False, "error": "Sync token expired or too many changes since - reload the full list"}), 410
+
+            bookings, deleted = changes
+            return jsonify({
+                "success": True,
+                "data": bookings,
+                "deleted": deleted,
+                "sync_token": str(sync_token)
+            }), 200
+        
+        # ETag over the same scopes as the visible rows, read in the same snapshot as the list
+        if region_filter and user_role == 'admin':
+            scopes = [f"bookings:region:{region_filter}"]
+        elif visible_region_id is not None:
+            scopes = [f"bookings:region:{visible_region_id}", "bookings:global"]
+        else:
+            scopes = ["bookings:all"]
+        etag = build_etag(cursor, scopes)
+
+        if is_not_modified(etag):
+            response = not_modified_response(etag)
+            response.headers["X-Sync-Token"] = str(sync_token)
+            return response
+        
+        # Continue after the last booking of the previous page
+        if position:
+            condition, params = keyset_condition(position)
+            where_conditions.append(condition)
+            query_params.extend(params)
+        
         # Build final query
         if where_conditions:
-            query = base_query + " WHERE " + " AND ".join(where_conditions)
+            query = BOOKING_LIST_QUERY + " WHERE " + " AND ".join(where_conditions)
         else:
-            query = base_query
+            query = BOOKING_LIST_QUERY
             
-        query += " ORDER BY b.booking_date, b.booking_time"
+        # Fetch one extra row to know whether another page follows
+        query += KEYSET_ORDER_BY
+        query_params.append(limit + 1)
         cursor.execute(query, query_params)
 
         bookings = cursor.fetchall()
@@ -136,7 +218,12 @@ def get_all_bookings():
         for booking in bookings:
             serialize_booking_timestamps(booking)
 
-        return jsonify({"success": True, "data": bookings}), 200
+        bookings, next_cursor = split_page(bookings, limit)
+
+        response = with_etag(jsonify({"success": True, "data": bookings, "next_cursor": next_cursor}), etag)
+        # Kept out of the body so the body only changes when the visible bookings do
+        response.headers["X-Sync-Token"] = str(sync_token)
+        return response
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -144,8 +231,174 @@ def get_all_bookings():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
+
+
+def fetch_booking_changes(cursor, since_version, visible_region_id=None, region_filter=None):
+    """
+    Bookings changed after since_version, as seen by the caller.
+
+    Changed rows are read without the region filter so that bookings which moved
+    out of the caller's view can be reported as tombstones alongside deletions.
+
+    Returns:
+        tuple or None: (serialized bookings, deleted booking ids), or None when
+        there are too many changes to send incrementally or tombstones past
+        since_version have been pruned
+    """
+    if since_version < get_pruned_version(cursor):
+        return None
+
+    cursor.execute(
+        BOOKING_LIST_QUERY + " WHERE b.sync_version > %s ORDER BY b.sync_version, b.bookingId LIMIT %s",
+        (since_version, MAX_DELTA_SIZE + 1)
+    )
+    changed = cursor.fetchall()
+    if len(changed) > MAX_DELTA_SIZE:
+        return None
+
+    cursor.execute(
+        "SELECT bookingId FROM booking_deletions WHERE sync_version > %s ORDER BY sync_version LIMIT %s",
+        (since_version, MAX_DELTA_SIZE + 1 - len(changed))
+    )
+    deleted = [row['bookingId'] for row in cursor.fetchall()]
+    if len(changed) + len(deleted) > MAX_DELTA_SIZE:
+        return None
+
+    bookings = []
+    for booking in changed:
+        if visible_region_id is not None:
+            visible = booking['regionId'] == visible_region_id or booking['region_is_global']
+        elif region_filter:
+            visible = str(booking['regionId']) == str(region_filter)
+        else:
+            visible = True
+
+        if visible:
+            bookings.append(serialize_booking_timestamps(booking))
+        else:
+            deleted.append(booking['bookingId'])
+
+    return bookings, deleted
+
+
+def format_sse(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    # default=str matches how jsonify renders DECIMAL coordinates
+    return message + f"data: {json.dumps(data, default=str)}\n\n"
+
+
+@booking_bp.route("/bookings/stream", methods=["GET"])
+@require_any_role('admin', 'dispatcher')
+def stream_bookings():
+    """
+    Server-Sent Events stream of booking changes (dispatcher/admin access only).
+
+    Applies the same region rules as GET /bookings. Each batch of changes is sent
+    as "booking" events (full list rows, covering creates, updates and
+    dispositions) and "booking_deleted" events, closed by a "sync" event whose id
+    is the sync token, so EventSource reconnects resume through Last-Event-ID.
+    A "resync" event asks the client to reload the full list.
+
+    No database connection is held between batches. Each process serves at
+    most BOOKING_STREAMS_PER_WORKER streams (503 with Retry-After past that,
+    and the client polls instead), and a stream ends after
+    BOOKING_STREAM_MAX_SECONDS or when the auth token expires; EventSource
+    then reconnects, is authorized again and resumes. A membership change
+    (a user's team, a team's region, a deleted account) ends every stream
+    with a "resync", as the region the stream was opened for may be stale.
+    """
+    try:
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since_version = parse_sync_token(since) if since else None
+    except InvalidSyncToken as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if not stream_slots.acquire():
+        return jsonify({"success": False, "error": "Too many open booking streams, poll instead"}), \
+            503, {"Retry-After": str(STREAM_RETRY_AFTER_SECONDS)}
+
+    user_role = request.role
+    region_filter = request.args.get('region_id') if user_role == 'admin' else None
+
+    try:
+        # The version the caller's region claim is valid for (admins have none to go stale)
+        membership = request.membership_version
+        if membership is None:
+            membership = membership_version.current()
+
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+
+        visible_region_id = None
+        if user_role == 'dispatcher':
+            visible_region_id = request.region_id
+        current_version = get_sync_version(cursor)
+
+    except Exception as e:
+        stream_slots.release()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        release_db()  # Not held while the stream is open
+
+    ends_at = min(time.monotonic() + Config.BOOKING_STREAM_MAX_SECONDS,
+                  time.monotonic() + request.token_exp - time.time())
+
+    def generate():
+        version = current_version if since_version is None else since_version
+        yield "retry: 5000\n\n"
+
+        if version > current_version:
+            version = current_version
+            yield format_sse("resync", {"sync_token": str(version)}, event_id=version)
+
+        while True:
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                return  # Frees the thread; EventSource reconnects from the last sync event id
+
+            if membership_version.current() != membership:
+                # The reload and the reconnect are authorized with the current claims
+                yield format_sse("resync", {"sync_token": str(version)}, event_id=version)
+                return
+
+            latest = booking_watcher.wait_for_change(version, min(STREAM_HEARTBEAT_SECONDS, remaining))
+            if latest is None or latest <= version:
+                yield ": keepalive\n\n"
+                continue
+
+            conn = get_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                sync_token = get_sync_version(cursor)
+                changes = fetch_booking_changes(cursor, version, visible_region_id, region_filter)
+                cursor.close()
+            finally:
+                conn.close()
+
+            if changes is None:
+                yield format_sse("resync", {"sync_token": str(sync_token)}, event_id=sync_token)
+            else:
+                bookings, deleted = changes
+                for booking in bookings:
+                    yield format_sse("booking", booking)
+                for booking_id in deleted:
+                    yield format_sse("booking_deleted", {"bookingId": booking_id})
+                yield format_sse("sync", {"sync_token": str(sync_token)}, event_id=sync_token)
+
+            version = sync_token
+
+    response = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Stop nginx from buffering the stream
+    })
+    response.call_on_close(stream_slots.release)  # Also when the client goes away mid-stream
+    return response
 
 
 @booking_bp.route("/agents/<int:agent_id>/bookings", methods=["GET"])
@@ -153,13 +406,19 @@ def get_all_bookings():
 def get_agent_bookings(agent_id):
     """
     Get all bookings for a specific agent. Agents can only see their own bookings.
+    Paginated by keyset, same as GET /bookings.
     """
     try:
         # Agents can only see their own bookings
         if request.role == 'field_agent' and request.user_id != agent_id:
             return jsonify({"success": False, "error": "Access denied - can only view your own bookings"}), 403
 
-        conn = get_connection()
+        try:
+            position, limit = get_page_request(request.args)
+        except InvalidPageRequest as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Verify agent exists
@@ -210,9 +469,18 @@ def get_agent_bookings(agent_id):
           LEFT JOIN regions r 
               ON b.region_id = r.regionId
           WHERE b.agentId = %s
-          ORDER BY b.booking_date, b.booking_time;
         """
-        cursor.execute(query, (agent_id,))
+        query_params = [agent_id]
+
+        # Continue after the last booking of the previous page
+        if position:
+            condition, params = keyset_condition(position)
+            query += " AND " + condition
+            query_params.extend(params)
+
+        query += KEYSET_ORDER_BY
+        query_params.append(limit + 1)
+        cursor.execute(query, query_params)
 
         bookings = cursor.fetchall()
 
@@ -220,7 +488,9 @@ def get_agent_bookings(agent_id):
         for booking in bookings:
             serialize_booking_timestamps(booking)
 
-        return jsonify({"success": True, "data": bookings}), 200
+        bookings, next_cursor = split_page(bookings, limit)
+
+        return jsonify({"success": True, "data": bookings, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -228,8 +498,6 @@ def get_agent_bookings(agent_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/dispatchers/<int:dispatcher_id>/bookings", methods=["GET"])
@@ -237,13 +505,19 @@ def get_agent_bookings(agent_id):
 def get_dispatcher_bookings(dispatcher_id):
     """
     Get all bookings assigned to a specific dispatcher. Dispatchers can only see their own assigned bookings.
+    Paginated by keyset, same as GET /bookings.
     """
     try:
         # Dispatchers can only see their own assigned bookings
         if request.role == 'dispatcher' and request.user_id != dispatcher_id:
             return jsonify({"success": False, "error": "Access denied - can only view your own assigned bookings"}), 403
 
-        conn = get_connection()
+        try:
+            position, limit = get_page_request(request.args)
+        except InvalidPageRequest as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Verify dispatcher exists
@@ -296,9 +570,18 @@ def get_dispatcher_bookings(dispatcher_id):
           LEFT JOIN regions r 
               ON b.region_id = r.regionId
           WHERE b.dispatcherId = %s
-          ORDER BY b.booking_date, b.booking_time;
         """
-        cursor.execute(query, (dispatcher_id,))
+        query_params = [dispatcher_id]
+
+        # Continue after the last booking of the previous page
+        if position:
+            condition, params = keyset_condition(position)
+            query += " AND " + condition
+            query_params.extend(params)
+
+        query += KEYSET_ORDER_BY
+        query_params.append(limit + 1)
+        cursor.execute(query, query_params)
 
         bookings = cursor.fetchall()
 
@@ -306,7 +589,9 @@ def get_dispatcher_bookings(dispatcher_id):
         for booking in bookings:
             serialize_booking_timestamps(booking)
 
-        return jsonify({"success": True, "data": bookings}), 200
+        bookings, next_cursor = split_page(bookings, limit)
+
+        return jsonify({"success": True, "data": bookings, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -314,8 +599,6 @@ def get_dispatcher_bookings(dispatcher_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/bookings/<int:booking_id>", methods=["GET"])
@@ -325,7 +608,7 @@ def get_booking(booking_id):
     Get a specific booking by ID.
     """
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # If user is an agent, they can only see their own bookings
@@ -435,8 +718,6 @@ def get_booking(booking_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/bookings", methods=["POST"])
@@ -455,7 +736,7 @@ def create_booking():
         if booking_type not in ["physical", "virtual"]:
             return jsonify({"success": False, "error": "Invalid booking_type. Must be 'physical' or 'virtual'"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Location lookup/insert (only for physical bookings)
@@ -515,8 +796,10 @@ def create_booking():
         region_id = data["booking"].get("region_id")
         if region_id is not None:
             cursor.execute("SELECT regionId FROM regions WHERE regionId = %s", (region_id,))
-            if not cursor.fetchone():
+            region = cursor.fetchone()
+            if not region:
                 return jsonify({"success": False, "error": "Invalid region ID"}), 400
+            region_id = region['regionId']  # As an int, also when sent as a string
         else:
             # Default to Global region (regionId = 1)
             region_id = 1
@@ -546,8 +829,6 @@ def create_booking():
             cursor.execute("SELECT name, email, phone FROM field_agents WHERE agentId=%s", (agent_id,))
             agent = cursor.fetchone()
 
-        conn.commit()
-
         # -------------------- Notifications -------------------- #
         # Prepare notification data
         notification_data = {
@@ -561,9 +842,13 @@ def create_booking():
             'booking_time': data['booking']['booking_time']
         }
         
-        # Send notifications asynchronously
+        # Committed with the booking; delivered by the notification sender
         notifications = prepare_booking_notifications(notification_data, is_update=False)
-        send_notifications_async(notifications)
+        enqueue_notifications(cursor, notifications, booking_id)
+
+        mark_booking_changed(cursor, booking_id, extra_scopes=["regions"],  # Region booking counts
+                             booking_count_deltas={region_id: 1})
+        conn.commit()
 
         # Fetch the created booking with full details including region
         cursor.execute("""
@@ -612,8 +897,6 @@ def create_booking():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/bookings/<int:booking_id>", methods=["PUT"])
@@ -625,20 +908,23 @@ def update_booking(booking_id):
     try:
         data = request.get_json()
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if booking exists and user has access
         if request.role == 'field_agent':
             cursor.execute("""
-                SELECT bookingId FROM bookings 
+                SELECT bookingId, region_id FROM bookings 
                 WHERE bookingId = %s AND agentId = %s
             """, (booking_id, request.user_id))
-            if not cursor.fetchone():
+            existing_booking = cursor.fetchone()
+            if not existing_booking:
                 return jsonify({"success": False, "error": "Booking not found or access denied"}), 404
         else:
-            cursor.execute("SELECT bookingId FROM bookings WHERE bookingId = %s", (booking_id,))
-            if not cursor.fetchone():
+            # Locked so a region change moves the count from the region the booking is really in
+            cursor.execute("SELECT bookingId, region_id FROM bookings WHERE bookingId = %s FOR UPDATE", (booking_id,))
+            existing_booking = cursor.fetchone()
+            if not existing_booking:
                 return jsonify({"success": False, "error": "Booking not found"}), 404
 
         # Build dynamic update query
@@ -686,8 +972,10 @@ def update_booking(booking_id):
             if region_id is not None:
                 # Validate region exists
                 cursor.execute("SELECT regionId FROM regions WHERE regionId = %s", (region_id,))
-                if not cursor.fetchone():
+                region = cursor.fetchone()
+                if not region:
                     return jsonify({"success": False, "error": "Invalid region ID"}), 400
+                region_id = region['regionId']  # As an int, also when sent as a string
             update_fields.append("region_id = %s")
             update_values.append(region_id)
 
@@ -700,6 +988,32 @@ def update_booking(booking_id):
         # Execute update
         update_query = f"UPDATE bookings SET {', '.join(update_fields)} WHERE bookingId = %s"
         cursor.execute(update_query, update_values)
+
+        # A booking moving region also leaves its old region's list and count
+        if "region_id" in data and request.role == 'admin' and region_id != existing_booking['region_id']:
+            mark_booking_changed(cursor, booking_id, extra_region_ids=[existing_booking['region_id']],
+                                 extra_scopes=["regions"],
+                                 booking_count_deltas=region_move(existing_booking['region_id'], region_id))
+        else:
+            mark_booking_changed(cursor, booking_id)
+
+        # Customer and agent hear about the new date, time, status or agent. Committed with the
+        # booking; updates within NOTIFY_COALESCE_SECONDS of each other are sent once, in their latest state
+        if any(data.get(field) for field in ("booking_date", "booking_time", "status")) or \
+                ("agentId" in data and request.role != 'field_agent'):
+            cursor.execute("""
+                SELECT b.booking_date, b.booking_time, b.status,
+                    c.name AS customer_name, c.email AS customer_email, c.phone AS customer_phone,
+                    fa.name AS agent_name, fa.email AS agent_email, fa.phone AS agent_phone
+                FROM bookings b
+                JOIN customers c ON b.customerId = c.customerId
+                LEFT JOIN field_agents fa ON b.agentId = fa.agentId
+                WHERE b.bookingId = %s
+            """, (booking_id,))
+            notification_data = serialize_booking_timestamps(cursor.fetchone())
+            notifications = prepare_booking_notifications(notification_data, is_update=True)
+            enqueue_notifications(cursor, notifications, booking_id)
+
         conn.commit()
 
         # Fetch updated booking with full details
@@ -752,8 +1066,6 @@ def update_booking(booking_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/bookings/<int:booking_id>", methods=["DELETE"])
@@ -763,7 +1075,7 @@ def delete_booking(booking_id):
     Delete a booking (admin and dispatcher access).
     """
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if booking exists and get details for response
@@ -779,6 +1091,7 @@ def delete_booking(booking_id):
             return jsonify({"success": False, "error": "Booking not found"}), 404
 
         # Delete the booking (CASCADE will handle related records)
+        record_booking_deletions(cursor, [booking_id], extra_scopes=["regions"])  # Region booking counts
         cursor.execute("DELETE FROM bookings WHERE bookingId = %s", (booking_id,))
         conn.commit()
 
@@ -795,8 +1108,6 @@ def delete_booking(booking_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/call-center/booking", methods=["POST"])
@@ -823,7 +1134,7 @@ def create_call_center_booking():
         if region_id is None:
             return jsonify({"success": False, "error": "Region selection is required for all appointments"}), 400
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
         
         # Check if region exists
@@ -831,6 +1142,7 @@ def create_call_center_booking():
         region = cursor.fetchone()
         if not region:
             return jsonify({"success": False, "error": "Invalid region ID"}), 400
+        region_id = region['regionId']  # As an int, also when sent as a string
         
         # Prepare warning if Global region is selected
         warning_message = None
@@ -913,6 +1225,24 @@ def create_call_center_booking():
         ))
         booking_id = cursor.lastrowid
 
+        # Prepare notification data (no agent notifications since unassigned)
+        notification_data = {
+            'customer_name': data['customer']['name'],
+            'customer_email': data['customer'].get('email'),
+            'customer_phone': data['customer'].get('phone'),
+            'agent_name': None,  # No agent assigned
+            'agent_email': None,
+            'agent_phone': None,
+            'booking_date': data['booking']['booking_date'],
+            'booking_time': data['booking']['booking_time']
+        }
+        
+        # Customer notification only (no agent since unassigned), committed with the booking
+        notifications = prepare_booking_notifications(notification_data, is_update=False)
+        enqueue_notifications(cursor, notifications, booking_id)
+
+        mark_booking_changed(cursor, booking_id, extra_scopes=["regions"],  # Region booking counts
+                             booking_count_deltas={region_id: 1})
         conn.commit()
 
         # Fetch the created booking with full details including region
@@ -948,23 +1278,6 @@ def create_call_center_booking():
         created_booking = cursor.fetchone()
         serialize_booking_timestamps(created_booking)
 
-        # Prepare notification data (no agent notifications since unassigned)
-        notification_data = {
-            'customer_name': data['customer']['name'],
-            'customer_email': data['customer'].get('email'),
-            'customer_phone': data['customer'].get('phone'),
-            'agent_name': None,  # No agent assigned
-            'agent_email': None,
-            'agent_phone': None,
-            'booking_date': data['booking']['booking_date'],
-            'booking_time': data['booking']['booking_time']
-        }
-        
-        # Send customer notification only (no agent since unassigned)
-        notifications = prepare_booking_notifications(notification_data, is_update=False)
-        if notifications:
-            send_notifications_async(notifications)
-
         response_data = {
             "success": True,
             "message": f"Booking created successfully by {call_center_agent['name']} - unassigned, ready for dispatcher assignment",
@@ -986,8 +1299,6 @@ def create_call_center_booking():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @booking_bp.route("/call-center/regions", methods=["GET"])
@@ -997,7 +1308,7 @@ def get_call_center_regions():
     Get all regions for call center - public endpoint with API key authentication.
     """
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Get all regions (same query as the admin endpoint but without role restrictions)
@@ -1017,5 +1328,3 @@ def get_call_center_regions():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
@@ -1,16 +1,12 @@
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_db
 from utils.middleware import require_auth, require_admin
-import bcrypt
+from utils.booking_sync import mark_bookings_changed
+from utils.cache_versions import bump_cache_versions
+from utils.passwords import PasswordServiceBusy, hash_password, password_service_busy_response
 
 dispatcher_bp = Blueprint("dispatcher", __name__, url_prefix="/api")
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
 def serialize_dispatcher_timestamps(dispatcher):
     """Convert dispatcher timestamps to ISO format for JSON serialization"""
     if dispatcher.get('created_time'):
@@ -27,7 +23,7 @@ def get_dispatchers():
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -54,8 +50,6 @@ def get_dispatchers():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @dispatcher_bp.route("/dispatchers/<int:dispatcher_id>", methods=["GET"])
@@ -66,7 +60,7 @@ def get_dispatcher(dispatcher_id):
         if request.role != 'admin':
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -91,8 +85,6 @@ def get_dispatcher(dispatcher_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @dispatcher_bp.route("/dispatchers", methods=["POST"])
@@ -124,7 +116,7 @@ def create_dispatcher():
         # Hash the password
         hashed_password = hash_password(password)
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if email already exists
@@ -180,6 +172,11 @@ def create_dispatcher():
             "data": dispatcher
         }), 201
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals():
             conn.rollback()
@@ -188,8 +185,6 @@ def create_dispatcher():
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @dispatcher_bp.route("/dispatchers/<int:dispatcher_id>", methods=["PUT"])
@@ -201,8 +196,11 @@ def update_dispatcher(dispatcher_id):
             return jsonify({"success": False, "error": "Admin access required"}), 403
 
         data = request.get_json()
+
+        # Hash a new password before any query, so no checked-out connection waits on bcrypt
+        hashed_password = hash_password(data["password"]) if data.get("password") else None
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if dispatcher exists
@@ -227,8 +225,7 @@ def update_dispatcher(dispatcher_id):
             update_fields.append("email = %s")
             update_values.append(data["email"])
 
-        if data.get("password"):
-            hashed_password = hash_password(data["password"])
+        if hashed_password:
             update_fields.append("password = %s")
             update_values.append(hashed_password)
 
@@ -277,6 +274,14 @@ def update_dispatcher(dispatcher_id):
         # Execute update
         update_query = f"UPDATE dispatchers SET {', '.join(update_fields)} WHERE dispatcherId = %s"
         cursor.execute(update_query, update_values)
+
+        # Booking lists show the dispatcher's name for self-assigned bookings;
+        # team lists show their contact details
+        if data.get("name"):
+            mark_bookings_changed(cursor, "dispatcherId = %s", (dispatcher_id,), extra_scopes=["teams"])
+        else:
+            bump_cache_versions(cursor, ["teams"])
+
         conn.commit()
 
         # Fetch updated dispatcher (excluding password)
@@ -298,6 +303,11 @@ def update_dispatcher(dispatcher_id):
             "data": dispatcher
         }), 200
 
+    except PasswordServiceBusy as e:
+        if 'conn' in locals():
+            conn.rollback()
+        return password_service_busy_response(e)
+
     except Exception as e:
         if 'conn' in locals():
             conn.rollback()
@@ -306,8 +316,6 @@ def update_dispatcher(dispatcher_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @dispatcher_bp.route("/dispatchers/<int:dispatcher_id>", methods=["DELETE"])
@@ -316,7 +324,7 @@ def delete_dispatcher(dispatcher_id):
     """Delete a dispatcher (admin access only)"""
     try:
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if dispatcher exists and get details for response
@@ -326,6 +334,9 @@ def delete_dispatcher(dispatcher_id):
         if not dispatcher:
             return jsonify({"success": False, "error": "Dispatcher not found"}), 404
 
+        # Bookings self-assigned to the dispatcher become unassigned
+        mark_bookings_changed(cursor, "dispatcherId = %s", (dispatcher_id,), extra_scopes=["teams", "membership"])
+
         # Delete the dispatcher
         cursor.execute("DELETE FROM dispatchers WHERE dispatcherId = %s", (dispatcher_id,))
         conn.commit()
@@ -343,5 +354,3 @@ def delete_dispatcher(dispatcher_id):
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_db
 from utils.middleware import require_auth, require_dispatcher, require_any_role
+from utils.booking_sync import mark_booking_changed, mark_bookings_changed
+from utils.cache_versions import bump_cache_versions, versioned_response
 
 disposition_bp = Blueprint("disposition", __name__, url_prefix="/api")
 
@@ -14,10 +16,11 @@ def serialize_disposition_timestamps(disposition):
 
 @disposition_bp.route("/disposition-types", methods=["GET"])
 @require_auth
+@versioned_response('disposition_types')
 def get_disposition_types():
     """Get all available disposition types"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -37,7 +40,6 @@ def get_disposition_types():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/dispositions", methods=["GET"])
@@ -47,7 +49,7 @@ def get_dispositions():
     try:
         booking_id = request.args.get("bookingId")
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         if booking_id:
@@ -120,7 +122,6 @@ def get_dispositions():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/dispositions/<int:disposition_id>", methods=["GET"])
@@ -128,7 +129,7 @@ def get_dispositions():
 def get_disposition(disposition_id):
     """Get a specific disposition by ID"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         if request.role == 'field_agent':
@@ -179,7 +180,6 @@ def get_disposition(disposition_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/dispositions", methods=["POST"])
@@ -195,7 +195,7 @@ def create_disposition():
         if not booking_id or not disposition_type:
             return jsonify({"success": False, "error": "Missing required fields: bookingId, dispositionType"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Verify booking exists and user has access
@@ -231,6 +231,7 @@ def create_disposition():
             UPDATE bookings SET dispositionId = %s WHERE bookingId = %s
         """, (disposition_id, booking_id))
 
+        mark_booking_changed(cursor, booking_id)
         conn.commit()
 
         # Fetch the created disposition with full details
@@ -266,7 +267,6 @@ def create_disposition():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/dispositions/<int:disposition_id>", methods=["PUT"])
@@ -276,7 +276,7 @@ def update_disposition(disposition_id):
     try:
         data = request.get_json()
         
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if disposition exists and user has access
@@ -318,6 +318,7 @@ def update_disposition(disposition_id):
         # Execute update
         update_query = f"UPDATE dispositions SET {', '.join(update_fields)} WHERE dispositionId = %s"
         cursor.execute(update_query, update_values)
+        mark_bookings_changed(cursor, "dispositionId = %s", (disposition_id,))
         conn.commit()
 
         # Fetch updated disposition with full details
@@ -353,7 +354,6 @@ def update_disposition(disposition_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/dispositions/<int:disposition_id>", methods=["DELETE"])
@@ -361,7 +361,7 @@ def update_disposition(disposition_id):
 def delete_disposition(disposition_id):
     """Delete a disposition (dispatcher access only)"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if disposition exists and get details for response
@@ -388,6 +388,8 @@ def delete_disposition(disposition_id):
 
         # Delete the disposition
         cursor.execute("DELETE FROM dispositions WHERE dispositionId = %s", (disposition_id,))
+        if disposition['bookingId']:
+            mark_booking_changed(cursor, disposition['bookingId'])
         conn.commit()
 
         return jsonify({
@@ -401,7 +403,6 @@ def delete_disposition(disposition_id):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 # Legacy route for backward compatibility  
@@ -420,7 +421,7 @@ def add_disposition():
         if not booking_id or not disposition_type:
             return jsonify({"success": False, "error": "Missing fields"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("SELECT dispositionId FROM bookings WHERE bookingId = %s", (booking_id,))
@@ -447,6 +448,8 @@ def add_disposition():
                 UPDATE bookings SET dispositionId=%s WHERE bookingId=%s
             """, (new_id, booking_id))
 
+        mark_booking_changed(cursor, booking_id)
+
         # TODO: Send notification to dispatcher (and customer and agent?)
         conn.commit()
         return jsonify({"success": True, "message": "Disposition saved"}), 200
@@ -457,7 +460,6 @@ def add_disposition():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 # Admin-only disposition type management
@@ -486,7 +488,7 @@ def create_disposition_type():
         if len(description) > 255:
             return jsonify({"success": False, "error": "description must be 255 characters or less"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if typeCode already exists
@@ -500,6 +502,7 @@ def create_disposition_type():
             VALUES (%s, %s)
         """, (type_code.upper(), description.strip()))
 
+        bump_cache_versions(cursor, ["disposition_types"])
         conn.commit()
 
         # Return the created disposition type
@@ -515,7 +518,6 @@ def create_disposition_type():
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/disposition-types/<string:type_code>", methods=["PUT"])
@@ -534,7 +536,7 @@ def update_disposition_type(type_code):
         if len(description) > 255:
             return jsonify({"success": False, "error": "description must be 255 characters or less"}), 400
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if disposition type exists
@@ -549,6 +551,11 @@ def update_disposition_type(type_code):
             WHERE typeCode = %s
         """, (description.strip(), type_code))
 
+        # Booking lists show the type description
+        mark_bookings_changed(cursor, """
+            dispositionId IN (SELECT dispositionId FROM dispositions WHERE typeCode = %s)
+        """, (type_code,), extra_scopes=["disposition_types"])
+
         conn.commit()
 
         # Return updated disposition type
@@ -564,7 +571,6 @@ def update_disposition_type(type_code):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
 
 
 @disposition_bp.route("/disposition-types/<string:type_code>", methods=["DELETE"])
@@ -572,7 +578,7 @@ def update_disposition_type(type_code):
 def delete_disposition_type(type_code):
     """Delete a disposition type (admin only)"""
     try:
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Check if disposition type exists
@@ -593,6 +599,7 @@ def delete_disposition_type(type_code):
 
         # Delete the disposition type
         cursor.execute("DELETE FROM disposition_types WHERE typeCode = %s", (type_code,))
+        bump_cache_versions(cursor, ["disposition_types"])
         conn.commit()
 
         return jsonify({
@@ -606,4 +613,3 @@ def delete_disposition_type(type_code):
 
     finally:
         if 'cursor' in locals(): cursor.close()
-        if 'conn' in locals(): conn.close()
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify
+import os
+from db import db_pool, get_db, replica_pool
+from utils.db_metrics import db_metrics
+from utils.notification_outbox import outbox_stats
+from utils.middleware import require_admin
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api")
+
+@metrics_bp.route("/metrics", methods=["GET"])
+@require_admin
+def get_metrics():
+    """
+    Database pool and statement metrics of the worker process that answers
+    (admin access only). Each gunicorn worker keeps its own numbers; "pid"
+    tells them apart. "notification_outbox" is shared.
+    """
+    try:
+        cursor = get_db().cursor(dictionary=True)
+        try:
+            outbox = outbox_stats(cursor)
+        finally:
+            cursor.close()
+
+        return jsonify({
+            "success": True,
+            "pid": os.getpid(),
+            "pool": db_pool.stats(),
+            "replica_pool": replica_pool.stats() if replica_pool is not None else None,
+            "notification_outbox": outbox,
+            **db_metrics.snapshot()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -1,33 +1,14 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
 import mysql.connector
 from mysql.connector import Error
-from db import get_connection
+from db import database_operation, read_only
 from utils.middleware import require_any_role
+from utils.booking_sync import mark_bookings_changed
+from utils.cache_versions import bump_cache_versions, versioned_response
+from utils.region_counters import adjust_region_counters, region_move
 
 regions_bp = Blueprint('regions', __name__, url_prefix='/api')
 
-def database_operation(f):
-    """Decorator to handle database connection and cleanup consistently"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        conn = None
-        cursor = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            return f(cursor, conn, *args, **kwargs)
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    return decorated_function
-
 def validate_region_data(data):
     """Validate region creation/update data"""
     if not data.get('name') or not isinstance(data['name'], str):
@@ -53,39 +34,24 @@ def validate_region_data(data):
 
 @regions_bp.route('/regions', methods=['GET'])
 @require_any_role('admin', 'dispatcher')
+@read_only
+@versioned_response('regions')
 @database_operation
 def get_regions(cursor, conn):
     """Get all regions"""
     try:
+        # Counts are kept up to date by team and booking writes (utils.region_counters)
         regions_query = """
-        SELECT regionId, name, description, is_global, created_time, updated_time 
-        FROM regions 
-        ORDER BY is_global DESC, name
+        SELECT r.regionId, r.name, r.description, r.is_global, r.created_time, r.updated_time,
+               COALESCE(rc.team_count, 0) as team_count,
+               COALESCE(rc.booking_count, 0) as booking_count
+        FROM regions r
+        LEFT JOIN region_counters rc ON rc.region_id = r.regionId
+        ORDER BY r.is_global DESC, r.name
         """
         cursor.execute(regions_query)
         regions = cursor.fetchall()
         
-        # Get team count for each region
-        for region in regions:
-            team_count_query = """
-            SELECT COUNT(*) as team_count 
-            FROM teams 
-            WHERE region_id = %s
-            """
-            cursor.execute(team_count_query, (region['regionId'],))
-            team_count_result = cursor.fetchone()
-            region['team_count'] = team_count_result['team_count'] if team_count_result else 0
-            
-            # Get booking count for each region
-            booking_count_query = """
-            SELECT COUNT(*) as booking_count 
-            FROM bookings 
-            WHERE region_id = %s
-            """
-            cursor.execute(booking_count_query, (region['regionId'],))
-            booking_count_result = cursor.fetchone()
-            region['booking_count'] = booking_count_result['booking_count'] if booking_count_result else 0
-        
         return jsonify({"success": True, "data": regions}), 200
         
     except Error as e:
@@ -131,6 +97,7 @@ def create_region(cursor, conn):
         ))
         
         region_id = cursor.lastrowid
+        bump_cache_versions(cursor, ["regions"])
         conn.commit()
         
         # Return the created region
@@ -168,7 +135,7 @@ def get_region(cursor, conn, region_id):
         region['teams'] = cursor.fetchall()
         
         # Get booking count for this region
-        cursor.execute("SELECT COUNT(*) as booking_count FROM bookings WHERE region_id = %s", (region_id,))
+        cursor.execute("SELECT booking_count FROM region_counters WHERE region_id = %s", (region_id,))
         booking_count_result = cursor.fetchone()
         region['booking_count'] = booking_count_result['booking_count'] if booking_count_result else 0
         
@@ -222,6 +189,10 @@ def update_region(cursor, conn, region_id):
             region_id
         ))
         
+        # Booking and team lists show the region name
+        mark_bookings_changed(cursor, "region_id = %s", (region_id,), extra_region_ids=[region_id],
+                              extra_scopes=["regions", "teams"])
+        
         conn.commit()
         
         # Return updated region
@@ -261,8 +232,15 @@ def delete_region(cursor, conn, region_id):
         # Move all teams in this region to global region
         cursor.execute("UPDATE teams SET region_id = %s WHERE region_id = %s", 
                       (global_region_id, region_id))
-        
-        # Move all bookings in this region to global region
+        moved_teams = cursor.rowcount
+        
+        # Move all bookings in this region to global region (the region's counters go with it)
+        cursor.execute("SELECT COUNT(*) as count FROM bookings WHERE region_id = %s FOR UPDATE", (region_id,))
+        moved_bookings = cursor.fetchone()['count']
+        mark_bookings_changed(cursor, "region_id = %s", (region_id,), extra_region_ids=[global_region_id],
+                              extra_scopes=["regions", "teams", "agents", "membership"],
+                              booking_count_deltas={global_region_id: moved_bookings},
+                              team_count_deltas={global_region_id: moved_teams})
         cursor.execute("UPDATE bookings SET region_id = %s WHERE region_id = %s", 
                       (global_region_id, region_id))
         
@@ -307,8 +285,12 @@ def assign_team_to_region(cursor, conn, region_id):
             return jsonify({"success": False, "error": "Team not found"}), 404
         
         # Update team's region assignment
+        cursor.execute("SELECT region_id FROM teams WHERE teamId = %s FOR UPDATE", (team_id,))
+        previous_region_id = cursor.fetchone()['region_id']
         cursor.execute("UPDATE teams SET region_id = %s WHERE teamId = %s", 
                       (region_id, team_id))
+        adjust_region_counters(cursor, team_deltas=region_move(previous_region_id, region_id))
+        bump_cache_versions(cursor, ["regions", "teams", "agents", "membership"])
         
         conn.commit()
         
@@ -1,33 +1,13 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
 import mysql.connector
 from mysql.connector import Error
-from db import get_connection
+from db import database_operation
 from utils.middleware import require_any_role
+from utils.cache_versions import bump_cache_versions, versioned_response
+from utils.region_counters import adjust_region_counters, region_move
 
 teams_bp = Blueprint('teams', __name__, url_prefix='/api')
 
-def database_operation(f):
-    """Decorator to handle database connection and cleanup consistently"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        conn = None
-        cursor = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            return f(cursor, conn, *args, **kwargs)
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    return decorated_function
-
 def validate_team_data(data):
     """Validate team creation/update data"""
     if not data.get('name') or not isinstance(data['name'], str):
@@ -49,6 +29,7 @@ def validate_team_data(data):
 
 @teams_bp.route('/teams', methods=['GET'])
 @require_any_role('admin', 'dispatcher')
+@versioned_response('teams')
 @database_operation
 def get_teams(cursor, conn):
     """Get all teams with their members"""
@@ -64,26 +45,28 @@ def get_teams(cursor, conn):
         cursor.execute(teams_query)
         teams = cursor.fetchall()
         
-        # Get team members for each team
-        for team in teams:
-            # Get dispatchers
-            dispatcher_query = """
-            SELECT dispatcherId as id, name, email, phone 
+        # Get members of all teams in two queries
+        cursor.execute("""
+            SELECT team_id, dispatcherId as id, name, email, phone 
             FROM dispatchers 
-            WHERE team_id = %s
-            """
-            cursor.execute(dispatcher_query, (team['teamId'],))
-            team['dispatchers'] = cursor.fetchall()
-            
-            # Get agents
-            agent_query = """
-            SELECT agentId as id, name, email, phone, status 
+            WHERE team_id IS NOT NULL
+        """)
+        dispatchers_by_team = {}
+        for dispatcher in cursor.fetchall():
+            dispatchers_by_team.setdefault(dispatcher.pop('team_id'), []).append(dispatcher)
+        
+        cursor.execute("""
+            SELECT team_id, agentId as id, name, email, phone, status 
             FROM field_agents 
-            WHERE team_id = %s
-            """
-            cursor.execute(agent_query, (team['teamId'],))
-            team['agents'] = cursor.fetchall()
-            
+            WHERE team_id IS NOT NULL
+        """)
+        agents_by_team = {}
+        for agent in cursor.fetchall():
+            agents_by_team.setdefault(agent.pop('team_id'), []).append(agent)
+        
+        for team in teams:
+            team['dispatchers'] = dispatchers_by_team.get(team['teamId'], [])
+            team['agents'] = agents_by_team.get(team['teamId'], [])
             team['memberCount'] = len(team['dispatchers']) + len(team['agents'])
         
         return jsonify({"success": True, "data": teams}), 200
@@ -117,8 +100,10 @@ def create_team(cursor, conn):
         region_id = data.get('region_id')
         if region_id is not None:
             cursor.execute("SELECT regionId FROM regions WHERE regionId = %s", (region_id,))
-            if not cursor.fetchone():
+            region = cursor.fetchone()
+            if not region:
                 return jsonify({"success": False, "error": "Invalid region ID"}), 400
+            region_id = region['regionId']  # As an int, also when sent as a string
         else:
             # Default to Global region (regionId = 1)
             region_id = 1
@@ -135,6 +120,8 @@ def create_team(cursor, conn):
         ))
         
         team_id = cursor.lastrowid
+        adjust_region_counters(cursor, team_deltas={region_id: 1})
+        bump_cache_versions(cursor, ["teams", "regions"])  # Regions show team counts
         conn.commit()
         
         # Return the created team with region information
@@ -237,8 +224,10 @@ def update_team(cursor, conn, team_id):
             region_id = data['region_id']
             if region_id is not None:
                 cursor.execute("SELECT regionId FROM regions WHERE regionId = %s", (region_id,))
-                if not cursor.fetchone():
+                region = cursor.fetchone()
+                if not region:
                     return jsonify({"success": False, "error": "Invalid region ID"}), 400
+                region_id = region['regionId']  # As an int, also when sent as a string
             
             # Check if team has incomplete appointments before allowing region change
             # First get the team's current region and name
@@ -280,6 +269,10 @@ def update_team(cursor, conn, team_id):
         set_clauses.append("updated_time = CURRENT_TIMESTAMP")
         update_values.append(team_id)
         
+        # Lock the team so a region change moves its count from the region it is really in
+        cursor.execute("SELECT region_id FROM teams WHERE teamId = %s FOR UPDATE", (team_id,))
+        previous_region_id = cursor.fetchone()['region_id']
+        
         # Update team
         update_query = f"""
         UPDATE teams 
@@ -287,6 +280,11 @@ def update_team(cursor, conn, team_id):
         WHERE teamId = %s
         """
         cursor.execute(update_query, update_values)
+        scopes = ["teams", "regions", "agents"]  # Regions show team counts
+        if 'region_id' in data and region_id != previous_region_id:
+            adjust_region_counters(cursor, team_deltas=region_move(previous_region_id, region_id))
+            scopes.append("membership")  # Members' region claims
+        bump_cache_versions(cursor, scopes)
         
         conn.commit()
         
@@ -319,8 +317,8 @@ def delete_team(cursor, conn, team_id):
             return jsonify({"success": False, "error": "Team not found"}), 404
         
         # Check for incomplete appointments in the team's region or assigned to team members
-        # First get the team's region
-        cursor.execute("SELECT region_id FROM teams WHERE teamId = %s", (team_id,))
+        # First get the team's region (locked: its team count is decremented below)
+        cursor.execute("SELECT region_id FROM teams WHERE teamId = %s FOR UPDATE", (team_id,))
         team_region = cursor.fetchone()
         
         if team_region and team_region['region_id']:
@@ -357,6 +355,8 @@ def delete_team(cursor, conn, team_id):
         
         # Delete the team
         cursor.execute("DELETE FROM teams WHERE teamId = %s", (team_id,))
+        adjust_region_counters(cursor, team_deltas=region_move(team_region['region_id'], None))
+        bump_cache_versions(cursor, ["teams", "regions", "agents", "membership"])  # Regions show team counts
         
         conn.commit()
         
@@ -409,6 +409,7 @@ def assign_member_to_team(cursor, conn, team_id):
             cursor.execute("UPDATE field_agents SET team_id = %s WHERE agentId = %s", 
                           (team_id, member_id))
         
+        bump_cache_versions(cursor, ["teams", "agents", "membership"])
         conn.commit()
         
         return jsonify({"success": True, "message": f"{member_type.capitalize()} assigned to team successfully"}), 200
@@ -438,6 +439,7 @@ def remove_member_from_team(cursor, conn, team_id, member_type, member_id):
         if cursor.rowcount == 0:
             return jsonify({"success": False, "error": "Member not found in this team"}), 404
         
+        bump_cache_versions(cursor, ["teams", "agents", "membership"])
         conn.commit()
         
         return jsonify({"success": True, "message": f"{member_type.capitalize()} removed from team successfully"}), 200
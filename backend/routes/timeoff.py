@@ -1,33 +1,12 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
 from datetime import datetime, time
-from db import get_connection
+from db import database_operation
 from utils.middleware import require_any_role
-from utils.async_notifier import send_notifications_async
+from utils.cache_versions import bump_cache_versions
+from utils.availability import week_scope
 
 timeoff_bp = Blueprint('timeoff', __name__, url_prefix='/api')
 
-def database_operation(f):
-    """Decorator to handle database connection and cleanup consistently"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        conn = None
-        cursor = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            return f(cursor, conn, *args, **kwargs)
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    return decorated_function
-
 def validate_time_off_request(data):
     """Validate time-off request data"""
     if not data.get('request_date'):
@@ -166,31 +145,6 @@ def create_time_off_request(cursor, conn):
         
         created_request = cursor.fetchone()
         
-        # Send notification to dispatcher (async)
-        try:
-            cursor.execute("""
-            SELECT d.email, d.name 
-            FROM dispatchers d 
-            JOIN field_agents fa ON d.team_id = fa.team_id 
-            WHERE fa.agentId = %s
-            """, (agent_id,))
-            dispatcher = cursor.fetchone()
-            
-            if dispatcher:
-                notification_data = {
-                    'type': 'time_off_requested',
-                    'agent_name': created_request['agent_name'],
-                    'request_date': str(created_request['request_date']),
-                    'is_full_day': created_request['is_full_day'],
-                    'start_time': str(created_request['start_time']) if created_request['start_time'] else None,
-                    'end_time': str(created_request['end_time']) if created_request['end_time'] else None,
-                    'dispatcher_email': dispatcher['email'],
-                    'dispatcher_name': dispatcher['name']
-                }
-                send_notifications_async([notification_data])
-        except Exception as e:
-            print(f"Failed to send notification: {e}")
-        
         return jsonify({"success": True, "data": created_request}), 201
         
     except Exception as e:
@@ -228,10 +182,10 @@ def get_time_off_requests(cursor, conn):
         elif user_role == 'dispatcher':
             # Dispatchers see requests from agents in their team
             query = base_query + """
-            WHERE fa.team_id = (SELECT team_id FROM dispatchers WHERE dispatcherId = %s)
+            WHERE fa.team_id = %s
             ORDER BY tor.created_time DESC
             """
-            params = [user_id]
+            params = [request.team_id]
         else:  # admin
             # Admins see all requests
             query = base_query + " ORDER BY tor.created_time DESC"
@@ -297,11 +251,8 @@ def update_time_off_request(cursor, conn, request_id):
         
         elif action in ['approve', 'reject']:
             # Dispatchers can only approve/reject requests from their team
-            if user_role == 'dispatcher':
-                cursor.execute("SELECT team_id FROM dispatchers WHERE dispatcherId = %s", (user_id,))
-                dispatcher = cursor.fetchone()
-                if not dispatcher or dispatcher['team_id'] != time_off_request['team_id']:
-                    return jsonify({"success": False, "error": "You can only review requests from your team"}), 403
+            if user_role == 'dispatcher' and request.team_id != time_off_request['team_id']:
+                return jsonify({"success": False, "error": "You can only review requests from your team"}), 403
             
             if time_off_request['status'] != 'pending':
                 return jsonify({"success": False, "error": "Request has already been reviewed"}), 400
@@ -319,6 +270,11 @@ def update_time_off_request(cursor, conn, request_id):
         reviewed_by = None if action == 'cancel' else user_id
         
         cursor.execute(update_query, (new_status, reviewed_by, reviewer_type, request_id))
+
+        # Approving or cancelling approved time-off changes search availability
+        if new_status == 'approved' or time_off_request['status'] == 'approved':
+            bump_cache_versions(cursor, [week_scope(time_off_request['request_date'])])
+
         conn.commit()
         
         # Get updated request
@@ -341,22 +297,6 @@ def update_time_off_request(cursor, conn, request_id):
         
         updated_request = cursor.fetchone()
         
-        # Send notification (async)
-        try:
-            notification_data = {
-                'type': f'time_off_{new_status}',
-                'agent_email': updated_request['agent_email'],
-                'agent_name': updated_request['agent_name'],
-                'request_date': str(updated_request['request_date']),
-                'is_full_day': updated_request['is_full_day'],
-                'start_time': str(updated_request['start_time']) if updated_request['start_time'] else None,
-                'end_time': str(updated_request['end_time']) if updated_request['end_time'] else None,
-                'reviewer_name': updated_request.get('reviewer_name', 'System')
-            }
-            send_notifications_async([notification_data])
-        except Exception as e:
-            print(f"Failed to send notification: {e}")
-        
         # Convert for JSON response
         if updated_request['request_date']:
             updated_request['request_date'] = str(updated_request['request_date'])
@@ -381,11 +321,14 @@ def delete_time_off_request(cursor, conn, request_id):
     """Delete time-off request (admin only)"""
     try:
         # Check if request exists
-        cursor.execute("SELECT requestId FROM time_off_requests WHERE requestId = %s", (request_id,))
-        if not cursor.fetchone():
+        cursor.execute("SELECT requestId, request_date, status FROM time_off_requests WHERE requestId = %s", (request_id,))
+        time_off_request = cursor.fetchone()
+        if not time_off_request:
             return jsonify({"success": False, "error": "Time-off request not found"}), 404
         
         cursor.execute("DELETE FROM time_off_requests WHERE requestId = %s", (request_id,))
+        if time_off_request['status'] == 'approved':
+            bump_cache_versions(cursor, [week_scope(time_off_request['request_date'])])  # Search availability
         conn.commit()
         
         return jsonify({"success": True, "message": "Time-off request deleted successfully"}), 200
@@ -1,33 +1,12 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
 from datetime import datetime, timedelta, time
-from db import get_connection
+from db import database_operation, read_only
 from utils.middleware import require_any_role
-from utils.async_notifier import send_notifications_async
+from utils.cache_versions import bump_cache_versions
+from utils.availability import week_scope
 
 timesheet_bp = Blueprint('timesheet', __name__, url_prefix='/api')
 
-def database_operation(f):
-    """Decorator to handle database connection and cleanup consistently"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        conn = None
-        cursor = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            return f(cursor, conn, *args, **kwargs)
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    return decorated_function
-
 def get_current_week_monday():
     """Get the Monday of the current week"""
     today = datetime.now().date()
@@ -81,6 +60,45 @@ def get_target_week_monday(agent_id, cursor):
             # Next week not approved or doesn't exist - submit for next week
             return next_monday, "next"
 
+TIMESTAMP_FIELDS = ('submitted_at', 'reviewed_at', 'created_time', 'updated_time')
+
+def serialize_timesheet(timesheet):
+    """Convert a timesheet row's timestamps and week start to strings for the JSON response"""
+    for field in TIMESTAMP_FIELDS:
+        if timesheet.get(field):
+            timesheet[field] = timesheet[field].isoformat()
+    timesheet['week_start_date'] = str(timesheet['week_start_date'])
+    return timesheet
+
+def hydrate_timesheets(cursor, timesheets):
+    """Attach slots to every timesheet with a single query and serialize them"""
+    slots_by_timesheet = {timesheet['timesheet_id']: [] for timesheet in timesheets}
+    
+    if slots_by_timesheet:
+        placeholders = ', '.join(['%s'] * len(slots_by_timesheet))
+        cursor.execute(f"""
+            SELECT timesheet_id, day_of_week, start_time, end_time
+            FROM timesheet_slots
+            WHERE timesheet_id IN ({placeholders})
+            ORDER BY 
+                timesheet_id,
+                FIELD(day_of_week, 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'),
+                start_time
+        """, tuple(slots_by_timesheet))
+        
+        for slot in cursor.fetchall():
+            # Convert time objects to strings
+            slots_by_timesheet[slot['timesheet_id']].append({
+                'day_of_week': slot['day_of_week'],
+                'start_time': str(slot['start_time']),
+                'end_time': str(slot['end_time'])
+            })
+    
+    for timesheet in timesheets:
+        timesheet['slots'] = slots_by_timesheet[timesheet['timesheet_id']]
+        serialize_timesheet(timesheet)
+    return timesheets
+
 def validate_timesheet_data(data):
     """Validate timesheet submission data"""
     if not data.get('slots'):
@@ -220,6 +238,8 @@ def submit_timesheet(cursor, conn):
                 INSERT INTO timesheet_slots (timesheet_id, day_of_week, start_time, end_time)
                 VALUES (%s, %s, %s, %s)
             """, (timesheet_id, slot['day_of_week'], slot['start_time'], slot['end_time']))
+
+        bump_cache_versions(cursor, [week_scope(target_week_start)])  # Search availability
         
         conn.commit()
         
@@ -232,28 +252,6 @@ def submit_timesheet(cursor, conn):
         """, (timesheet_id,))
         created_timesheet = cursor.fetchone()
         
-        # Send notification to dispatcher (async)
-        try:
-            cursor.execute("""
-                SELECT d.email, d.name 
-                FROM dispatchers d 
-                JOIN field_agents fa ON d.team_id = fa.team_id 
-                WHERE fa.agentId = %s
-            """, (agent_id,))
-            dispatcher = cursor.fetchone()
-            
-            if dispatcher:
-                notification_data = {
-                    'type': 'timesheet_submitted',
-                    'agent_name': created_timesheet['agent_name'],
-                    'week_start_date': str(created_timesheet['week_start_date']),
-                    'dispatcher_email': dispatcher['email'],
-                    'dispatcher_name': dispatcher['name']
-                }
-                send_notifications_async([notification_data])
-        except Exception as e:
-            print(f"Failed to send notification: {e}")
-        
         return jsonify({
             "success": True, 
             "message": "Timesheet submitted successfully",
@@ -308,34 +306,7 @@ def get_current_timesheet(cursor, conn):
             }), 200
         
         # Get slots for this timesheet
-        cursor.execute("""
-            SELECT day_of_week, start_time, end_time
-            FROM timesheet_slots
-            WHERE timesheet_id = %s
-            ORDER BY 
-                FIELD(day_of_week, 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'),
-                start_time
-        """, (timesheet['timesheet_id'],))
-        
-        slots = cursor.fetchall()
-        
-        # Convert time objects to strings
-        for slot in slots:
-            slot['start_time'] = str(slot['start_time'])
-            slot['end_time'] = str(slot['end_time'])
-        
-        # Convert timestamps
-        if timesheet['submitted_at']:
-            timesheet['submitted_at'] = timesheet['submitted_at'].isoformat()
-        if timesheet['reviewed_at']:
-            timesheet['reviewed_at'] = timesheet['reviewed_at'].isoformat()
-        if timesheet['created_time']:
-            timesheet['created_time'] = timesheet['created_time'].isoformat()
-        if timesheet['updated_time']:
-            timesheet['updated_time'] = timesheet['updated_time'].isoformat()
-        
-        timesheet['week_start_date'] = str(timesheet['week_start_date'])
-        timesheet['slots'] = slots
+        hydrate_timesheets(cursor, [timesheet])
         timesheet['target_week_type'] = target_week_type
         
         return jsonify({
@@ -354,7 +325,6 @@ def get_pending_timesheets(cursor, conn):
     """Get pending timesheets for review"""
     try:
         user_role = request.role
-        user_id = request.user_id
         
         base_query = """
             SELECT t.*, fa.name as agent_name, fa.email as agent_email
@@ -366,9 +336,9 @@ def get_pending_timesheets(cursor, conn):
         if user_role == 'dispatcher':
             # Dispatchers see only their team's timesheets
             query = base_query + """
-                AND fa.team_id = (SELECT team_id FROM dispatchers WHERE dispatcherId = %s)
+                AND fa.team_id = %s
             """
-            params = [user_id]
+            params = [request.team_id]
         else:  # admin
             # Admins see all pending timesheets
             query = base_query
@@ -379,35 +349,8 @@ def get_pending_timesheets(cursor, conn):
         cursor.execute(query, params)
         timesheets = cursor.fetchall()
         
-        # Get slots for each timesheet
-        for timesheet in timesheets:
-            cursor.execute("""
-                SELECT day_of_week, start_time, end_time
-                FROM timesheet_slots
-                WHERE timesheet_id = %s
-                ORDER BY 
-                    FIELD(day_of_week, 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'),
-                    start_time
-            """, (timesheet['timesheet_id'],))
-            
-            slots = cursor.fetchall()
-            
-            # Convert time objects to strings
-            for slot in slots:
-                slot['start_time'] = str(slot['start_time'])
-                slot['end_time'] = str(slot['end_time'])
-            
-            timesheet['slots'] = slots
-            
-            # Convert timestamps
-            if timesheet['submitted_at']:
-                timesheet['submitted_at'] = timesheet['submitted_at'].isoformat()
-            if timesheet['created_time']:
-                timesheet['created_time'] = timesheet['created_time'].isoformat()
-            if timesheet['updated_time']:
-                timesheet['updated_time'] = timesheet['updated_time'].isoformat()
-            
-            timesheet['week_start_date'] = str(timesheet['week_start_date'])
+        # Get slots for the whole list in one query
+        hydrate_timesheets(cursor, timesheets)
         
         return jsonify({"success": True, "data": timesheets}), 200
         
@@ -444,11 +387,8 @@ def review_timesheet(cursor, conn, timesheet_id):
             return jsonify({"success": False, "error": "Timesheet not found"}), 404
         
         # Permission checks
-        if user_role == 'dispatcher':
-            cursor.execute("SELECT team_id FROM dispatchers WHERE dispatcherId = %s", (user_id,))
-            dispatcher = cursor.fetchone()
-            if not dispatcher or dispatcher['team_id'] != timesheet['team_id']:
-                return jsonify({"success": False, "error": "You can only review timesheets from your team"}), 403
+        if user_role == 'dispatcher' and request.team_id != timesheet['team_id']:
+            return jsonify({"success": False, "error": "You can only review timesheets from your team"}), 403
         
         if timesheet['status'] != 'pending':
             return jsonify({"success": False, "error": "Timesheet has already been reviewed"}), 400
@@ -461,6 +401,8 @@ def review_timesheet(cursor, conn, timesheet_id):
             SET status = %s, reviewed_by = %s, reviewer_type = %s, reviewed_at = NOW(), updated_time = NOW()
             WHERE timesheet_id = %s
         """, (new_status, user_id, user_role, timesheet_id))
+
+        bump_cache_versions(cursor, [week_scope(timesheet['week_start_date'])])  # Search availability
         
         conn.commit()
         
@@ -481,30 +423,8 @@ def review_timesheet(cursor, conn, timesheet_id):
         
         updated_timesheet = cursor.fetchone()
         
-        # Send notification (async)
-        try:
-            notification_data = {
-                'type': f'timesheet_{new_status}',
-                'agent_email': updated_timesheet['agent_email'],
-                'agent_name': updated_timesheet['agent_name'],
-                'week_start_date': str(updated_timesheet['week_start_date']),
-                'reviewer_name': updated_timesheet.get('reviewer_name', 'System')
-            }
-            send_notifications_async([notification_data])
-        except Exception as e:
-            print(f"Failed to send notification: {e}")
-        
         # Convert for JSON response
-        if updated_timesheet['submitted_at']:
-            updated_timesheet['submitted_at'] = updated_timesheet['submitted_at'].isoformat()
-        if updated_timesheet['reviewed_at']:
-            updated_timesheet['reviewed_at'] = updated_timesheet['reviewed_at'].isoformat()
-        if updated_timesheet['created_time']:
-            updated_timesheet['created_time'] = updated_timesheet['created_time'].isoformat()
-        if updated_timesheet['updated_time']:
-            updated_timesheet['updated_time'] = updated_timesheet['updated_time'].isoformat()
-        
-        updated_timesheet['week_start_date'] = str(updated_timesheet['week_start_date'])
+        serialize_timesheet(updated_timesheet)
         
         return jsonify({"success": True, "data": updated_timesheet}), 200
         
@@ -513,6 +433,7 @@ def review_timesheet(cursor, conn, timesheet_id):
 
 @timesheet_bp.route('/timesheet/history', methods=['GET'])
 @require_any_role('field_agent', 'dispatcher', 'admin')
+@read_only
 @database_operation
 def get_timesheet_history(cursor, conn):
     """Get timesheet history with pagination and filtering"""
@@ -555,12 +476,12 @@ def get_timesheet_history(cursor, conn):
             if agent_id_param:
                 # Specific agent requested
                 where_conditions.append("t.agentId = %s")
-                where_conditions.append("fa.team_id = (SELECT team_id FROM dispatchers WHERE dispatcherId = %s)")
-                params.extend([agent_id_param, user_id])
+                where_conditions.append("fa.team_id = %s")
+                params.extend([agent_id_param, request.team_id])
             else:
                 # All agents in their team
-                where_conditions.append("fa.team_id = (SELECT team_id FROM dispatchers WHERE dispatcherId = %s)")
-                params.append(user_id)
+                where_conditions.append("fa.team_id = %s")
+                params.append(request.team_id)
         # Admins see all timesheets (no additional WHERE clause needed)
         
         # Add status filter if provided
@@ -591,37 +512,8 @@ def get_timesheet_history(cursor, conn):
         cursor.execute(count_query, params[:-2])  # Exclude limit and offset
         total_count = cursor.fetchone()['total']
         
-        # Get slots for each timesheet
-        for timesheet in timesheets:
-            cursor.execute("""
-                SELECT day_of_week, start_time, end_time
-                FROM timesheet_slots
-                WHERE timesheet_id = %s
-                ORDER BY 
-                    FIELD(day_of_week, 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'),
-                    start_time
-            """, (timesheet['timesheet_id'],))
-            
-            slots = cursor.fetchall()
-            
-            # Convert time objects to strings
-            for slot in slots:
-                slot['start_time'] = str(slot['start_time'])
-                slot['end_time'] = str(slot['end_time'])
-            
-            timesheet['slots'] = slots
-            
-            # Convert timestamps
-            if timesheet['submitted_at']:
-                timesheet['submitted_at'] = timesheet['submitted_at'].isoformat()
-            if timesheet['reviewed_at']:
-                timesheet['reviewed_at'] = timesheet['reviewed_at'].isoformat()
-            if timesheet['created_time']:
-                timesheet['created_time'] = timesheet['created_time'].isoformat()
-            if timesheet['updated_time']:
-                timesheet['updated_time'] = timesheet['updated_time'].isoformat()
-            
-            timesheet['week_start_date'] = str(timesheet['week_start_date'])
+        # Get slots for the whole page in one query
+        hydrate_timesheets(cursor, timesheets)
         
         # Calculate pagination info
         total_pages = (total_count + limit - 1) // limit
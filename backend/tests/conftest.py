@@ -0,0 +1,17 @@
+"""
+Shared setup for the backend unit tests.
+
+The tests cover pure helpers and need no MySQL server: config gets
+placeholders for the settings it requires, and db (which opens its pool on
+import) is replaced by a stand-in, as in the benchmarks.
+"""
+
+import os
+import sys
+import types
+
+for name, value in {"MYSQL_PORT": "3306", "MYSQL_POOL_SIZE": "4", "SMTP_PORT": "587",
+                    "JWT_SECRET_KEY": "test-secret"}.items():
+    os.environ.setdefault(name, value)
+
+sys.modules.setdefault("db", types.SimpleNamespace(get_connection=None, get_db=None))
@@ -0,0 +1,116 @@
+import itertools
+import random
+
+import pytest
+
+from utils.assignment import min_cost_assignment, plan_assignments
+from utils.availability import RosterAgent
+
+
+def brute_force(cost):
+    """(assigned pairs, total cost) of the best assignment: most pairs first, then least cost"""
+    rows, columns = len(cost), len(cost[0])
+    best = (0, 0.0)
+    if rows <= columns:
+        candidates = (list(enumerate(perm)) for perm in itertools.permutations(range(columns), rows))
+    else:
+        candidates = ([(row, column) for column, row in enumerate(perm)]
+                      for perm in itertools.permutations(range(rows), columns))
+    for pairs in candidates:
+        feasible = [cost[row][column] for row, column in pairs if cost[row][column] is not None]
+        best = max(best, (len(feasible), -sum(feasible)))
+    return best[0], -best[1]
+
+
+def check(cost, pairs):
+    rows = [row for row, _ in pairs]
+    columns = [column for _, column in pairs]
+    assert len(set(rows)) == len(rows) and len(set(columns)) == len(columns)
+    assert all(cost[row][column] is not None for row, column in pairs)
+    return len(pairs), sum(cost[row][column] for row, column in pairs)
+
+
+def test_square():
+    cost = [[4, 1, 3],
+            [2, 0, 5],
+            [3, 2, 2]]
+    assert sorted(min_cost_assignment(cost)) == [(0, 1), (1, 0), (2, 2)]
+
+
+def test_more_columns_than_rows():
+    cost = [[9, 2, 7, 1],
+            [1, 8, 3, 9]]
+    assert sorted(min_cost_assignment(cost)) == [(0, 3), (1, 0)]
+
+
+def test_more_rows_than_columns():
+    cost = [[5, 9],
+            [1, 4],
+            [2, 1]]
+    assert check(cost, min_cost_assignment(cost)) == (2, 2)
+
+
+def test_none_marks_pairs_that_cannot_be_assigned():
+    cost = [[None, 1],
+            [None, 2]]
+    pairs = min_cost_assignment(cost)
+    assert len(pairs) == 1 and pairs[0][1] == 1
+
+
+def test_assigns_as_many_rows_as_possible_before_minimising_cost():
+    # Row 0 taking its cheap column would leave row 1 without one
+    cost = [[1, 10],
+            [2, None]]
+    assert sorted(min_cost_assignment(cost)) == [(0, 1), (1, 0)]
+
+
+def test_empty():
+    assert min_cost_assignment([]) == []
+    assert min_cost_assignment([[]]) == []
+    assert min_cost_assignment([[None]]) == []
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rows, columns = rng.randint(1, 5), rng.randint(1, 5)
+    cost = [[None if rng.random() < 0.3 else rng.randint(0, 20) for _ in range(columns)] for _ in range(rows)]
+    assigned, total = check(cost, min_cost_assignment(cost))
+    assert (assigned, total) == brute_force(cost)
+
+
+def agent(agent_id, latitude=None, longitude=None):
+    return RosterAgent(agent_id, f"Agent {agent_id}", 1, 1, latitude, longitude)
+
+
+def physical(booking_id, minute, latitude, longitude):
+    return {"bookingId": booking_id, "minute": minute, "booking_type": "physical",
+            "latitude": latitude, "longitude": longitude}
+
+
+def test_plan_gives_each_booking_the_closer_agent():
+    near_a, near_b = agent(1, 43.0, -79.0), agent(2, 45.0, -75.0)
+    bookings = [physical(10, 600, 45.01, -75.01), physical(11, 600, 43.01, -79.01)]
+    assignments, unassigned = plan_assignments(bookings, {600: [near_a, near_b]})
+    assert unassigned == []
+    assert {booking["bookingId"]: chosen.agent_id for booking, chosen, _ in assignments} == {10: 2, 11: 1}
+
+
+def test_plan_keeps_agents_out_of_conflicting_start_times():
+    only = agent(1, 43.0, -79.0)
+    bookings = [physical(10, 600, 43.0, -79.0),
+                physical(11, 720, 43.0, -79.0),   # Within two hours of 10:00: conflicts
+                physical(12, 840, 43.0, -79.0)]   # Four hours after 10:00: free again
+    available = {600: [only], 720: [only], 840: [only]}
+    assignments, unassigned = plan_assignments(bookings, available)
+    assert [booking["bookingId"] for booking, _, _ in assignments] == [10, 12]
+    assert [booking["bookingId"] for booking in unassigned] == [11]
+
+
+def test_plan_needs_locations_for_physical_bookings_only():
+    unlocated = agent(1)
+    virtual = {"bookingId": 10, "minute": 600, "booking_type": "virtual", "latitude": None, "longitude": None}
+    assignments, unassigned = plan_assignments([virtual, physical(11, 840, 43.0, -79.0)],
+                                               {600: [unlocated], 840: [unlocated]})
+    assert [(booking["bookingId"], distance) for booking, _, distance in assignments] == [(10, 0.0)]
+    assert [booking["bookingId"] for booking in unassigned] == [11]
@@ -0,0 +1,90 @@
+import types
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+from config import Config
+from utils import middleware
+from utils.middleware import VerifiedTokenCache
+
+
+def make_token(user_id=1, expires_in=timedelta(hours=1)):
+    payload = {'user_id': user_id, 'role': 'admin', 'exp': datetime.utcnow() + expires_in}
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    """Tokens passed to the full JWT verification"""
+    verified = []
+    verify = middleware.verify_jwt_token
+
+    def counting_verify(token):
+        verified.append(token)
+        return verify(token)
+
+    monkeypatch.setattr(middleware, "verify_jwt_token", counting_verify)
+    return verified
+
+
+def set_clock(monkeypatch, now):
+    monkeypatch.setattr(middleware, "time", types.SimpleNamespace(time=lambda: now))
+
+
+def test_verified_token_is_served_from_the_cache(verifications):
+    cache = VerifiedTokenCache()
+    token = make_token()
+    assert cache.verify(token)['user_id'] == 1
+    assert cache.verify(token)['user_id'] == 1
+    assert verifications == [token]
+
+
+def test_cached_token_is_verified_again_once_expired(verifications, monkeypatch):
+    cache = VerifiedTokenCache()
+    token = make_token()
+    exp = cache.verify(token)['exp']
+
+    set_clock(monkeypatch, exp - 1)
+    cache.verify(token)
+    assert len(verifications) == 1
+
+    set_clock(monkeypatch, exp)
+    cache.verify(token)  # Still valid for PyJWT's own clock; the cache entry is not reused
+    assert len(verifications) == 2
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(Exception, match="Token has expired"):
+        VerifiedTokenCache().verify(make_token(expires_in=timedelta(seconds=-10)))
+
+
+def test_invalid_token_is_rejected_and_not_cached(verifications):
+    cache = VerifiedTokenCache()
+    forged = jwt.encode({'user_id': 1, 'role': 'admin', 'exp': datetime.utcnow() + timedelta(hours=1)},
+                        "another-secret", algorithm='HS256')
+    for _ in range(2):
+        with pytest.raises(Exception, match="Invalid token"):
+            cache.verify(forged)
+    assert len(verifications) == 2
+
+
+def test_least_recently_used_entry_is_evicted(verifications):
+    cache = VerifiedTokenCache(max_entries=2)
+    first, second, third = (make_token(user_id) for user_id in (1, 2, 3))
+    cache.verify(first)
+    cache.verify(second)
+    cache.verify(first)   # Now the most recently used
+    cache.verify(third)   # Evicts second
+    cache.verify(first)
+    cache.verify(second)
+    assert verifications == [first, second, third, second]
+
+
+def test_clear(verifications):
+    cache = VerifiedTokenCache()
+    token = make_token()
+    cache.verify(token)
+    cache.clear()
+    cache.verify(token)
+    assert len(verifications) == 2
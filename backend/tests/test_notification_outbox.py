@@ -0,0 +1,98 @@
+import pytest
+
+from utils.notification_outbox import outbox_row, record_results, retry_delay, row_notification
+from utils.provider_guard import ProviderUnavailable
+
+
+class RecordingCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def executemany(self, sql, params):
+        self.statements.append((" ".join(sql.split()), list(params)))
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    """Keeps the statements record_results issues, keyed by their SET clause"""
+
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+
+    def cursor(self, **options):
+        return RecordingCursor(self.statements)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def params(self, set_clause):
+        matches = [params for sql, params in self.statements if f"SET {set_clause}" in sql]
+        assert len(matches) <= 1
+        return matches[0] if matches else []
+
+
+def claimed(row_id, attempts=1, channel='sms'):
+    return {'id': row_id, 'channel': channel, 'attempts': attempts}
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    assert [retry_delay(attempts, base=30, cap=200) for attempts in range(0, 6)] == [30, 30, 60, 120, 200, 200]
+
+
+def test_sent_rows_are_marked_sent():
+    conn = RecordingConnection()
+    assert record_results(conn, [(claimed(1), None), (claimed(2), None)]) == (2, 0, 0, 0)
+    assert conn.params("status = 'sent'") == [(1,), (2,)]
+    assert conn.committed
+
+
+def test_failed_rows_back_off_until_max_attempts():
+    conn = RecordingConnection()
+    results = [(claimed(1, attempts=1), RuntimeError("timeout")),
+               (claimed(2, attempts=3), RuntimeError("timeout")),
+               (claimed(3, attempts=6), RuntimeError("rejected"))]
+    assert record_results(conn, results, max_attempts=6) == (0, 2, 1, 0)
+    assert conn.params("next_attempt_at") == [(retry_delay(1), "timeout", 1), (retry_delay(3), "timeout", 2)]
+    assert conn.params("status = 'failed'") == [("rejected", 3)]
+
+
+def test_error_text_is_truncated():
+    conn = RecordingConnection()
+    record_results(conn, [(claimed(1), RuntimeError("x" * 5000))])
+    (_, error, _), = conn.params("next_attempt_at")
+    assert len(error) == 1000
+
+
+def test_refused_sends_are_deferred_without_counting_the_attempt():
+    conn = RecordingConnection()
+    results = [(claimed(1, attempts=6), ProviderUnavailable("sms", "circuit open", 12.4)),
+               (claimed(2), ProviderUnavailable("sms", "rate limited", 0.2))]
+    # Deferred even on the last attempt: the claim's attempt is given back
+    assert record_results(conn, results, max_attempts=6) == (0, 0, 0, 2)
+    assert conn.params("attempts = attempts - 1") == [(12, 1), (1, 2)]  # At least a second
+    assert conn.params("status = 'failed'") == []
+
+
+@pytest.mark.parametrize("notification", [
+    {'type': 'sms', 'phone': '+15550100', 'message': 'Booked'},
+    {'type': 'email', 'email': 'a@example.com', 'subject': 'Booking Confirmation', 'html_body': '<p>Booked</p>'},
+])
+def test_outbox_row_round_trip(notification):
+    channel, recipient, subject, body = outbox_row(notification)
+    row = {'channel': channel, 'recipient': recipient, 'subject': subject, 'body': body}
+    assert row_notification(row) == notification
+
+
+@pytest.mark.parametrize("notification", [
+    {'type': 'sms', 'phone': None, 'message': 'Booked'},
+    {'type': 'email', 'email': '', 'subject': 'Booking Confirmation', 'html_body': '<p>Booked</p>'},
+    {'type': 'time_off_requested'},
+])
+def test_undeliverable_notifications_have_no_outbox_row(notification):
+    assert outbox_row(notification) is None
@@ -0,0 +1,86 @@
+import base64
+
+import pytest
+
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageRequest, decode_cursor, encode_cursor,
+    get_page_request, keyset_condition, parse_page_size, split_page
+)
+
+
+def booking(booking_id, booking_date="2026-10-16", booking_time="09:30:00"):
+    return {"bookingId": booking_id, "booking_date": booking_date, "booking_time": booking_time}
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(booking(42))
+    assert decode_cursor(token) == ("2026-10-16", "09:30:00", 42)
+
+
+def test_cursor_is_url_safe_without_padding():
+    token = encode_cursor(booking(1))
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b'["2026-10-16", "09:30:00"]').decode(),      # Too few fields
+    base64.urlsafe_b64encode(b'["2026-10-16", "09:30:00", "x"]').decode(),  # Non-numeric ID
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),                         # Not UTF-8
+    base64.urlsafe_b64encode(b"42").decode(),                               # Not a list
+])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(token)
+
+
+def test_keyset_condition_expands_the_row_comparison():
+    condition, params = keyset_condition(("2026-10-16", "09:30:00", 42))
+    assert " ".join(condition.split()) == (
+        "(b.booking_date > %s OR (b.booking_date = %s AND ("
+        " b.booking_time > %s OR (b.booking_time = %s AND b.bookingId > %s))))"
+    )
+    assert params == ["2026-10-16", "2026-10-16", "09:30:00", "09:30:00", 42]
+
+
+def test_keyset_condition_matches_tuple_order():
+    position = ("2026-10-16", "09:30:00", 42)
+    rows = [(date, time, booking_id)
+            for date in ("2026-10-15", "2026-10-16", "2026-10-17")
+            for time in ("09:00:00", "09:30:00", "10:00:00")
+            for booking_id in (41, 42, 43)]
+
+    def after(row):
+        # The condition from keyset_condition, evaluated in Python
+        date, time, booking_id = row
+        return date > position[0] or (date == position[0] and (
+            time > position[1] or (time == position[1] and booking_id > position[2])))
+
+    assert [row for row in rows if after(row)] == [row for row in rows if row > position]
+
+
+def test_page_size_default_cap_and_errors():
+    assert parse_page_size(None) == DEFAULT_PAGE_SIZE
+    assert parse_page_size("") == DEFAULT_PAGE_SIZE
+    assert parse_page_size("25") == 25
+    assert parse_page_size(str(MAX_PAGE_SIZE + 1)) == MAX_PAGE_SIZE
+    for value in ("0", "-1", "ten"):
+        with pytest.raises(InvalidPageRequest):
+            parse_page_size(value)
+
+
+def test_get_page_request_decodes_the_cursor():
+    token = encode_cursor(booking(7))
+    assert get_page_request({"cursor": token, "limit": "10"}) == (("2026-10-16", "09:30:00", 7), 10)
+    assert get_page_request({}) == (None, DEFAULT_PAGE_SIZE)
+
+
+def test_split_page_points_past_the_last_row_kept():
+    rows = [booking(booking_id) for booking_id in range(1, 5)]
+    page, next_cursor = split_page(rows, 3)
+    assert [row["bookingId"] for row in page] == [1, 2, 3]
+    assert decode_cursor(next_cursor)[2] == 3
+
+    page, next_cursor = split_page(rows, 4)
+    assert len(page) == 4 and next_cursor is None
@@ -0,0 +1,123 @@
+import types
+
+import pytest
+
+from utils import provider_guard
+from utils.provider_guard import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderGuard, ProviderUnavailable, TokenBucket
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(provider_guard, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        assert bucket.wait_time() == 0
+        bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+    clock.now += 0.25
+    assert bucket.wait_time() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.wait_time() == 0
+
+
+def test_bucket_refill_stops_at_the_burst(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    bucket.take()
+    clock.now += 60
+    bucket.wait_time()
+    assert bucket.tokens == 3
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    assert not breaker.record_failure()
+    breaker.record_success()  # Resets the count
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.wait_time() == pytest.approx(30)
+
+
+def test_breaker_half_opens_after_the_reset_period(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert breaker.wait_time() == pytest.approx(1)
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.wait_time() == 0
+    assert breaker.state == HALF_OPEN
+
+
+def test_successful_trial_closes_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.wait_time()
+    breaker.start()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0
+    assert breaker.wait_time() == 0
+
+
+def test_failed_trial_reopens_the_breaker_for_another_period(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    breaker.wait_time()
+    breaker.start()
+    assert breaker.record_failure()  # One failure is enough while half-open
+    assert breaker.state == OPEN
+    assert breaker.wait_time() == pytest.approx(30)
+
+
+def test_guard_lets_a_single_trial_send_through_while_half_open(clock):
+    guard = ProviderGuard("sms", rate=100, burst=10, failure_threshold=1, reset_seconds=30)
+    guard.acquire()
+    guard.record_failure()
+    with pytest.raises(ProviderUnavailable, match="circuit open") as refused:
+        guard.acquire()
+    assert refused.value.retry_after == pytest.approx(30)
+
+    clock.now += 30
+    assert guard.available() == 1
+    guard.acquire()  # The trial send
+    assert guard.available() == 0
+    with pytest.raises(ProviderUnavailable, match="circuit open"):
+        guard.acquire()
+
+    guard.record_success()
+    assert guard.stats()["state"] == CLOSED
+    for _ in range(3):
+        guard.acquire()
+
+
+def test_guard_refuses_past_the_rate(clock):
+    guard = ProviderGuard("email", rate=0.5, burst=2)
+    guard.acquire()
+    guard.acquire()
+    with pytest.raises(ProviderUnavailable, match="rate limited") as refused:
+        guard.acquire()
+    assert refused.value.retry_after == pytest.approx(2)
+    assert guard.stats()["rejected_rate"] == 1
+
+    clock.now += 2
+    guard.acquire()
@@ -0,0 +1,132 @@
+"""
+Batch assignment of unassigned bookings to available agents
+(POST /assignments/optimize).
+
+Bookings are taken one start time at a time, in chronological order. All
+bookings starting at the same time are matched to the agents available then
+with a min-cost assignment (Hungarian algorithm) on travel distance from the
+agent's location to the customer. An agent given a booking is then kept out
+of every later start time that conflicts with it (two hours either side, the
+same rule search uses), so each group is optimal given the earlier ones.
+"""
+
+from utils.availability import APPOINTMENT_MINUTES, distance_km
+
+
+def min_cost_assignment(cost):
+    """
+    Minimum-cost assignment for a rectangular cost matrix.
+
+    Args:
+        cost: list of rows; None marks a pair that cannot be assigned
+
+    Returns:
+        list: (row, column) pairs; as many rows as possible are assigned, then
+        the total cost is minimised
+    """
+    if not cost or not cost[0]:
+        return []
+
+    transposed = len(cost) > len(cost[0])
+    if transposed:
+        cost = [list(column) for column in zip(*cost)]
+    rows, columns = len(cost), len(cost[0])
+
+    # Infeasible pairs cost more than any complete feasible assignment
+    finite = [value for row in cost for value in row if value is not None]
+    forbidden = (max(finite, default=0) + 1) * (rows + 1)
+    matrix = [[forbidden if value is None else value for value in row] for row in cost]
+
+    # Shortest augmenting path with potentials (1-indexed; column 0 is a sentinel)
+    INF = float("inf")
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (columns + 1)
+    owner = [0] * (columns + 1)  # Row assigned to each column
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        j0 = 0
+        min_reduced = [INF] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            delta, j1 = INF, 0
+            for j in range(1, columns + 1):
+                if used[j]:
+                    continue
+                reduced = matrix[i0 - 1][j - 1] - u[i0] - v[j]
+                if reduced < min_reduced[j]:
+                    min_reduced[j], way[j] = reduced, j0
+                if min_reduced[j] < delta:
+                    delta, j1 = min_reduced[j], j
+            for j in range(columns + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_reduced[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    pairs = [(owner[j] - 1, j - 1) for j in range(1, columns + 1)
+             if owner[j] and cost[owner[j] - 1][j - 1] is not None]
+    return [(column, row) for row, column in pairs] if transposed else pairs
+
+
+def travel_cost(booking, agent):
+    """Distance from the agent to the customer; None when the agent cannot take it"""
+    if booking["booking_type"] == "virtual":
+        return 0.0
+    if agent.latitude is None or booking["latitude"] is None:
+        return None  # Physical bookings need both locations, as in search
+    return distance_km(agent.latitude, agent.longitude, float(booking["latitude"]), float(booking["longitude"]))
+
+
+def plan_assignments(bookings, available):
+    """
+    Assign bookings to agents.
+
+    Args:
+        bookings: dicts with bookingId, minute (start minute of day), booking_type,
+            latitude and longitude
+        available: start minute -> list of RosterAgent available at that minute
+
+    Returns:
+        tuple: (list of (booking, agent, distance) assignments, list of unassigned bookings)
+    """
+    assigned_minutes = {}  # agentId -> start minutes already given in this plan
+    assignments, unassigned = [], []
+
+    for minute in sorted({booking["minute"] for booking in bookings}):
+        group = [booking for booking in bookings if booking["minute"] == minute]
+        agents = [
+            agent for agent in available.get(minute, [])
+            if all(abs(minute - other) > APPOINTMENT_MINUTES for other in assigned_minutes.get(agent.agent_id, []))
+        ]
+        cost = [[travel_cost(booking, agent) for agent in agents] for booking in group]
+
+        # Each booking can only end up with one of its len(group) cheapest agents,
+        # so the other agents can be dropped before matching
+        keep = set()
+        for row in cost:
+            feasible = sorted((value, index) for index, value in enumerate(row) if value is not None)
+            keep.update(index for _, index in feasible[:len(group)])
+        keep = sorted(keep)
+        agents = [agents[index] for index in keep]
+        cost = [[row[index] for index in keep] for row in cost]
+
+        matched = set()
+        for row, column in min_cost_assignment(cost):
+            booking, agent = group[row], agents[column]
+            assignments.append((booking, agent, cost[row][column]))
+            assigned_minutes.setdefault(agent.agent_id, []).append(minute)
+            matched.add(row)
+        unassigned.extend(booking for row, booking in enumerate(group) if row not in matched)
+
+    return assignments, unassigned
@@ -1,40 +1,42 @@
-import threading
+"""
+Notification dictionaries and their delivery.
+
+Routes build notifications with prepare_booking_notifications() and write
+them to the outbox (utils.notification_outbox) in the transaction that
+causes them; only the notification sender process (notification_sender.py)
+delivers them, with deliver_notification(). Web workers never talk to the
+SMS and email providers, so the provider guards (utils.provider_guard) are
+enforced in one place.
+"""
+
 from typing import Dict, Any
-from utils.notifier import send_sms, send_email, is_production_environment
-from config import Config
+from utils.notifier import send_sms, send_email
 import logging
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-def send_notifications_async(notifications: list):
+
+def deliver_notification(notification: dict):
     """
-    Send notifications asynchronously in a background thread.
-    Environment-aware: only sends in production, logs in development.
-    
-    Args:
-        notifications (list): List of notification dictionaries
+    Send one notification dictionary (sms or email).
+
+    Returns:
+        bool: whether the provider accepted it (None for types not delivered)
+
+    Raises:
+        ProviderUnavailable: circuit open or rate limited (nothing was sent)
     """
-    if not notifications:
-        return
-        
-    def _send_notifications():
-        env_prefix = "[PROD]" if is_production_environment() else "[DEV]"
-        logger.info(f"{env_prefix} Processing {len(notifications)} notifications")
-        
-        for notification in notifications:
-            if notification['type'] == 'sms' and notification.get('phone'):
-                send_sms(notification['phone'], notification['message'])
-            elif notification['type'] == 'email' and notification.get('email'):
-                send_email(
-                    to_email=notification['email'],
-                    subject=notification['subject'],
-                    html_body=notification['html_body']
-                )
-    
-    # Start notifications in a background thread
-    thread = threading.Thread(target=_send_notifications, daemon=True)
-    thread.start()
+    if notification['type'] == 'sms' and notification.get('phone'):
+        return send_sms(notification['phone'], notification['message'])
+    elif notification['type'] == 'email' and notification.get('email'):
+        return send_email(
+            to_email=notification['email'],
+            subject=notification['subject'],
+            html_body=notification['html_body']
+        )
+    return None
+
 
 def prepare_booking_notifications(booking_data: Dict[str, Any], is_update: bool = False) -> list:
     """
@@ -107,4 +109,5 @@ def prepare_booking_notifications(booking_data: Dict[str, Any], is_update: bool
                 'message': agent_message
             })
     
-    return notifications
\ No newline at end of file
+    return notifications
+
@@ -0,0 +1,147 @@
+"""
+Team and region claims carried in the auth token.
+
+Login embeds the user's team_id and region_id in the JWT together with the
+membership version (``mv``) they were read at. Writes that change who is in
+which team, or which region a team is in, bump the ``membership`` cache
+scope. While a token's ``mv`` matches the current version its claims are
+used as-is, so authorized requests no longer look up the caller's team or
+region; otherwise the claims are reloaded once and a refreshed token is set
+on the response.
+
+Each process reads the membership version at most every
+MEMBERSHIP_POLL_SECONDS, and immediately after handling a write that bumped
+cache versions, so a membership change made through another worker takes
+effect within that interval.
+"""
+
+import threading
+import time
+
+from flask import g, request
+from db import get_connection, get_db
+from utils.cache_versions import get_cache_versions
+
+MEMBERSHIP_SCOPE = "membership"
+MEMBERSHIP_POLL_SECONDS = 5
+
+
+class MembershipVersion:
+    """Process-local copy of the membership scope version"""
+
+    def __init__(self, poll_interval=MEMBERSHIP_POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self._version = None
+        self._read_at = 0.0
+        self._reading = False
+        self._invalidations = 0
+        self._lock = threading.Lock()  # Guards the cached value only; never held across a query
+
+    def current(self):
+        with self._lock:
+            expired = time.monotonic() - self._read_at > self.poll_interval
+            # While one thread re-reads an expired version, the others keep using the last one
+            if self._version is not None and (not expired or self._reading):
+                return self._version
+            self._reading = True
+            invalidations = self._invalidations
+
+        try:
+            version = self._read_version()
+        finally:
+            with self._lock:
+                self._reading = False
+
+        with self._lock:
+            if self._invalidations == invalidations:  # Else it may predate the bump that invalidated it
+                self._version = version
+                self._read_at = time.monotonic()
+        return version
+
+    def invalidate(self):
+        """Re-read the version on next use"""
+        with self._lock:
+            self._version = None
+            self._invalidations += 1
+
+    @staticmethod
+    def _read_version():
+        """Read on a connection of its own, so the caller's request connection is not checked out for it"""
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            (_, version), = get_cache_versions(cursor, [MEMBERSHIP_SCOPE])
+            cursor.close()
+            conn.rollback()
+            return version
+        finally:
+            conn.close()
+
+
+membership_version = MembershipVersion()
+
+
+def load_membership_claims(cursor, user_id, role):
+    """Current team_id and region_id of a user (None for admins and users without a team)"""
+    tables = {
+        'dispatcher': ('dispatchers', 'dispatcherId'),
+        'field_agent': ('field_agents', 'agentId'),
+    }
+    if role not in tables:
+        return {"team_id": None, "region_id": None}
+
+    table, id_column = tables[role]
+    cursor.execute(f"""
+        SELECT u.team_id, t.region_id
+        FROM {table} u
+        LEFT JOIN teams t ON u.team_id = t.teamId
+        WHERE u.{id_column} = %s
+    """, (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        return {"team_id": None, "region_id": None}
+    return {"team_id": row["team_id"], "region_id": row["region_id"]}
+
+
+def current_membership_claims(user_id, role):
+    """Claims and the membership version they are valid for, read from the database"""
+    version = membership_version.current()  # Read first: a change made meanwhile bumps past it
+    cursor = get_db().cursor(dictionary=True)
+    try:
+        claims = load_membership_claims(cursor, user_id, role)
+    finally:
+        cursor.close()
+    return dict(claims, mv=version)
+
+
+def apply_membership_claims(payload):
+    """
+    Expose the caller's team_id and region_id on ``request``.
+
+    Admins have no claims. A token whose claims are missing or outdated is
+    answered from the database, and a refreshed token is scheduled for the
+    response (see routes.auth.refresh_auth_cookie). request.membership_version
+    is the membership version the claims are valid for (None for admins).
+    """
+    request.team_id = None
+    request.region_id = None
+    request.membership_version = None
+    if payload['role'] == 'admin':
+        return
+
+    if 'mv' in payload and payload['mv'] == membership_version.current():
+        claims = payload
+    else:
+        claims = current_membership_claims(payload['user_id'], payload['role'])
+        g.refreshed_claims = (payload, claims)
+
+    request.team_id = claims['team_id']
+    request.region_id = claims['region_id']
+    request.membership_version = claims['mv']
+
+
+def expire_membership_version(response):
+    """after_request hook: re-read the membership version after requests that bumped cache versions"""
+    if g.get("cache_bumped"):
+        membership_version.invalidate()
+    return response
@@ -0,0 +1,639 @@
+"""
+In-memory availability engine behind GET /search.
+
+Each process keeps, per cached week, a compact picture of who can take a
+two-hour appointment:
+
+    - timesheets: status per agent, plus a bitmap per agent and weekday of the
+      minutes at which an approved slot can start a full appointment
+    - time-off: a bitmap per agent and date of the minutes covered by approved
+      time-off (kept with the rows themselves for the reason text)
+    - bookings: a bitmap per agent and date of booked start minutes
+
+Bitmaps are Python ints with bit ``m`` standing for minute ``m`` of the day, so
+an availability check is a handful of shifts and masks instead of the
+five-table join the search used to run.
+
+The engine is kept current incrementally:
+
+    - booking writes already stamp rows for delta sync (utils.booking_sync);
+      the engine replays bookings/booking_deletions past its last sync version
+    - timesheet and time-off writes bump ``availability:week:<monday>`` and
+      only that week is reloaded
+    - agent writes (name, team, location) bump ``agents`` and the roster is
+      reloaded
+
+Versions live in the database, so every gunicorn worker converges on the same
+state after each write no matter which worker handled it.
+
+Searches read the published state under a short in-memory lock. A refresh
+reads versions and loads whatever changed without that lock (one refresh at a
+time per process) and only takes it to swap the new state in, so a slow
+database holds up the threads that need newer state, not every search. The
+weeks a search refreshed stay pinned until it is done with them, so refreshes
+of other weeks cannot evict them in between (the cache may then briefly hold
+more than max_weeks weeks).
+
+evaluate_with_stamp() also returns a stamp of everything the result depends
+on (roster, the week's schedule, the bookings on that date); GET /search
+caches results against it (see utils.search_cache).
+"""
+
+import bisect
+import math
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from utils.booking_sync import MAX_DELTA_SIZE, get_pruned_version, get_sync_version
+from utils.cache_versions import get_cache_versions
+
+APPOINTMENT_MINUTES = 120  # Each appointment takes 2 hours
+MINUTES_PER_DAY = 24 * 60
+# Bookable slot starts within business hours (10am-8pm, see timesheet_slots)
+SLOT_START_MINUTES = list(range(10 * 60, 20 * 60, APPOINTMENT_MINUTES))
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+MAX_CACHED_WEEKS = 12
+
+DAYS_OF_WEEK = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+EARTH_RADIUS_KM = 6371  # Same radius the SQL distance formula used
+KM_PER_DEGREE_LAT = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+ROSTER_SCOPE = "agents"
+RESET = "reset"  # Booking changes too many (or too old) to replay: reload every cached week
+
+# Search ordering: available agents, then agents free apart from an existing booking, then the rest
+STATUS_RANK = {"available": 0, "unavailable (already booked)": 1}
+
+
+def week_start(day):
+    """Monday of the week containing the given date"""
+    return day - timedelta(days=day.weekday())
+
+
+def week_scope(day):
+    """cache_versions scope covering timesheets and time-off in the week of ``day``"""
+    if isinstance(day, str):
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    return f"availability:week:{week_start(day).isoformat()}"
+
+
+def minute_of_day(value):
+    """Minute of the day for a TIME column (timedelta), time or 'HH:MM[:SS]' string"""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute
+    parts = [int(part) for part in str(value).split(":")]
+    return parts[0] * 60 + parts[1]
+
+
+def format_time(value):
+    """Render a TIME column the way MySQL's CONCAT does (HH:MM:SS)"""
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)
+
+
+def minute_range(start, end):
+    """Bitmap with minutes start..end (inclusive) set, clipped to the day"""
+    start, end = max(start, 0), min(end, MINUTES_PER_DAY - 1)
+    if end < start:
+        return 0
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+def bounding_box(lat, lon, distance_km):
+    """
+    Latitude/longitude ranges enclosing every point within distance_km of (lat, lon).
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lon, max_lon); the longitude range is None
+        when the box reaches a pole or crosses the antimeridian
+    """
+    delta_lat = distance_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    # Longitude degrees shrink with latitude; use the box edge nearest a pole
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    delta_lon = distance_km / (KM_PER_DEGREE_LAT * cos_lat)
+    min_lon, max_lon = lon - delta_lon, lon + delta_lon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance (spherical law of cosines, rounded like the old SQL)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    cosine = math.cos(lat1) * math.cos(lat2) * math.cos(lon2 - lon1) + math.sin(lat1) * math.sin(lat2)
+    return round(EARTH_RADIUS_KM * math.acos(max(-1.0, min(1.0, cosine))), 1)
+
+
+def rank_search_results(agents, by_distance=True):
+    """
+    Order evaluated agents for GET /search: available first, then the detailed
+    unavailable list, each group nearest first (or by name for virtual bookings).
+    """
+    if by_distance:
+        return sorted(agents, key=lambda agent: (
+            STATUS_RANK.get(agent["availability_status"], 2), agent["distance"], agent["agentId"]
+        ))
+    return sorted(agents, key=lambda agent: (
+        STATUS_RANK.get(agent["availability_status"], 2), agent["name"], agent["agentId"]
+    ))
+
+
+class RosterAgent:
+    """Search-relevant fields of one field agent"""
+
+    __slots__ = ("agent_id", "name", "team_id", "region_id", "latitude", "longitude")
+
+    def __init__(self, agent_id, name, team_id, region_id, latitude, longitude):
+        self.agent_id = agent_id
+        self.name = name
+        self.team_id = team_id
+        self.region_id = region_id
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class WeekSchedule:
+    """Timesheets and approved time-off for one week"""
+
+    def __init__(self, monday, version):
+        self.monday = monday
+        self.version = version
+        self.timesheet_status = {}  # agentId -> timesheet status
+        self.slot_starts = {}       # (agentId, weekday) -> bitmap of minutes a full appointment can start
+        self.time_off = {}          # (agentId, date) -> bitmap of minutes covered by approved time-off
+        self.time_off_rows = {}     # (agentId, date) -> approved time-off rows, for the reason text
+
+    def load(self, cursor):
+        sunday = self.monday + timedelta(days=6)
+
+        cursor.execute("""
+            SELECT ts.agentId, ts.status, tss.day_of_week, tss.start_time, tss.end_time
+            FROM timesheets ts
+            LEFT JOIN timesheet_slots tss ON ts.timesheet_id = tss.timesheet_id
+            WHERE ts.week_start_date = %s
+        """, (self.monday,))
+        for row in cursor.fetchall():
+            agent_id = row["agentId"]
+            self.timesheet_status[agent_id] = row["status"]
+            if row["day_of_week"] is None:
+                continue
+            # A slot can host an appointment starting at t when start <= t and end >= t + 2h
+            start = minute_of_day(row["start_time"])
+            last_start = minute_of_day(row["end_time"]) - APPOINTMENT_MINUTES
+            key = (agent_id, DAYS_OF_WEEK.index(row["day_of_week"]))
+            self.slot_starts[key] = self.slot_starts.get(key, 0) | minute_range(start, last_start)
+
+        cursor.execute("""
+            SELECT requestId, agentId, request_date, start_time, end_time, is_full_day
+            FROM time_off_requests
+            WHERE status = 'approved' AND request_date BETWEEN %s AND %s
+            ORDER BY requestId
+        """, (self.monday, sunday))
+        for row in cursor.fetchall():
+            key = (row["agentId"], row["request_date"])
+            if row["is_full_day"]:
+                covered = FULL_DAY
+            elif row["start_time"] is not None and row["end_time"] is not None:
+                covered = minute_range(minute_of_day(row["start_time"]), minute_of_day(row["end_time"]))
+            else:
+                continue
+            self.time_off[key] = self.time_off.get(key, 0) | covered
+            self.time_off_rows.setdefault(key, []).append(row)
+
+    def time_off_reason(self, agent_id, day, minute):
+        """Reason text for the first approved time-off covering the minute"""
+        for row in self.time_off_rows.get((agent_id, day), []):
+            if row["is_full_day"]:
+                return "Time-off: Full day"
+            if minute_of_day(row["start_time"]) <= minute <= minute_of_day(row["end_time"]):
+                return f"Time-off: {format_time(row['start_time'])} - {format_time(row['end_time'])}"
+        return "Time-off"
+
+
+class AvailabilityEngine:
+    """Process-local availability state shared by all request threads"""
+
+    def __init__(self, max_weeks=MAX_CACHED_WEEKS):
+        self.max_weeks = max_weeks
+        self._lock = threading.Lock()          # Published state: read by searches, swapped by refreshes
+        self._refresh_lock = threading.Lock()  # One refresh at a time; held across its queries
+        self.roster_version = None
+        self.roster = []            # Agents with a location, sorted by latitude
+        self.roster_latitudes = []
+        self.unlocated = []         # Agents without a location (virtual bookings only)
+        self.weeks = OrderedDict()  # monday -> WeekSchedule, least recently used first
+        self.pins = {}              # monday -> searches using the week (not evicted meanwhile)
+        self.sync_version = None
+        self.bookings = {}            # bookingId -> (agentId, date), bookings in cached weeks only
+        self.agent_day_bookings = {}  # (agentId, date) -> {bookingId: start minute}
+        self.booked = {}              # (agentId, date) -> bitmap of booked start minutes
+        self.date_versions = {}       # date -> sync version of the last booking change on it (cached weeks)
+        self.week_loads = {}          # monday -> serial of the last full load of the week's bookings
+        self._load_serial = 0
+
+    def evaluate(self, conn, booking_date, booking_time, team_id=None, origin=None, max_distance_km=None):
+        """
+        Availability status of every candidate agent for an appointment at
+        booking_date/booking_time.
+
+        Args:
+            conn: connection used to refresh the engine (its transaction is ended)
+            booking_date: date of the appointment
+            booking_time: start time ('HH:MM[:SS]', time or timedelta)
+            team_id: only consider agents of this team
+            origin: (latitude, longitude) of a physical booking, None for virtual
+            max_distance_km: only consider agents this close to origin
+
+        Returns:
+            list: unsorted dicts with name, agentId, team_id, distance,
+            availability_status and unavailable_reason
+        """
+        return self.evaluate_with_stamp(conn, booking_date, booking_time, team_id, origin, max_distance_km)[0]
+
+    def evaluate_with_stamp(self, conn, booking_date, booking_time, team_id=None, origin=None, max_distance_km=None):
+        """
+        Same as evaluate(), plus the stamp of the state the result was computed from.
+
+        Returns:
+            tuple: (list of agent dicts, stamp)
+        """
+        monday = week_start(booking_date)
+        minute = minute_of_day(booking_time)
+
+        with self._refreshed(conn, [monday]), self._lock:
+            schedule = self.weeks[monday]
+            agents = [
+                self._status(agent, schedule, booking_date, minute, distance)
+                for agent, distance in self._candidates(team_id, origin, max_distance_km)
+            ]
+            return agents, self._stamp(booking_date)
+
+    def stamp(self, conn, day):
+        """
+        Refresh and return the stamp for searches on the given date.
+
+        Two equal stamps mean nothing a search on that date reads (roster,
+        the week's timesheets and time-off, the date's bookings) has changed.
+        """
+        with self._refreshed(conn, [week_start(day)]), self._lock:
+            return self._stamp(day)
+
+    def available_by_slot(self, conn, days, team_id=None, region_id=None, slot_minutes=SLOT_START_MINUTES):
+        """
+        Agents available for an appointment at each slot start of each day.
+
+        Args:
+            conn: connection used to refresh the engine (its transaction is ended)
+            days: dates to cover (at most max_weeks distinct weeks)
+            team_id: only consider agents of this team
+            region_id: only consider agents whose team is in this region
+            slot_minutes: slot start times as minutes of the day
+
+        Returns:
+            dict: date -> list (one entry per slot) of RosterAgent lists, by agent ID
+        """
+        # Per slot: the start bit and the window in which an existing booking conflicts
+        masks = [(1 << minute, minute_range(minute - APPOINTMENT_MINUTES, minute + APPOINTMENT_MINUTES))
+                 for minute in slot_minutes]
+
+        mondays = sorted({week_start(day) for day in days})
+        with self._refreshed(conn, mondays), self._lock:
+            return self._available_by_slot(days, team_id, region_id, masks)
+
+    def _available_by_slot(self, days, team_id, region_id, masks):
+        """available_by_slot() over the published state (call under self._lock)"""
+        agents = sorted(
+            (agent for agent in self.roster + self.unlocated
+             if (team_id is None or agent.team_id == team_id)
+             and (region_id is None or agent.region_id == region_id)),
+            key=lambda agent: agent.agent_id
+        )
+
+        result = {}
+        for day in days:
+            schedule = self.weeks[week_start(day)]
+            weekday = day.weekday()
+            slots = [[] for _ in masks]
+            for agent in agents:
+                agent_id = agent.agent_id
+                if schedule.timesheet_status.get(agent_id) != "approved":
+                    continue
+                free = schedule.slot_starts.get((agent_id, weekday), 0) & ~schedule.time_off.get((agent_id, day), 0)
+                if not free:
+                    continue
+                booked = self.booked.get((agent_id, day), 0)
+                for index, (bit, window) in enumerate(masks):
+                    if free & bit and not booked & window:
+                        slots[index].append(agent)
+            result[day] = slots
+        return result
+
+    def _candidates(self, team_id, origin, max_distance_km):
+        """Yield (agent, distance) for agents matching the team and distance filters"""
+        if origin is None:
+            for agent in self.roster + self.unlocated:
+                if team_id is None or agent.team_id == team_id:
+                    yield agent, None
+            return
+
+        lat, lon = origin
+        agents = self.roster
+        min_lon = max_lon = None
+        if max_distance_km is not None:
+            min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, max_distance_km)
+            low = bisect.bisect_left(self.roster_latitudes, min_lat)
+            high = bisect.bisect_right(self.roster_latitudes, max_lat)
+            agents = self.roster[low:high]
+
+        for agent in agents:
+            if team_id is not None and agent.team_id != team_id:
+                continue
+            if min_lon is not None and not (min_lon <= agent.longitude <= max_lon):
+                continue
+            distance = distance_km(lat, lon, agent.latitude, agent.longitude)
+            if max_distance_km is not None and distance > max_distance_km:
+                continue
+            yield agent, distance
+
+    def _status(self, agent, schedule, day, minute, distance):
+        agent_id = agent.agent_id
+        bit = 1 << minute
+        timesheet_status = schedule.timesheet_status.get(agent_id)
+        # Any booking starting within two hours either side of the requested start
+        window = minute_range(minute - APPOINTMENT_MINUTES, minute + APPOINTMENT_MINUTES)
+
+        status, reason = "available", None
+        if schedule.time_off.get((agent_id, day), 0) & bit:
+            status, reason = "unavailable (time-off)", schedule.time_off_reason(agent_id, day, minute)
+        elif timesheet_status is None:
+            status, reason = "unavailable (no timesheet)", "No timesheet submitted"
+        elif timesheet_status != "approved":
+            status, reason = "unavailable (timesheet not approved)", f"Timesheet status: {timesheet_status}"
+        elif not schedule.slot_starts.get((agent_id, day.weekday()), 0) & bit:
+            status, reason = "unavailable (not scheduled)", "Not scheduled for this time"
+        elif self.booked.get((agent_id, day), 0) & window:
+            status, reason = "unavailable (already booked)", "Already assigned to another appointment"
+
+        return {
+            "name": agent.name,
+            "agentId": agent_id,
+            "team_id": agent.team_id,
+            "distance": distance,
+            "availability_status": status,
+            "unavailable_reason": reason,
+        }
+
+    # Refreshing
+
+    def _stamp(self, day):
+        monday = week_start(day)
+        return (self.roster_version, self.weeks[monday].version, self.week_loads[monday], self.date_versions.get(day, 0))
+
+    @contextmanager
+    def _refreshed(self, conn, mondays):
+        """Refresh the weeks and keep them pinned (never evicted) until the block ends"""
+        pinned = []
+        try:
+            for monday in mondays:
+                self._refresh(conn, monday, pinned)
+            yield
+        finally:
+            with self._lock:
+                for monday in pinned:
+                    self.pins[monday] -= 1
+                    if not self.pins[monday]:
+                        del self.pins[monday]
+                self._evict()
+
+    def _pin(self, monday, pinned):
+        """Mark the week used and pin it for the caller (call under self._lock)"""
+        self.weeks.move_to_end(monday)
+        self.pins[monday] = self.pins.get(monday, 0) + 1
+        pinned.append(monday)
+
+    def _evict(self):
+        """Drop least recently used unpinned weeks past max_weeks (call under self._lock)"""
+        excess = len(self.weeks) - self.max_weeks
+        for monday in [monday for monday in self.weeks if monday not in self.pins][:max(excess, 0)]:
+            del self.weeks[monday]
+            self._forget_week(monday)
+
+    def _refresh(self, conn, monday, pinned):
+        """
+        Bring the roster, the week's schedule and bookings up to date (queries
+        run outside self._lock), and pin the week (appended to pinned).
+        """
+        # End any snapshot the caller's connection holds so state only moves forward
+        conn.commit()
+        # A replica may trail what the engine already saw on the primary; keep the newer state
+        lagging = getattr(conn, "is_replica", False)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            versions = dict(get_cache_versions(cursor, [ROSTER_SCOPE, week_scope(monday)]))
+            sync_version = get_sync_version(cursor)
+            with self._lock:
+                if self._current(monday, versions, sync_version, lagging):
+                    self._pin(monday, pinned)
+                    return
+
+            with self._refresh_lock:
+                with self._lock:
+                    # Another thread may have caught up while this one waited
+                    if self._current(monday, versions, sync_version, lagging):
+                        self._pin(monday, pinned)
+                        return
+                    known_sync = self.sync_version
+                    cached = list(self.weeks)
+                    schedule = self.weeks.get(monday)
+
+                roster = None
+                if self._outdated(self.roster_version, versions[ROSTER_SCOPE], lagging):
+                    roster = self._fetch_roster(cursor)
+
+                changes = None
+                if not (lagging and known_sync is not None and sync_version < known_sync):
+                    changes = self._fetch_booking_changes(cursor, known_sync, sync_version)
+                reload_weeks = cached if changes == RESET else []
+                if schedule is None:
+                    reload_weeks = reload_weeks + [monday]
+                week_bookings = {week: self._fetch_bookings(cursor, week) for week in reload_weeks}
+
+                if schedule is None or self._outdated(schedule.version, versions[week_scope(monday)], lagging):
+                    schedule = WeekSchedule(monday, versions[week_scope(monday)])
+                    schedule.load(cursor)
+
+                with self._lock:
+                    if roster is not None:
+                        self._set_roster(*roster, versions[ROSTER_SCOPE])
+                    if changes == RESET:
+                        self._reset_bookings(sync_version)
+                    elif changes is not None:
+                        self._apply_booking_changes(*changes, sync_version)
+                    for week, rows in week_bookings.items():
+                        if week == monday or week in self.weeks:  # Unless evicted since
+                            self._load_bookings(week, rows)
+
+                    self.weeks[monday] = schedule
+                    self._pin(monday, pinned)
+                    self._evict()
+        finally:
+            cursor.close()
+            conn.commit()
+
+    def _current(self, monday, versions, sync_version, lagging):
+        """Whether the published state is at least as new as the versions read (call under self._lock)"""
+        schedule = self.weeks.get(monday)
+        if schedule is None or self.sync_version is None:
+            return False
+        if self._outdated(self.roster_version, versions[ROSTER_SCOPE], lagging):
+            return False
+        if self._outdated(schedule.version, versions[week_scope(monday)], lagging):
+            return False
+        return sync_version == self.sync_version or (lagging and sync_version < self.sync_version)
+
+    @staticmethod
+    def _outdated(known, seen, lagging):
+        """Whether state loaded at version `known` must be reloaded after reading version `seen`"""
+        if known is None:
+            return True
+        return seen > known if lagging else seen != known
+
+    def _fetch_roster(self, cursor):
+        """(located agents sorted by latitude, unlocated agents)"""
+        cursor.execute("""
+            SELECT fa.agentId, fa.name, fa.team_id, t.region_id, l.latitude, l.longitude
+            FROM field_agents fa
+            LEFT JOIN teams t ON fa.team_id = t.teamId
+            LEFT JOIN locations l ON fa.location_id = l.id
+        """)
+        located, unlocated = [], []
+        for row in cursor.fetchall():
+            if row["latitude"] is None or row["longitude"] is None:
+                unlocated.append(RosterAgent(row["agentId"], row["name"], row["team_id"], row["region_id"], None, None))
+            else:
+                located.append(RosterAgent(row["agentId"], row["name"], row["team_id"], row["region_id"],
+                                           float(row["latitude"]), float(row["longitude"])))
+        located.sort(key=lambda agent: agent.latitude)
+        return located, unlocated
+
+    def _set_roster(self, located, unlocated, version):
+        self.roster = located
+        self.roster_latitudes = [agent.latitude for agent in located]
+        self.unlocated = unlocated
+        self.roster_version = version
+
+    def _fetch_booking_changes(self, cursor, known_sync, sync_version):
+        """
+        Booking changes since known_sync.
+
+        Returns:
+            None when there are none, RESET when every cached week must be
+            reloaded, else (changed rows, deleted rows)
+        """
+        if known_sync is None or sync_version < known_sync:
+            return RESET
+        if sync_version == known_sync:
+            return None
+        if known_sync < get_pruned_version(cursor):
+            return RESET  # Deletions since known_sync may be gone
+
+        cursor.execute("""
+            SELECT bookingId, agentId, booking_date, booking_time
+            FROM bookings WHERE sync_version > %s LIMIT %s
+        """, (known_sync, MAX_DELTA_SIZE + 1))
+        changed = cursor.fetchall()
+        cursor.execute(
+            "SELECT bookingId FROM booking_deletions WHERE sync_version > %s LIMIT %s",
+            (known_sync, MAX_DELTA_SIZE + 1)
+        )
+        deleted = cursor.fetchall()
+        if len(changed) + len(deleted) > MAX_DELTA_SIZE:
+            return RESET
+        return changed, deleted
+
+    def _fetch_bookings(self, cursor, monday):
+        cursor.execute("""
+            SELECT bookingId, agentId, booking_date, booking_time
+            FROM bookings
+            WHERE booking_date BETWEEN %s AND %s AND agentId IS NOT NULL
+        """, (monday, monday + timedelta(days=6)))
+        return cursor.fetchall()
+
+    def _apply_booking_changes(self, changed, deleted, sync_version):
+        """Replay booking changes made since the last refresh"""
+        touched = set()  # Dates in cached weeks whose bookings changed
+        for row in deleted:
+            touched.add(self._remove_booking(row["bookingId"]))
+        for row in changed:
+            touched.add(self._remove_booking(row["bookingId"]))
+            if week_start(row["booking_date"]) in self.weeks:
+                self._add_booking(row)
+                touched.add(row["booking_date"])
+        for day in touched - {None}:
+            self.date_versions[day] = sync_version
+        self.sync_version = sync_version
+
+    def _reset_bookings(self, sync_version):
+        """Forget all bookings; the refresh reloads every cached week"""
+        self.bookings = {}
+        self.agent_day_bookings = {}
+        self.booked = {}
+        self.sync_version = sync_version
+
+    def _load_bookings(self, monday, rows):
+        self._load_serial += 1
+        self.week_loads[monday] = self._load_serial
+        for row in rows:
+            self._remove_booking(row["bookingId"])
+            self._add_booking(row)
+
+    def _add_booking(self, row):
+        if row["agentId"] is None:
+            return
+        key = (row["agentId"], row["booking_date"])
+        self.bookings[row["bookingId"]] = key
+        self.agent_day_bookings.setdefault(key, {})[row["bookingId"]] = minute_of_day(row["booking_time"])
+        self.booked[key] = self.booked.get(key, 0) | (1 << minute_of_day(row["booking_time"]))
+
+    def _remove_booking(self, booking_id):
+        """Drop a booking; returns the date it was on (None when not tracked)"""
+        key = self.bookings.pop(booking_id, None)
+        if key is None:
+            return None
+        minutes = self.agent_day_bookings[key]
+        del minutes[booking_id]
+        # Rebuild the bitmap; another booking may share the minute
+        bits = 0
+        for minute in minutes.values():
+            bits |= 1 << minute
+        if bits:
+            self.booked[key] = bits
+        else:
+            del self.agent_day_bookings[key]
+            self.booked.pop(key, None)
+        return key[1]
+
+    def _forget_week(self, monday):
+        for booking_id, (_, day) in list(self.bookings.items()):
+            if week_start(day) == monday:
+                self._remove_booking(booking_id)
+        # A reload gets a new serial, so the week's per-date versions can go
+        del self.week_loads[monday]
+        for offset in range(7):
+            self.date_versions.pop(monday + timedelta(days=offset), None)
+
+
+availability_engine = AvailabilityEngine()
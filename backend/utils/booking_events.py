@@ -0,0 +1,129 @@
+"""
+Process-local broker for booking change events (GET /bookings/stream).
+
+One watcher thread per process keeps track of the latest booking sync version
+(see utils.booking_sync) and wakes every open stream when it moves. Writes
+made by this process wake it immediately through notify_booking_change();
+writes made by other gunicorn workers are picked up by polling the single
+counter row, so each process issues at most one cheap query per interval no
+matter how many streams it serves.
+
+Each open stream holds a gunicorn thread, so stream_slots caps how many a
+process serves at once (BOOKING_STREAMS_PER_WORKER); past the cap the route
+answers 503 and the client polls instead.
+"""
+
+import logging
+import threading
+
+from flask import g, has_request_context
+from config import Config
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 1.0
+
+
+class BookingChangeWatcher:
+    """Tracks the latest booking sync version and wakes waiting streams"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL_SECONDS):
+        self.poll_interval = poll_interval
+        self.version = None
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the watcher thread on first use (once per process)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="booking-change-watcher", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Ask the watcher to re-read the version now instead of at the next poll"""
+        self._wakeup.set()
+
+    def wait_for_change(self, known_version, timeout):
+        """
+        Block until the version moves past known_version or timeout elapses.
+
+        Returns:
+            int or None: the latest version seen by the watcher
+        """
+        self.start()
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.version is not None and self.version > known_version,
+                timeout=timeout
+            )
+            return self.version
+
+    def _run(self):
+        while True:
+            try:
+                version = self._read_version()
+                with self._condition:
+                    if version != self.version:
+                        self.version = version
+                        self._condition.notify_all()
+            except Exception as e:
+                logger.warning(f"Booking change watcher failed to read sync version: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    @staticmethod
+    def _read_version():
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT version FROM booking_sync_state WHERE id = 1")
+            row = cursor.fetchone()
+            cursor.close()
+            return row["version"] if row else 0
+        finally:
+            conn.close()
+
+
+booking_watcher = BookingChangeWatcher()
+
+
+class StreamSlots:
+    """Counts the open booking streams of this process against a cap"""
+
+    def __init__(self, max_streams=Config.BOOKING_STREAMS_PER_WORKER):
+        self.max_streams = max_streams
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot; False when max_streams are already open"""
+        with self._lock:
+            if self.open >= self.max_streams:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = StreamSlots()
+
+
+def flag_booking_change():
+    """Remember that the current request changed bookings (notified after the response)"""
+    if has_request_context():
+        g.booking_changed = True
+
+
+def notify_booking_change(response):
+    """after_request hook: wake local streams once the request's transaction is committed"""
+    if g.get("booking_changed"):
+        booking_watcher.notify()
+    return response
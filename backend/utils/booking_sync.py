@@ -0,0 +1,171 @@
+"""
+Change tracking for booking delta sync (GET /bookings?since=<token>).
+
+Every transaction that changes what a booking list row shows stamps the
+affected bookings with a new sync version, and deleted bookings are logged as
+tombstones in booking_deletions. Versions come from the single row in
+booking_sync_state; its row lock is held until commit, so versions become
+visible in commit order and a client holding token N never misses a change
+numbered N or lower.
+
+Call these helpers right before conn.commit() (record_booking_deletions right
+before the DELETE) to keep the counter lock short.
+
+Tombstones are kept for BOOKING_TOMBSTONE_RETENTION_DAYS. record_booking_deletions
+prunes older ones and raises booking_sync_state.pruned_version to the newest
+version it removed; a token below it may have missed a deletion, so delta
+readers treat it like one with too many changes and reload in full.
+"""
+
+from collections import Counter
+
+from config import Config
+from utils.booking_events import flag_booking_change
+from utils.cache_versions import bump_booking_scopes
+from utils.region_counters import adjust_region_counters
+
+MAX_DELTA_SIZE = 1000
+
+
+class InvalidSyncToken(ValueError):
+    """Raised when the ``since`` query parameter is malformed"""
+
+
+def parse_sync_token(value):
+    """Parse the ``since`` query parameter into a version number"""
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        raise InvalidSyncToken("Invalid sync token")
+    if version < 0:
+        raise InvalidSyncToken("Invalid sync token")
+    return version
+
+
+def get_sync_version(cursor):
+    """Latest committed sync version visible to this transaction"""
+    cursor.execute("SELECT version FROM booking_sync_state WHERE id = 1")
+    row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+def get_pruned_version(cursor):
+    """Newest version whose tombstones may have been pruned (tokens below it are expired)"""
+    cursor.execute("SELECT pruned_version FROM booking_sync_state WHERE id = 1")
+    row = cursor.fetchone()
+    return row["pruned_version"] if row else 0
+
+
+def prune_booking_deletions(cursor, retention_days=Config.BOOKING_TOMBSTONE_RETENTION_DAYS,
+                            batch_size=MAX_DELTA_SIZE):
+    """
+    Drop up to batch_size tombstones older than retention_days, oldest first
+    (call with the counter row locked, see record_booking_deletions).
+
+    Returns:
+        int: tombstones removed
+    """
+    # Versions follow deletion time, so the oldest tombstone tells whether any are due
+    cursor.execute("""
+        SELECT deleted_time < NOW() - INTERVAL %s DAY AS expired
+        FROM booking_deletions ORDER BY sync_version LIMIT 1
+    """, (retention_days,))
+    oldest = cursor.fetchone()
+    if not oldest or not oldest["expired"]:
+        return 0
+
+    cursor.execute("""
+        SELECT sync_version FROM booking_deletions
+        WHERE deleted_time < NOW() - INTERVAL %s DAY
+        ORDER BY sync_version LIMIT %s
+    """, (retention_days, batch_size))
+    versions = [row["sync_version"] for row in cursor.fetchall()]
+    if not versions:
+        return 0
+
+    pruned_version = versions[-1]
+    cursor.execute("DELETE FROM booking_deletions WHERE sync_version <= %s", (pruned_version,))
+    removed = cursor.rowcount
+    cursor.execute(
+        "UPDATE booking_sync_state SET pruned_version = GREATEST(pruned_version, %s) WHERE id = 1",
+        (pruned_version,)
+    )
+    return removed
+
+
+def next_sync_version(cursor):
+    """Allocate the next sync version, locking the counter row until commit"""
+    cursor.execute("UPDATE booking_sync_state SET version = LAST_INSERT_ID(version + 1) WHERE id = 1")
+    # LAST_INSERT_ID(expr) is reported back as the statement's insert id
+    return cursor.lastrowid
+
+
+def mark_bookings_changed(cursor, where_clause, params=(), extra_region_ids=(), extra_scopes=(),
+                          booking_count_deltas=None, team_count_deltas=None):
+    """
+    Stamp every booking matching ``where_clause`` with a new sync version and
+    bump the list cache scopes of the regions they are in.
+
+    extra_region_ids (e.g. the region a booking just left) and extra_scopes are
+    bumped in the same statement. booking_count_deltas and team_count_deltas
+    ({region_id: delta}) are applied to the region counters. Rows are locked
+    before the counter so writers always take locks in the same order
+    (bookings, then counter, then region counters, then cache versions).
+
+    Returns:
+        int or None: the new version, or None when no booking matched
+    """
+    cursor.execute(f"SELECT bookingId, region_id FROM bookings WHERE {where_clause} FOR UPDATE", tuple(params))
+    rows = cursor.fetchall()
+    if not rows:
+        adjust_region_counters(cursor, team_count_deltas, booking_count_deltas)
+        if extra_region_ids or extra_scopes:
+            bump_booking_scopes(cursor, extra_region_ids, extra_scopes)
+        return None
+    booking_ids = [row["bookingId"] for row in rows]
+
+    version = next_sync_version(cursor)
+    placeholders = ", ".join(["%s"] * len(booking_ids))
+    cursor.execute(
+        f"UPDATE bookings SET sync_version = %s WHERE bookingId IN ({placeholders})",
+        (version, *booking_ids)
+    )
+    adjust_region_counters(cursor, team_count_deltas, booking_count_deltas)
+    bump_booking_scopes(cursor, [row["region_id"] for row in rows] + list(extra_region_ids), extra_scopes)
+    flag_booking_change()
+    return version
+
+
+def mark_booking_changed(cursor, booking_id, **kwargs):
+    """Stamp a single booking with a new sync version"""
+    return mark_bookings_changed(cursor, "bookingId = %s", (booking_id,), **kwargs)
+
+
+def record_booking_deletions(cursor, booking_ids, extra_scopes=()):
+    """
+    Log tombstones for bookings about to be deleted (call before the DELETE),
+    take them out of their regions' booking counts and prune expired tombstones.
+    """
+    if not booking_ids:
+        return None
+
+    placeholders = ", ".join(["%s"] * len(booking_ids))
+    cursor.execute(
+        f"SELECT region_id FROM bookings WHERE bookingId IN ({placeholders}) FOR UPDATE",
+        tuple(booking_ids)
+    )
+    region_ids = [row["region_id"] for row in cursor.fetchall()]
+
+    version = next_sync_version(cursor)
+    cursor.executemany("""
+        INSERT INTO booking_deletions (bookingId, sync_version)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE sync_version = VALUES(sync_version)
+    """, [(booking_id, version) for booking_id in booking_ids])
+    prune_booking_deletions(cursor)
+    adjust_region_counters(cursor, booking_deltas={
+        region_id: -count for region_id, count in Counter(region_ids).items()
+    })
+    bump_booking_scopes(cursor, region_ids, extra_scopes)
+    flag_booking_change()
+    return version
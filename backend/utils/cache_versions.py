@@ -0,0 +1,120 @@
+"""
+Per-scope version counters backing ETag / If-None-Match on list endpoints.
+
+Writers bump the scopes whose list output they change, inside their own
+transaction. Readers build a strong ETag from the scope versions and can
+answer a matching If-None-Match with 304 before running the list query.
+
+Scopes:
+    regions                 GET /regions (includes team and booking counts)
+    teams                   GET /teams (includes member details)
+    disposition_types       GET /disposition-types
+    bookings:all            every booking
+    bookings:global         bookings in a global region
+    bookings:region:<id>    bookings in one region
+    agents                  field agent names, teams, team regions and locations
+                            (availability engine roster)
+    availability:week:<monday>
+                            timesheets and approved time-off in one week (availability engine)
+    membership              which team each user is in and which region each team is in
+                            (team/region claims in auth tokens, see utils.auth_claims)
+
+Bump scopes as the last statements before commit, after the booking_sync
+helpers (or through their extra_scopes), so locks are always taken in the
+same order.
+"""
+
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+from db import get_db
+from utils.search_cache import flag_cache_bump
+
+
+def bump_cache_versions(cursor, scopes):
+    """Increment the version of each scope (creating missing scopes)"""
+    scopes = sorted(set(scopes))  # Fixed lock order across writers
+    if not scopes:
+        return
+    placeholders = ", ".join(["(%s, 1)"] * len(scopes))
+    cursor.execute(f"""
+        INSERT INTO cache_versions (scope, version) VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, tuple(scopes))
+    flag_cache_bump()
+
+
+def bump_booking_scopes(cursor, region_ids, extra_scopes=()):
+    """Bump the booking list scopes for bookings in the given regions, plus extra_scopes"""
+    region_ids = sorted({region_id for region_id in region_ids if region_id is not None})
+    scopes = ["bookings:all", *extra_scopes] + [f"bookings:region:{region_id}" for region_id in region_ids]
+
+    if region_ids:
+        placeholders = ", ".join(["%s"] * len(region_ids))
+        cursor.execute(
+            f"SELECT regionId FROM regions WHERE regionId IN ({placeholders}) AND is_global = TRUE",
+            tuple(region_ids)
+        )
+        if cursor.fetchall():
+            scopes.append("bookings:global")
+
+    bump_cache_versions(cursor, scopes)
+
+
+def get_cache_versions(cursor, scopes):
+    """Current version of each scope (0 for scopes never bumped)"""
+    placeholders = ", ".join(["%s"] * len(scopes))
+    cursor.execute(f"SELECT scope, version FROM cache_versions WHERE scope IN ({placeholders})", tuple(scopes))
+    versions = {row["scope"]: row["version"] for row in cursor.fetchall()}
+    return [(scope, versions.get(scope, 0)) for scope in scopes]
+
+
+def build_etag(cursor, scopes):
+    """Strong ETag for the current request over the given scopes"""
+    versions = get_cache_versions(cursor, scopes)
+    key = request.full_path + "|" + ";".join(f"{scope}={version}" for scope, version in versions)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def is_not_modified(etag):
+    """True when the client's If-None-Match already holds this ETag"""
+    return request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag):
+    """Empty 304 response carrying the ETag"""
+    response = make_response("", 304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """Attach the ETag to a successful response so browsers revalidate it"""
+    response = make_response(response)
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        # Let the browser cache store it but revalidate on every request
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def versioned_response(*scopes):
+    """
+    Decorator for GET list routes: answer 304 when If-None-Match matches the
+    ETag built from the given scopes, otherwise run the route and tag its response.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Same request connection (and read snapshot) as the list query that follows
+            cursor = get_db().cursor(dictionary=True)
+            try:
+                etag = build_etag(cursor, scopes)
+            finally:
+                cursor.close()
+
+            if is_not_modified(etag):
+                return not_modified_response(etag)
+            return with_etag(f(*args, **kwargs), etag)
+        return decorated_function
+    return decorator
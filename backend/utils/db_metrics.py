@@ -0,0 +1,312 @@
+"""
+Database instrumentation for GET /api/metrics.
+
+Process-local (each gunicorn worker reports its own numbers):
+
+    - pool checkout wait (histogram) and checkouts that timed out
+    - statements per request (histogram, recorded at request teardown)
+    - per-statement latency histograms keyed by a normalized SQL fingerprint
+      (literals and placeholders replaced by ?, IN lists and VALUES rows folded);
+      latency covers execute plus fetching the rows
+    - statements slower than DB_SLOW_QUERY_MS, logged together with their
+      EXPLAIN plan and kept in a short in-memory list
+
+EXPLAIN runs on a background thread with its own connection, at most once per
+fingerprint every EXPLAIN_COOLDOWN_SECONDS, so a slow statement never waits
+for its own plan.
+"""
+
+import logging
+import queue
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+
+from flask import g, has_request_context
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAX_FINGERPRINTS = 500  # Further statements are counted under OTHER_FINGERPRINT
+OTHER_FINGERPRINT = "<other>"
+FINGERPRINT_MAX_LENGTH = 300
+SLOW_QUERY_LOG_SIZE = 50
+EXPLAIN_COOLDOWN_SECONDS = 300
+EXPLAIN_QUEUE_SIZE = 32
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\((?:\?|\?, \.\.\.)\))(?:\s*,\s*\((?:\?|\?, \.\.\.)\))+")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT|REPLACE)\b", re.I)
+_NOT_EXPLAINABLE = re.compile(r"\b(GET_LOCK|RELEASE_LOCK|IS_USED_LOCK|SLEEP)\s*\(", re.I)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalized form of a statement: same query shape, same fingerprint"""
+    sql = _COMMENTS.sub(" ", sql)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _LISTS.sub("(?, ...)", sql)
+    sql = _ROWS.sub(r"\1, ...", sql)
+    return sql[:FINGERPRINT_MAX_LENGTH]
+
+
+class Histogram:
+    """Fixed-bucket histogram (bucket i counts values <= bounds[i]; the last one is +Inf)"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.bounds, self.buckets)},
+                "+Inf": self.buckets[-1]
+            }
+        }
+
+
+class DatabaseMetrics:
+    """Counters shared by all threads of a process"""
+
+    def __init__(self, slow_query_ms=Config.DB_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.started_at = time.time()
+        self.checkout_wait = Histogram(LATENCY_BUCKETS_MS)
+        self.checkout_timeouts = 0
+        self.request_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statements = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait_seconds):
+        with self._lock:
+            self.checkout_wait.observe(wait_seconds * 1000)
+
+    def record_checkout_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def record_statement(self, sql, params, elapsed_seconds):
+        elapsed_ms = elapsed_seconds * 1000
+        key = fingerprint(sql)
+        with self._lock:
+            histogram = self.statements.get(key)
+            if histogram is None:
+                if len(self.statements) >= MAX_FINGERPRINTS:
+                    key = OTHER_FINGERPRINT
+                histogram = self.statements.setdefault(key, Histogram(LATENCY_BUCKETS_MS))
+            histogram.observe(elapsed_ms)
+
+            if elapsed_ms < self.slow_query_ms:
+                return
+            entry = {"fingerprint": key, "ms": round(elapsed_ms, 1), "at": time.time(), "plan": None}
+            self.slow_queries.append(entry)
+
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms): {key}")
+        if Config.DB_EXPLAIN_SLOW_QUERIES:
+            slow_query_explainer.submit(entry, sql, params)
+
+    def record_request(self):
+        """Teardown hook: statements issued by the request that just ended"""
+        with self._lock:
+            self.request_queries.observe(g.pop("query_count", 0))
+
+    def snapshot(self):
+        with self._lock:
+            statements = sorted(
+                ({"fingerprint": key, **histogram.snapshot()} for key, histogram in self.statements.items()),
+                key=lambda row: row["sum"],
+                reverse=True
+            )
+            return {
+                "uptime_seconds": round(time.time() - self.started_at),
+                "checkout_wait_ms": self.checkout_wait.snapshot(),
+                "checkout_timeouts": self.checkout_timeouts,
+                "queries_per_request": self.request_queries.snapshot(),
+                "statements": statements,
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": [dict(entry) for entry in reversed(self.slow_queries)]
+            }
+
+
+class SlowQueryExplainer:
+    """Runs EXPLAIN for slow statements on a background thread and logs the plan"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._explained_at = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry, sql, params):
+        if not _EXPLAINABLE.match(sql) or _NOT_EXPLAINABLE.search(sql):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained_at.get(entry["fingerprint"], -EXPLAIN_COOLDOWN_SECONDS) < EXPLAIN_COOLDOWN_SECONDS:
+                return
+            self._explained_at[entry["fingerprint"]] = now
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slow-query-explainer", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((entry, sql, params))
+        except queue.Full:
+            pass  # Skip plans rather than slow anything down
+
+    def _run(self):
+        while True:
+            entry, sql, params = self._queue.get()
+            try:
+                plan = self._explain(sql, params)
+            except Exception as e:
+                logger.warning(f"EXPLAIN failed for slow query {entry['fingerprint']}: {e}")
+                continue
+            with db_metrics._lock:
+                entry["plan"] = plan
+            logger.warning(f"Slow query ({entry['ms']:.0f} ms): {entry['fingerprint']}\n"
+                           + "\n".join(format_plan_row(row) for row in plan))
+
+    @staticmethod
+    def _explain(sql, params):
+        from db import get_connection  # db imports this module
+
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True, instrumented=False)
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = cursor.fetchall()
+            cursor.close()
+            conn.rollback()
+            return plan
+        finally:
+            conn.close()
+
+
+def format_plan_row(row):
+    return "  " + ", ".join(
+        f"{column}={row.get(column)}"
+        for column in ("id", "select_type", "table", "type", "possible_keys", "key", "rows", "filtered", "Extra")
+        if column in row
+    )
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper timing each statement (execute plus the fetches of its rows).
+
+    A statement is recorded when its rows are exhausted, at the next execute
+    or when the cursor is closed.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pending = None  # [sql, params, elapsed seconds]
+
+    def _flush(self):
+        if self._pending is not None:
+            sql, params, elapsed = self._pending
+            self._pending = None
+            db_metrics.record_statement(sql, params, elapsed)
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - started
+
+    def _start(self, sql, params):
+        self._flush()
+        if has_request_context():
+            g.query_count = g.get("query_count", 0) + 1
+        self._pending = [sql, params, 0.0]
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._start(operation, params)
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params):
+        seq_params = list(seq_params)
+        self._start(operation, seq_params[0] if seq_params else None)
+        return self._timed(self._cursor.executemany, operation, seq_params)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is None:
+            self._flush()
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._cursor.fetchmany, *args, **kwargs)
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._flush()
+        return rows
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+db_metrics = DatabaseMetrics()
+slow_query_explainer = SlowQueryExplainer()
+
+
+def record_request_queries(exception=None):
+    """Teardown hook: count the statements of the request that just ended"""
+    db_metrics.record_request()
@@ -1,7 +1,15 @@
 from functools import wraps
+from collections import OrderedDict
 from flask import request, jsonify
+import hashlib
+import threading
+import time
 import jwt
 from config import Config
+from utils.auth_claims import apply_membership_claims
+
+# Verified tokens remembered per process; each polling tab presents the same cookie
+TOKEN_CACHE_MAX_ENTRIES = 4096
 
 def verify_jwt_token(token: str) -> dict:
     """Verify and decode a JWT token"""
@@ -13,155 +21,118 @@ def verify_jwt_token(token: str) -> dict:
     except jwt.InvalidTokenError as e:
         raise Exception(f"Invalid token: {str(e)}")
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified token payloads, keyed by the token's SHA-256 digest
+    (raw tokens are not kept). An entry is only served until the token's exp.
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> dict:
+        """Payload of a valid token (read-only; shared between requests)"""
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                if payload['exp'] > now:
+                    self._entries.move_to_end(key)
+                    return payload
+                del self._entries[key]
+
+        payload = verify_jwt_token(token)  # Raises for invalid and expired tokens
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = VerifiedTokenCache()
+
+def authorize(allowed_roles=None, missing_token_error="Authentication required",
+              forbidden_error=None, failure_prefix=""):
+    """
+    Shared body of the auth decorators.
+
+    Verifies the auth_token cookie (through token_cache), checks the role,
+    sets request.user_id, request.role, request.token_exp, request.team_id and
+    request.region_id and runs the route. Exceptions answer 401 with failure_prefix + message.
+
+    Args:
+        allowed_roles: roles allowed in (None: any authenticated user)
+        missing_token_error: error text when there is no cookie
+        forbidden_error: error text (403) for a role outside allowed_roles
+        failure_prefix: prefix for the error text of a failed verification
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                token = request.cookies.get('auth_token')
+                if not token:
+                    return jsonify({"success": False, "error": missing_token_error}), 401
+
+                payload = token_cache.verify(token)
+
+                if allowed_roles is not None and payload['role'] not in allowed_roles:
+                    return jsonify({"success": False, "error": forbidden_error}), 403
+
+                # Add user info to request context
+                request.user_id = payload['user_id']
+                request.role = payload['role']
+                request.token_exp = payload['exp']  # For long-lived responses (booking streams)
+                # team_id / region_id from the token claims (see utils.auth_claims)
+                apply_membership_claims(payload)
+
+                return f(*args, **kwargs)
+
+            except Exception as e:
+                return jsonify({"success": False, "error": f"{failure_prefix}{str(e)}"}), 401
+
+        return decorated_function
+    return decorator
+
 def require_auth(f):
     """Decorator to require authentication for routes"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            # Get token from cookie
-            token = request.cookies.get('auth_token')
-            
-            # Debug logging (remove in production)
-            print(f"[DEBUG] Token from cookie: {token[:20] + '...' if token else 'None'}", flush=True)
-            print(f"[DEBUG] All cookies: {request.cookies}", flush=True)
-            
-            if not token:
-                return jsonify({"success": False, "error": "Authentication required - no token"}), 401
-            
-            # Verify token
-            payload = verify_jwt_token(token)
-            
-            # Add user info to request context
-            request.user_id = payload['user_id']
-            request.role = payload['role']
-            
-            print(f"[DEBUG] Auth successful - User ID: {request.user_id}, Role: {request.role}", flush=True)
-            
-            return f(*args, **kwargs)
-            
-        except Exception as e:
-            print(f"[DEBUG] Auth failed: {str(e)}", flush=True)
-            return jsonify({"success": False, "error": f"Authentication failed: {str(e)}"}), 401
-    
-    return decorated_function
+    return authorize(missing_token_error="Authentication required - no token",
+                     failure_prefix="Authentication failed: ")(f)
 
 def require_dispatcher(f):
     """Decorator to require dispatcher role (admin can also access)"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            token = request.cookies.get('auth_token')
-            
-            if not token:
-                return jsonify({"success": False, "error": "Authentication required"}), 401
-            
-            payload = verify_jwt_token(token)
-            
-            if payload['role'] not in ['dispatcher', 'admin']:
-                return jsonify({"success": False, "error": "Dispatcher access required"}), 403
-            
-            request.user_id = payload['user_id']
-            request.role = payload['role']
-            
-            return f(*args, **kwargs)
-            
-        except Exception as e:
-            return jsonify({"success": False, "error": str(e)}), 401
-    
-    return decorated_function
+    return authorize(('dispatcher', 'admin'), forbidden_error="Dispatcher access required")(f)
 
 def require_agent(f):
     """Decorator to require agent role (admin can also access)"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            token = request.cookies.get('auth_token')
-            
-            if not token:
-                return jsonify({"success": False, "error": "Authentication required"}), 401
-            
-            payload = verify_jwt_token(token)
-            
-            if payload['role'] not in ['field_agent', 'admin']:
-                return jsonify({"success": False, "error": "Agent access required"}), 403
-            
-            request.user_id = payload['user_id']
-            request.role = payload['role']
-            
-            return f(*args, **kwargs)
-            
-        except Exception as e:
-            return jsonify({"success": False, "error": str(e)}), 401
-    
-    return decorated_function
+    return authorize(('field_agent', 'admin'), forbidden_error="Agent access required")(f)
 
 def require_admin(f):
     """Decorator to require admin role"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            token = request.cookies.get('auth_token')
-            
-            if not token:
-                return jsonify({"success": False, "error": "Authentication required"}), 401
-            
-            payload = verify_jwt_token(token)
-            
-            if payload['role'] != 'admin':
-                return jsonify({"success": False, "error": "Admin access required"}), 403
-            
-            request.user_id = payload['user_id']
-            request.role = payload['role']
-            
-            return f(*args, **kwargs)
-            
-        except Exception as e:
-            return jsonify({"success": False, "error": str(e)}), 401
-    
-    return decorated_function
+    return authorize(('admin',), forbidden_error="Admin access required")(f)
 
 
 def require_any_role(*allowed_roles):
     """
     Decorator to allow access to users with any of the specified roles.
-    
+
+    Sets request.user_id, request.role, and request.team_id / request.region_id
+    (None for admins and users without a team).
+
     Usage:
         @require_any_role('admin', 'dispatcher')
         @require_any_role('admin', 'dispatcher', 'field_agent')
-        
+
     Args:
         *allowed_roles: Variable number of role strings that are allowed access
     """
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            try:
-                # Get token from cookie (following existing pattern)
-                token = request.cookies.get('auth_token')
-                
-                if not token:
-                    return jsonify({"success": False, "error": "Authentication required"}), 401
-                
-                # Verify token using existing function
-                payload = verify_jwt_token(token)
-                
-                # Check if user role is in allowed roles
-                user_role = payload['role']
-                if user_role not in allowed_roles:
-                    roles_str = ', '.join(allowed_roles)
-                    return jsonify({
-                        "success": False, 
-                        "error": f"Access denied. Required roles: {roles_str}"
-                    }), 403
-                
-                # Add user info to request context
-                request.user_id = payload['user_id']
-                request.role = payload['role']
-                
-                return f(*args, **kwargs)
-                
-            except Exception as e:
-                return jsonify({"success": False, "error": f"Authentication failed: {str(e)}"}), 401
-        
-        return decorated_function
-    return decorator
\ No newline at end of file
+    return authorize(allowed_roles,
+                     forbidden_error=f"Access denied. Required roles: {', '.join(allowed_roles)}",
+                     failure_prefix="Authentication failed: ")
@@ -0,0 +1,247 @@
+"""
+Transactional outbox for booking notifications.
+
+Routes write their notifications with enqueue_notifications() on the cursor of
+the transaction that changes the booking, so they are committed (or rolled
+back) together with it and never delivered from a request thread. The
+notification sender process (notification_sender.py) delivers them:
+
+    claim_batch()     picks up to NOTIFY_OUTBOX_BATCH_SIZE due rows with
+                      SELECT ... FOR UPDATE SKIP LOCKED (several senders never
+                      claim the same row), leases them for
+                      NOTIFY_OUTBOX_LEASE_SECONDS and commits
+    record_results()  marks sent rows, and reschedules failed ones with
+                      exponential backoff (NOTIFY_RETRY_BASE_SECONDS doubled per
+                      attempt, at most NOTIFY_RETRY_MAX_SECONDS) until
+                      NOTIFY_MAX_ATTEMPTS, after which they stay 'failed';
+                      rows refused by a provider guard (circuit open, rate
+                      limited) are deferred without counting the attempt
+
+Delivery is at least once: a sender that dies between sending and recording
+leaves its rows to be claimed again when their lease runs out.
+
+Coalescing: a booking's notifications (creation and update_booking) wait
+NOTIFY_COALESCE_SECONDS before they are due. A newer notification for the same
+booking, channel and recipient written within that window marks the waiting
+one 'superseded' and takes over its due time, so a booking changed several
+times in a row costs one SMS and one email per recipient, carrying its latest
+state.
+"""
+
+import logging
+
+from config import Config
+from utils.provider_guard import ProviderUnavailable
+
+logger = logging.getLogger(__name__)
+
+LAST_ERROR_MAX_LENGTH = 1000
+
+
+def outbox_row(notification: dict):
+    """(channel, recipient, subject, body) of a notification dictionary, or None if it is not deliverable"""
+    if notification['type'] == 'sms' and notification.get('phone'):
+        return ('sms', notification['phone'], None, notification['message'])
+    if notification['type'] == 'email' and notification.get('email'):
+        return ('email', notification['email'], notification['subject'], notification['html_body'])
+    return None
+
+
+def row_notification(row: dict) -> dict:
+    """Notification dictionary (as sent by deliver_notification) of a claimed outbox row"""
+    if row['channel'] == 'sms':
+        return {'type': 'sms', 'phone': row['recipient'], 'message': row['body']}
+    return {'type': 'email', 'email': row['recipient'], 'subject': row['subject'], 'html_body': row['body']}
+
+
+def enqueue_notifications(cursor, notifications: list, booking_id=None,
+                          coalesce_seconds=Config.NOTIFY_COALESCE_SECONDS):
+    """
+    Write notifications to the outbox inside the caller's transaction.
+
+    Args:
+        cursor: dictionary cursor of the transaction that changes the booking (not committed here)
+        notifications: notification dictionaries (see prepare_booking_notifications)
+        booking_id: booking the notifications are about (None: sent as soon as possible, never coalesced)
+        coalesce_seconds: window in which a newer notification replaces an unsent one
+
+    Returns:
+        int: number of rows written
+    """
+    rows = [row for row in map(outbox_row, notifications) if row is not None]
+    if not rows:
+        return 0
+
+    if booking_id is None or coalesce_seconds <= 0:
+        cursor.executemany("""
+            INSERT INTO notification_outbox (channel, recipient, subject, body, booking_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [row + (booking_id,) for row in rows])
+        return len(rows)
+
+    # Never-claimed notifications of this booking (a claimed one is already being sent)
+    cursor.execute("""
+        SELECT id, channel, recipient, next_attempt_at
+        FROM notification_outbox
+        WHERE booking_id = %s AND status = 'pending' AND attempts = 0
+        FOR UPDATE
+    """, (booking_id,))
+    waiting = {}
+    for row in cursor.fetchall():
+        waiting.setdefault((row['channel'], row['recipient']), []).append(row)
+
+    superseded = []
+    values = []
+    for channel, recipient, subject, body in rows:
+        earlier = waiting.pop((channel, recipient), [])
+        superseded.extend(row['id'] for row in earlier)
+        due = min((row['next_attempt_at'] for row in earlier), default=None)  # The window started with the first one
+        values.append((channel, recipient, subject, body, booking_id, due, coalesce_seconds))
+
+    if superseded:
+        placeholders = ", ".join(["%s"] * len(superseded))
+        cursor.execute(f"""
+            UPDATE notification_outbox SET status = 'superseded'
+            WHERE id IN ({placeholders})
+        """, superseded)
+    cursor.executemany("""
+        INSERT INTO notification_outbox (channel, recipient, subject, body, booking_id, next_attempt_at)
+        VALUES (%s, %s, %s, %s, %s, COALESCE(%s, NOW() + INTERVAL %s SECOND))
+    """, values)
+    return len(rows)
+
+
+def retry_delay(attempts, base=Config.NOTIFY_RETRY_BASE_SECONDS, cap=Config.NOTIFY_RETRY_MAX_SECONDS):
+    """Seconds before the next attempt of a row that has failed `attempts` times"""
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+
+def claim_batch(conn, channel=None, limit=Config.NOTIFY_OUTBOX_BATCH_SIZE,
+                lease_seconds=Config.NOTIFY_OUTBOX_LEASE_SECONDS):
+    """
+    Claim due pending rows and commit the claim.
+
+    The claimed rows count one more attempt and are not due again before the
+    lease runs out, so the row locks are only held for the claim itself.
+
+    Args:
+        conn: connection (committed here)
+        channel: 'sms' or 'email' (None: both)
+        limit: most rows claimed
+
+    Returns:
+        list: claimed rows (id, channel, recipient, subject, body, attempts)
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        channel_filter = "AND channel = %s" if channel else ""
+        cursor.execute(f"""
+            SELECT id, channel, recipient, subject, body, attempts
+            FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW() {channel_filter}
+            ORDER BY next_attempt_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (channel, limit) if channel else (limit,))
+        rows = cursor.fetchall()
+        if rows:
+            placeholders = ", ".join(["%s"] * len(rows))
+            cursor.execute(f"""
+                UPDATE notification_outbox
+                SET attempts = attempts + 1, next_attempt_at = NOW() + INTERVAL %s SECOND
+                WHERE id IN ({placeholders})
+            """, (lease_seconds, *[row['id'] for row in rows]))
+            for row in rows:
+                row['attempts'] += 1
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def record_results(conn, results, max_attempts=Config.NOTIFY_MAX_ATTEMPTS):
+    """
+    Record the outcome of a claimed batch.
+
+    Args:
+        conn: connection (committed here)
+        results: (row, error) pairs for the claimed rows; error None when sent,
+            ProviderUnavailable when the send was refused before going out
+
+    Returns:
+        tuple: (sent, retried, failed, deferred) counts
+    """
+    sent = [(row['id'],) for row, error in results if error is None]
+    retried = []
+    failed = []
+    deferred = []
+    for row, error in results:
+        if error is None:
+            continue
+        if isinstance(error, ProviderUnavailable):
+            deferred.append((max(round(error.retry_after), 1), row['id']))
+            continue
+        error = str(error)[:LAST_ERROR_MAX_LENGTH]
+        if row['attempts'] >= max_attempts:
+            failed.append((error, row['id']))
+            logger.error(f"Notification {row['id']} ({row['channel']}) failed after {row['attempts']} attempts: {error}")
+        else:
+            retried.append((retry_delay(row['attempts']), error, row['id']))
+
+    cursor = conn.cursor()
+    try:
+        if sent:
+            cursor.executemany("""
+                UPDATE notification_outbox
+                SET status = 'sent', sent_time = NOW(), last_error = NULL
+                WHERE id = %s
+            """, sent)
+        if retried:
+            cursor.executemany("""
+                UPDATE notification_outbox
+                SET next_attempt_at = NOW() + INTERVAL %s SECOND, last_error = %s
+                WHERE id = %s
+            """, retried)
+        if failed:
+            cursor.executemany("""
+                UPDATE notification_outbox
+                SET status = 'failed', last_error = %s
+                WHERE id = %s
+            """, failed)
+        if deferred:
+            cursor.executemany("""
+                UPDATE notification_outbox
+                SET attempts = attempts - 1, next_attempt_at = NOW() + INTERVAL %s SECOND
+                WHERE id = %s
+            """, deferred)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(sent), len(retried), len(failed), len(deferred)
+
+
+def outbox_stats(cursor):
+    """Row counts per status (superseded: suppressed by coalescing) and the age of the oldest due notification"""
+    cursor.execute("""
+        SELECT status, COUNT(*) AS count FROM notification_outbox GROUP BY status
+    """)
+    counts = {row['status']: row['count'] for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT TIMESTAMPDIFF(SECOND, MIN(next_attempt_at), NOW()) AS oldest_due_seconds
+        FROM notification_outbox
+        WHERE status = 'pending' AND next_attempt_at <= NOW()
+    """)
+    oldest = cursor.fetchone()['oldest_due_seconds']
+    return {
+        "pending": counts.get('pending', 0),
+        "sent": counts.get('sent', 0),
+        "failed": counts.get('failed', 0),
+        "superseded": counts.get('superseded', 0),  # Replaced by a newer notification before being sent
+        "oldest_due_seconds": oldest
+    }
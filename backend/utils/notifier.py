@@ -6,10 +6,34 @@ ENVIRONMENT-AWARE BEHAVIOR:
 - Development/Test: Only logs notifications without sending
 
 This prevents accidental notifications during development and testing.
+
+CONNECTIONS:
+- Email: each sending thread keeps its SMTP session (opened through
+  mail.connect()) for SMTP_MAX_IDLE_SECONDS and SMTP_MAX_EMAILS_PER_CONNECTION
+  messages; a session the server dropped is reopened and the message resent once.
+- SMS: one Twilio client per process over a pooled HTTP session; it is rebuilt
+  after a connection error.
+- SMTP_HOST / SMTP_PORT / SMTP_USE_TLS and TWILIO_API_URL can point at local
+  stubs for testing (see benchmarks/notification_connections.py).
+
+PROVIDER GUARDS:
+- Sends go through utils.provider_guard (circuit breaker and rate limit per
+  provider) and raise ProviderUnavailable when refused; only outages
+  (connection errors, timeouts, transient answers) count against the breaker.
+  Routes never call these directly: notifications go through the outbox and
+  the notification sender process (see utils.async_notifier).
 """
 
+import os
+import smtplib
+import threading
+import time
+from requests.exceptions import ConnectionError as HTTPConnectionError, RequestException
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from config import Config
+from utils.provider_guard import email_guard, sms_guard
 from flask_mail import Message
 from extensions import mail
 import logging
@@ -17,6 +41,133 @@ import logging
 # Set up logger
 logger = logging.getLogger(__name__)
 
+
+def is_disconnect(error):
+    """Whether an SMTP error means the session is gone (421: the server is closing it)"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 421
+
+
+def is_smtp_outage(error):
+    """Whether an email failure is the server's (counted by the breaker) rather than the message's"""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500  # Transient: try again later
+    if isinstance(error, smtplib.SMTPException):  # SMTP errors are OSErrors too
+        return isinstance(error, smtplib.SMTPServerDisconnected)
+    return isinstance(error, OSError)  # Connection errors and timeouts
+
+
+def is_twilio_outage(error):
+    """Whether an SMS failure is Twilio's (counted by the breaker) rather than the message's"""
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, RequestException)  # Connection errors and timeouts
+
+
+class SMTPConnections:
+    """Long-lived SMTP sessions, one per sending thread (smtplib is not thread-safe)"""
+
+    def __init__(self, max_idle_seconds=Config.SMTP_MAX_IDLE_SECONDS, timeout=Config.SMTP_TIMEOUT_SECONDS):
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _open(self):
+        connection = mail.connect()
+        connection.host = None if connection.mail.suppress else self._connect(connection.mail)
+        connection.num_emails = 0
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self, state):
+        """Connection.configure_host with the timeout applied to connecting as well"""
+        smtp = smtplib.SMTP_SSL if state.use_ssl else smtplib.SMTP
+        host = smtp(state.server, state.port, timeout=self.timeout)
+        host.set_debuglevel(int(state.debug))
+        if state.use_tls:
+            host.starttls()
+        if state.username and state.password:
+            host.login(state.username, state.password)
+        return host
+
+    def _current(self):
+        """This thread's session, unless it is missing, idle for too long or inherited from a parent process"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            return None
+        if self._local.pid != os.getpid():
+            self._local.connection = None  # The socket belongs to the parent process
+            return None
+        if time.monotonic() - self._local.last_used > self.max_idle_seconds:
+            self.close()
+            return None
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None and connection.host is not None:
+            try:
+                connection.host.quit()
+            except Exception:
+                connection.host.close()
+
+    def send(self, message):
+        """Send on this thread's session (call inside an app context)"""
+        while True:
+            connection = self._current()
+            reused = connection is not None
+            if connection is None:
+                connection = self._open()
+            if connection.host is not None and connection.host.sock is not None:
+                connection.host.sock.settimeout(self.timeout)  # Also covers sessions renewed after MAIL_MAX_EMAILS
+            try:
+                connection.send(message)
+            except Exception as e:
+                self.close()
+                if reused and is_disconnect(e):
+                    continue  # The server dropped the idle session before the message went out
+                raise
+            self._local.last_used = time.monotonic()
+            return
+
+
+class TwilioClientPool:
+    """One Twilio client per process, reusing its HTTP connections"""
+
+    def __init__(self, timeout=Config.TWILIO_HTTP_TIMEOUT):
+        self.timeout = timeout
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                client = Client(
+                    Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN,
+                    http_client=TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+                )
+                if Config.TWILIO_API_URL:
+                    client.api.base_url = Config.TWILIO_API_URL
+                self._client = client
+                self._pid = os.getpid()
+            return self._client
+
+    def reset(self, client):
+        """Drop a client whose connections failed (the next send builds a new one)"""
+        with self._lock:
+            if self._client is client:
+                self._client = None
+
+
+smtp_connections = SMTPConnections()
+twilio_clients = TwilioClientPool()
+
 def is_production_environment() -> bool:
     """
     Check if the current environment is production.
@@ -39,6 +190,9 @@ def send_email(to_email: str, subject: str, html_body: str, text_body: str = Non
 
     Returns:
         bool: True if email sent successfully (or logged in dev), False otherwise
+
+    Raises:
+        ProviderUnavailable: circuit open or rate limited (nothing was sent)
     """
     # Check if we're in production environment
     if not is_production_environment():
@@ -47,6 +201,7 @@ def send_email(to_email: str, subject: str, html_body: str, text_body: str = Non
         print(f"[DEV] EMAIL (not sent) - To: {to_email}, Subject: {subject}", flush=True)
         return True
     
+    email_guard.acquire()
     try:
         msg = Message(
             subject=subject,
@@ -54,13 +209,18 @@ def send_email(to_email: str, subject: str, html_body: str, text_body: str = Non
             body=text_body or "",
             html=html_body
         )
-        mail.send(msg)
+        smtp_connections.send(msg)
+        email_guard.record_success()
 
         logger.info(f"[PROD] Email sent to {to_email}")
         print(f"[PROD] Email sent to {to_email}", flush=True)
         return True
 
     except Exception as e:
+        if is_smtp_outage(e):
+            email_guard.record_failure()
+        else:
+            email_guard.record_success()
         logger.error(f"[PROD] Failed to send email: {e}")
         print(f"[ERROR] Failed to send email: {e}", flush=True)
         return False
@@ -77,6 +237,9 @@ def send_sms(to_phone: str, message: str) -> bool:
         
     Returns:
         bool: True if SMS sent successfully (or logged in dev), False otherwise
+
+    Raises:
+        ProviderUnavailable: circuit open or rate limited (nothing was sent)
     """
     # Check if we're in production environment
     if not is_production_environment():
@@ -85,17 +248,25 @@ def send_sms(to_phone: str, message: str) -> bool:
         print(f"[DEV] SMS (not sent) - To: {to_phone}, Message: {message}", flush=True)
         return True
     
+    client = twilio_clients.get()
+    sms_guard.acquire()
     try:
-        client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
         msg = client.messages.create(
             body=message,
             from_=Config.TWILIO_PHONE_NUMBER,
             to=to_phone
         )
+        sms_guard.record_success()
         logger.info(f"[PROD] SMS sent to {to_phone}, SID: {msg.sid}")
         print(f"[PROD] SMS sent to {to_phone}, SID: {msg.sid}", flush=True)
         return True
     except Exception as e:
+        if isinstance(e, HTTPConnectionError):
+            twilio_clients.reset(client)  # Not resent here: the message may have been accepted
+        if is_twilio_outage(e):
+            sms_guard.record_failure()
+        else:
+            sms_guard.record_success()
         logger.error(f"[PROD] Failed to send SMS to {to_phone}: {e}")
         print(f"[ERROR] Failed to send SMS to {to_phone}: {e}", flush=True)
         return False
\ No newline at end of file
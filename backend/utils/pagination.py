@@ -0,0 +1,93 @@
+"""
+Keyset (cursor-based) pagination helpers for booking list endpoints.
+
+Bookings are ordered by (booking_date, booking_time, bookingId). A page is
+fetched with a WHERE clause that starts strictly after the last row of the
+previous page, so every page is an index range scan no matter how deep the
+client has paged. The position is handed to clients as an opaque
+``next_cursor`` token.
+"""
+
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidPageRequest(ValueError):
+    """Raised when a cursor or page size in the query string is malformed"""
+
+
+def encode_cursor(booking):
+    """Build the opaque cursor token pointing just after the given (serialized) booking"""
+    position = [booking["booking_date"], booking["booking_time"], booking["bookingId"]]
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Decode a cursor token into a (booking_date, booking_time, bookingId) tuple"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        booking_date, booking_time, booking_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(booking_date), str(booking_time), int(booking_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidPageRequest("Invalid cursor")
+
+
+def parse_page_size(value):
+    """Parse the ``limit`` query parameter, applying the default and the cap"""
+    if value is None or value == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidPageRequest("limit must be an integer")
+    if limit < 1:
+        raise InvalidPageRequest("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def get_page_request(args):
+    """
+    Read ``cursor`` and ``limit`` from request args.
+
+    Returns:
+        tuple: (position or None, limit)
+    """
+    cursor_token = args.get("cursor")
+    position = decode_cursor(cursor_token) if cursor_token else None
+    return position, parse_page_size(args.get("limit"))
+
+
+def keyset_condition(position):
+    """
+    SQL condition (and params) selecting bookings strictly after ``position``.
+
+    Expanded form of (booking_date, booking_time, bookingId) > (%s, %s, %s) so
+    MySQL can use a range scan on the composite index.
+    """
+    booking_date, booking_time, booking_id = position
+    condition = """(b.booking_date > %s OR (b.booking_date = %s AND (
+                b.booking_time > %s OR (b.booking_time = %s AND b.bookingId > %s))))"""
+    return condition, [booking_date, booking_date, booking_time, booking_time, booking_id]
+
+
+KEYSET_ORDER_BY = " ORDER BY b.booking_date, b.booking_time, b.bookingId LIMIT %s"
+
+
+def split_page(rows, limit):
+    """
+    Trim the look-ahead row fetched with LIMIT limit + 1.
+
+    Rows must already be serialized so the cursor holds JSON-safe values.
+
+    Returns:
+        tuple: (rows for this page, next_cursor or None)
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,192 @@
+"""
+Background job behind POST /api/hash-existing-passwords.
+
+Hashes the plain text passwords left in dispatchers, field_agents and admins.
+Each table is walked in primary key order in batches of
+PASSWORD_REHASH_BATCH_SIZE rows: the batch is hashed across a dedicated
+process pool, written back with one executemany UPDATE and committed together
+with the table's checkpoint in password_rehash_progress. A run that dies
+(deploy, crash, restart) resumes after the last committed batch the next time
+the job is started.
+
+Only one run at a time across all workers: the job thread holds the MySQL
+named lock REHASH_LOCK_NAME on its connection for as long as it runs.
+"""
+
+import logging
+import threading
+
+from config import Config
+from db import get_connection, get_db
+from utils.passwords import PasswordHasher
+
+logger = logging.getLogger(__name__)
+
+REHASH_TABLES = (
+    ('dispatchers', 'dispatcherId'),
+    ('field_agents', 'agentId'),
+    ('admins', 'adminId'),
+)
+REHASH_LOCK_NAME = "dispatch_tool.password_rehash"
+PLAINTEXT_MAX_LENGTH = 50  # Assume it's not hashed if less than 50 chars
+
+
+def is_plaintext(password):
+    return len(password) < PLAINTEXT_MAX_LENGTH
+
+
+class PasswordRehashJob:
+    """Starts the rehash thread and reports progress"""
+
+    def __init__(self, batch_size=Config.PASSWORD_REHASH_BATCH_SIZE, workers=Config.PASSWORD_REHASH_WORKERS):
+        self.batch_size = batch_size
+        self.workers = workers
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, restart=False):
+        """
+        Start (or resume) the job in a background thread of this process.
+
+        Args:
+            restart: forget the checkpoints and walk every table again
+
+        Returns:
+            bool: False if a run is already in progress (in any worker)
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+
+            conn = get_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (REHASH_LOCK_NAME,))
+                if not cursor.fetchone()['acquired']:
+                    cursor.close()
+                    conn.close()
+                    return False
+                if restart:
+                    cursor.execute("DELETE FROM password_rehash_progress")
+                    conn.commit()
+                cursor.close()
+            except Exception:
+                conn.close()
+                raise
+
+            # The thread owns the connection (and with it the named lock) from here
+            self._thread = threading.Thread(target=self._run, args=(conn,), name="password-rehash", daemon=True)
+            self._thread.start()
+            return True
+
+    def status(self):
+        """Whether a run is in progress and the checkpoint of each table"""
+        cursor = get_db().cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT IS_USED_LOCK(%s) AS holder", (REHASH_LOCK_NAME,))
+            running = cursor.fetchone()['holder'] is not None
+            cursor.execute("""
+                SELECT table_name, last_id, rows_scanned, rows_hashed,
+                       completed_time, last_error, started_time, updated_time
+                FROM password_rehash_progress
+            """)
+            progress = {row['table_name']: row for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+        tables = []
+        for table, _ in REHASH_TABLES:
+            row = progress.get(table) or {"table_name": table, "last_id": 0, "rows_scanned": 0, "rows_hashed": 0}
+            for field in ('completed_time', 'started_time', 'updated_time'):
+                row[field] = row[field].isoformat() if row.get(field) else None
+            row.setdefault('last_error', None)
+            row['completed'] = row['completed_time'] is not None
+            tables.append(row)
+
+        return {
+            "running": running,
+            "completed": all(row['completed'] for row in tables),
+            "tables": tables
+        }
+
+    def _run(self, conn):
+        hasher = PasswordHasher(workers=self.workers, queue_limit=1,
+                                rounds=Config.BCRYPT_ROUNDS, timeout=Config.PASSWORD_HASH_TIMEOUT)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            for table, id_column in REHASH_TABLES:
+                try:
+                    self._rehash_table(conn, cursor, hasher, table, id_column)
+                except Exception as e:
+                    conn.rollback()
+                    logger.exception(f"Password rehash of {table} failed")
+                    cursor.execute(
+                        "UPDATE password_rehash_progress SET last_error = %s WHERE table_name = %s",
+                        (str(e), table)
+                    )
+                    conn.commit()
+                    return
+        except Exception:
+            logger.exception("Password rehash job failed")
+        finally:
+            hasher.shutdown()
+            try:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (REHASH_LOCK_NAME,))
+                cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+
+    def _rehash_table(self, conn, cursor, hasher, table, id_column):
+        cursor.execute("""
+            INSERT INTO password_rehash_progress (table_name) VALUES (%s)
+            ON DUPLICATE KEY UPDATE last_error = NULL
+        """, (table,))
+        cursor.execute(
+            "SELECT last_id, completed_time FROM password_rehash_progress WHERE table_name = %s",
+            (table,)
+        )
+        checkpoint = cursor.fetchone()
+        conn.commit()
+        if checkpoint['completed_time'] is not None:
+            return
+
+        last_id = checkpoint['last_id']
+        while True:
+            cursor.execute(f"""
+                SELECT {id_column} AS id, password FROM {table}
+                WHERE {id_column} > %s
+                ORDER BY {id_column}
+                LIMIT %s
+            """, (last_id, self.batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            plain = [row for row in rows if is_plaintext(row['password'])]
+            hashed_count = 0
+            if plain:
+                hashes = hasher.hash_many(row['password'] for row in plain)
+                # Matching on the old value skips passwords changed while the batch was hashed
+                cursor.executemany(
+                    f"UPDATE {table} SET password = %s WHERE {id_column} = %s AND password = %s",
+                    [(hashed, row['id'], row['password']) for hashed, row in zip(hashes, plain)]
+                )
+                hashed_count = cursor.rowcount
+
+            last_id = rows[-1]['id']
+            cursor.execute("""
+                UPDATE password_rehash_progress
+                SET last_id = %s, rows_scanned = rows_scanned + %s, rows_hashed = rows_hashed + %s
+                WHERE table_name = %s
+            """, (last_id, len(rows), hashed_count, table))
+            conn.commit()
+
+        cursor.execute(
+            "UPDATE password_rehash_progress SET completed_time = CURRENT_TIMESTAMP WHERE table_name = %s",
+            (table,)
+        )
+        conn.commit()
+
+
+password_rehash_job = PasswordRehashJob()
@@ -0,0 +1,113 @@
+"""
+Password hashing and verification off the request threads.
+
+bcrypt is deliberately slow, so a burst of logins at shift start used to tie
+up every gunicorn thread. Hashing and verification now run in a small
+process pool (PASSWORD_HASH_WORKERS per gunicorn worker) and at most
+PASSWORD_QUEUE_LIMIT operations may be running or queued per process; past
+that, PasswordServiceBusy is raised and the route answers 503 right away, so
+the remaining threads keep serving other traffic.
+
+New hashes use BCRYPT_ROUNDS; existing hashes keep the cost they were made with.
+"""
+
+import multiprocessing
+import os
+import threading
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from flask import jsonify
+from config import Config
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many password operations are already in progress"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+class PasswordHasher:
+    """Bounded bcrypt process pool shared by the request threads of a process"""
+
+    def __init__(self, workers, queue_limit, rounds, timeout):
+        self.workers = workers
+        self.rounds = rounds
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Created on first use in each gunicorn worker; children are spawned, not
+        # forked, so they do not inherit the worker's threads and connections
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordServiceBusy("Too many password operations in progress, please retry shortly")
+        try:
+            return self._executor().submit(fn, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordServiceBusy("Password service timed out, please retry shortly")
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None  # Recreated on next use
+            raise
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(_check, password, hashed)
+
+    def hash_many(self, passwords) -> list:
+        """Hash a batch across all pool processes (bulk jobs; not subject to the queue limit)"""
+        passwords = list(passwords)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._executor().map(_hash, passwords, repeat(self.rounds), chunksize=chunksize))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+
+password_hasher = PasswordHasher(
+    workers=Config.PASSWORD_HASH_WORKERS,
+    queue_limit=Config.PASSWORD_QUEUE_LIMIT,
+    rounds=Config.BCRYPT_ROUNDS,
+    timeout=Config.PASSWORD_HASH_TIMEOUT
+)
+
+
+def hash_password(password: str) -> str:
+    """Hash a password using bcrypt (in the password pool)"""
+    return password_hasher.hash(password)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    """Verify a password against its hash (in the password pool)"""
+    return password_hasher.verify(password, hashed)
+
+
+def password_service_busy_response(error):
+    """503 answer for PasswordServiceBusy, asking the client to retry"""
+    return jsonify({"success": False, "error": str(error)}), 503, {"Retry-After": "1"}
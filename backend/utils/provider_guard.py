@@ -0,0 +1,176 @@
+"""
+Circuit breaker and token-bucket rate limit per notification provider.
+
+send_sms and send_email go through a ProviderGuard each (sms_guard /
+email_guard). Only the notification sender process sends, so that is where
+the limits hold; with several senders running, each gets the full rate, so
+divide the rates by their number. acquire() refuses a send with
+ProviderUnavailable instead of letting it wait on the network when:
+
+    - the circuit is open: NOTIFY_BREAKER_FAILURES provider failures in a row
+      (connection errors, timeouts, 5xx / 4xx-transient answers) open it for
+      NOTIFY_BREAKER_RESET_SECONDS; then a single trial send decides whether
+      it closes again or stays open for another period
+    - the bucket is empty: at most <PROVIDER>_RATE_PER_SECOND sends, with
+      bursts of <PROVIDER>_RATE_BURST
+
+ProviderUnavailable carries retry_after; the notification sender defers the
+outbox row by that long without counting an attempt.
+"""
+
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """The guard refused a send; try again after retry_after seconds"""
+
+    def __init__(self, provider, reason, retry_after):
+        super().__init__(f"{provider} {reason}, retry in {retry_after:.1f}s")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Tokens refill at `rate` per second up to `burst` (not thread-safe: used under ProviderGuard's lock)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0: one is)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker (not thread-safe: used under ProviderGuard's lock)"""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def wait_time(self):
+        """Seconds until a send may go out (0: now)"""
+        if self.state == OPEN:
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and self._trial_in_flight:
+            return 1.0
+        return 0.0
+
+    def start(self):
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure opened the circuit"""
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            opened = self.state != OPEN
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            return opened
+        return False
+
+
+class ProviderGuard:
+    """Breaker and rate limit in front of one provider"""
+
+    def __init__(self, name, rate, burst, failure_threshold=Config.NOTIFY_BREAKER_FAILURES,
+                 reset_seconds=Config.NOTIFY_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self.rejected_open = 0
+        self.rejected_rate = 0
+
+    def wait_time(self):
+        """Seconds until acquire() would succeed (0: now)"""
+        with self._lock:
+            return max(self.breaker.wait_time(), self.bucket.wait_time())
+
+    def available(self):
+        """Sends acquire() would allow right now"""
+        with self._lock:
+            if self.breaker.wait_time():
+                return 0
+            self.bucket.wait_time()  # Refill
+            return 1 if self.breaker.state == HALF_OPEN else int(self.bucket.tokens)
+
+    def acquire(self):
+        """Take a send slot or raise ProviderUnavailable"""
+        with self._lock:
+            wait = self.breaker.wait_time()
+            if wait:
+                self.rejected_open += 1
+                raise ProviderUnavailable(self.name, "circuit open", wait)
+            wait = self.bucket.wait_time()
+            if wait:
+                self.rejected_rate += 1
+                raise ProviderUnavailable(self.name, "rate limited", wait)
+            self.bucket.take()
+            self.breaker.start()
+
+    def record_success(self):
+        with self._lock:
+            self.breaker.record_success()
+
+    def record_failure(self):
+        with self._lock:
+            opened = self.breaker.record_failure()
+        if opened:
+            logger.error(f"{self.name} circuit opened for {self.breaker.reset_seconds}s "
+                         f"after {self.breaker.failures} failures")
+
+    def stats(self):
+        with self._lock:
+            self.breaker.wait_time()  # Moves an expired open circuit to half-open
+            self.bucket.wait_time()
+            return {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "tokens": round(self.bucket.tokens, 2),
+                "rate_per_second": self.bucket.rate,
+                "rejected_open": self.rejected_open,
+                "rejected_rate": self.rejected_rate
+            }
+
+
+sms_guard = ProviderGuard("sms", Config.SMS_RATE_PER_SECOND, Config.SMS_RATE_BURST)
+email_guard = ProviderGuard("email", Config.EMAIL_RATE_PER_SECOND, Config.EMAIL_RATE_BURST)
+provider_guards = {"sms": sms_guard, "email": email_guard}
@@ -0,0 +1,55 @@
+"""
+Per-region team and booking counts shown by GET /regions.
+
+region_counters holds one row per region and is adjusted in the same
+transaction as every write that adds, removes or moves a team or a booking,
+so the region list reads its counts instead of running COUNT(*) per region.
+
+Booking counts are adjusted through the booking_sync helpers
+(mark_bookings_changed takes the deltas, record_booking_deletions derives
+them), which keeps the lock order bookings, sync counter, region counters,
+cache versions. Team-only writes call adjust_region_counters() directly,
+right before bumping cache versions.
+"""
+
+from collections import Counter
+
+
+def region_move(old_region_id, new_region_id, count=1):
+    """Deltas for `count` rows leaving one region for another (either may be None)"""
+    deltas = Counter()
+    if old_region_id == new_region_id:
+        return deltas
+    if old_region_id is not None:
+        deltas[old_region_id] -= count
+    if new_region_id is not None:
+        deltas[new_region_id] += count
+    return deltas
+
+
+def adjust_region_counters(cursor, team_deltas=None, booking_deltas=None):
+    """
+    Add per-region deltas to the team and booking counts.
+
+    Args:
+        team_deltas: {region_id: change in team count}
+        booking_deltas: {region_id: change in booking count}
+    """
+    team_deltas, booking_deltas = team_deltas or {}, booking_deltas or {}
+    region_ids = sorted({  # Fixed lock order across writers
+        region_id for region_id in (*team_deltas, *booking_deltas)
+        if region_id is not None and (team_deltas.get(region_id) or booking_deltas.get(region_id))
+    })
+    if not region_ids:
+        return
+
+    params = []
+    for region_id in region_ids:
+        params.extend([region_id, team_deltas.get(region_id, 0), booking_deltas.get(region_id, 0)])
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(region_ids))
+    cursor.execute(f"""
+        INSERT INTO region_counters (region_id, team_count, booking_count) VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            team_count = team_count + VALUES(team_count),
+            booking_count = booking_count + VALUES(booking_count)
+    """, tuple(params))
@@ -0,0 +1,128 @@
+"""
+Process-local cache of GET /search results.
+
+Entries are keyed by (team, booking_date, start minute, booking_type,
+rounded coordinates, radius, limit) and hold the response body together with
+the availability engine stamp it was computed from (utils.availability).
+
+A lookup is answered without touching MySQL while the entry is younger than
+SEARCH_CACHE_TTL_SECONDS and nothing that could affect it has been seen
+since it was stored:
+
+    - no booking was committed anywhere: the booking change watcher
+      (utils.booking_events) still reports the same sync version
+    - this process committed no write that bumped a cache version
+      (timesheets, time-off, roster, bookings)
+
+Otherwise the entry is revalidated: the engine refreshes and the entry is
+kept if the stamp for its date is unchanged, so a booking, timesheet or
+time-off change only throws away results for the dates and week it touched.
+Timesheet, time-off and roster writes handled by other workers are not
+broadcast; the TTL bounds how long they can go unseen.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+
+from utils.booking_events import booking_watcher
+
+SEARCH_CACHE_TTL_SECONDS = 15
+SEARCH_CACHE_MAX_ENTRIES = 2048
+COORDINATE_DECIMALS = 3  # About 100 m; searches closer than that share an entry
+
+
+class SearchCacheEntry:
+    __slots__ = ("stored_at", "stamp", "result", "generation", "watch_version")
+
+    def __init__(self, stored_at, stamp, result, generation, watch_version):
+        self.stored_at = stored_at
+        self.stamp = stamp
+        self.result = result
+        self.generation = generation
+        self.watch_version = watch_version
+
+
+class SearchCache:
+    """LRU of search results shared by all request threads of a process"""
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0  # Bumped by local writes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(team_id, booking_date, minute, booking_type, origin, max_distance_km, limit):
+        """Cache key; origin is rounded to COORDINATE_DECIMALS (None for virtual bookings)"""
+        if origin is not None:
+            origin = round_origin(origin)
+        return (team_id, booking_date, minute, booking_type, origin, max_distance_km, limit)
+
+    def snapshot(self):
+        """
+        What has been seen so far; take it before reading state from MySQL
+        so a change made meanwhile is never attributed to the entry.
+        """
+        booking_watcher.start()
+        return self.generation, booking_watcher.version
+
+    def get(self, key, snapshot):
+        """
+        Look up an entry.
+
+        Returns:
+            tuple: (result or None, entry to revalidate or None). A result is
+            only returned when it can be served without touching MySQL.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            if time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                return None, None
+            self._entries.move_to_end(key)
+            if snapshot[1] is not None and (entry.generation, entry.watch_version) == snapshot:
+                return entry.result, None
+            return None, entry
+
+    def put(self, key, snapshot, stamp, result):
+        with self._lock:
+            self._entries[key] = SearchCacheEntry(time.monotonic(), stamp, result, *snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def confirm(self, entry, snapshot):
+        """Mark a revalidated entry as current (its TTL keeps running)"""
+        with self._lock:
+            entry.generation, entry.watch_version = snapshot
+
+    def invalidate(self):
+        """Force every entry through revalidation on its next lookup"""
+        with self._lock:
+            self.generation += 1
+
+
+def round_origin(origin):
+    return (round(origin[0], COORDINATE_DECIMALS), round(origin[1], COORDINATE_DECIMALS))
+
+
+search_cache = SearchCache()
+
+
+def flag_cache_bump():
+    """Remember that the current request bumped cache versions (handled after the response)"""
+    if has_request_context():
+        g.cache_bumped = True
+
+
+def expire_search_cache(response):
+    """after_request hook: revalidate cached searches once the request's writes are committed"""
+    if g.get("cache_bumped"):
+        search_cache.invalidate()
+    return response
@@ -30,25 +30,201 @@ export interface Booking {
   booking_type?: 'physical' | 'virtual';
 }
 
-export async function getAllBookings(regionId?: number): Promise<Booking[]> {
-  const url = regionId ? `${BASE_URL}/bookings?region_id=${regionId}` : `${BASE_URL}/bookings`;
-  const res = await authenticatedFetch(url);
+interface BookingPages {
+  bookings: Booking[];
+  syncToken: string | null;
+}
 
-  if (!res.ok) {
+// Booking lists are paginated server-side; follow next_cursor until the last page
+async function fetchAllBookingPages(url: string, handleError: (res: Response) => never): Promise<BookingPages> {
+  const bookings: Booking[] = [];
+  let syncToken: string | null = null;
+  let cursor: string | null = null;
+
+  do {
+    const pageUrl: string = cursor
+      ? `${url}${url.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(cursor)}`
+      : url;
+    const res = await authenticatedFetch(pageUrl);
+
+    if (!res.ok) {
+      handleError(res);
+    }
+
+    const result = await res.json();
+    if (!result.success) {
+      return { bookings, syncToken };
+    }
+    bookings.push(...result.data);
+    // The first page's token covers every change made while the later pages load
+    syncToken = syncToken ?? res.headers.get("X-Sync-Token");
+    cursor = result.next_cursor ?? null;
+  } while (cursor);
+
+  return { bookings, syncToken };
+}
+
+// Delta sync state for getAllBookings, keyed by list URL
+interface BookingSyncState {
+  token: string;
+  bookings: Map<number, Booking>;
+}
+
+const bookingSyncStates = new Map<string, BookingSyncState>();
+
+export function resetBookingSync(): void {
+  bookingSyncStates.clear();
+}
+
+function compareBookings(a: Booking, b: Booking): number {
+  return a.booking_date.localeCompare(b.booking_date)
+    || a.booking_time.localeCompare(b.booking_time)
+    || a.bookingId - b.bookingId;
+}
+
+function bookingListUrl(regionId?: number): string {
+  return regionId ? `${BASE_URL}/bookings?region_id=${regionId}` : `${BASE_URL}/bookings`;
+}
+
+function syncedBookings(state: BookingSyncState): Booking[] {
+  return [...state.bookings.values()].sort(compareBookings);
+}
+
+export async function getAllBookings(regionId?: number): Promise<Booking[]> {
+  const url = bookingListUrl(regionId);
+  const handleError = (res: Response): never => {
     if (res.status === 401) {
       throw new Error("Authentication required");
     }
     throw new Error("Failed to fetch bookings");
+  };
+
+  // After the first load, only fetch what changed since the last sync token
+  const state = bookingSyncStates.get(url);
+  if (state) {
+    const res = await authenticatedFetch(
+      `${url}${url.includes("?") ? "&" : "?"}since=${encodeURIComponent(state.token)}`
+    );
+
+    // 410 means the token can no longer be served incrementally; reload below
+    if (!res.ok && res.status !== 410) {
+      handleError(res);
+    }
+
+    if (res.ok) {
+      const result = await res.json();
+      if (result.success) {
+        for (const booking of result.data as Booking[]) {
+          state.bookings.set(booking.bookingId, booking);
+        }
+        for (const bookingId of result.deleted as number[]) {
+          state.bookings.delete(bookingId);
+        }
+        state.token = result.sync_token;
+        return syncedBookings(state);
+      }
+    }
   }
 
-  const result = await res.json();
-  return result.success ? result.data : [];
+  const { bookings, syncToken } = await fetchAllBookingPages(url, handleError);
+  if (syncToken) {
+    bookingSyncStates.set(url, {
+      token: syncToken,
+      bookings: new Map(bookings.map((booking) => [booking.bookingId, booking])),
+    });
+  } else {
+    bookingSyncStates.delete(url);
+  }
+
+  return bookings;
 }
 
-export async function getAgentBookings(agentId: number): Promise<Booking[]> {
-  const res = await authenticatedFetch(`${BASE_URL}/agents/${agentId}/bookings`);
+// Receive getAllBookings updates over Server-Sent Events instead of polling.
+// Returns an unsubscribe function; onClosed fires if the server refuses the stream.
+export function subscribeToBookings(
+  regionId: number | undefined,
+  onBookings: (bookings: Booking[]) => void,
+  onClosed: () => void
+): () => void {
+  const url = bookingListUrl(regionId);
+  let source: EventSource | null = null;
+  let unsubscribed = false;
 
-  if (!res.ok) {
+  const open = async () => {
+    // Events are applied on top of a synced list, so load one first if needed
+    if (!bookingSyncStates.has(url)) {
+      const bookings = await getAllBookings(regionId);
+      if (!unsubscribed) {
+        onBookings(bookings);
+      }
+    }
+    const initialState = bookingSyncStates.get(url);
+    if (unsubscribed || !initialState) {
+      if (!initialState) {
+        onClosed();
+      }
+      return;
+    }
+
+    const params = new URLSearchParams({ since: initialState.token });
+    if (regionId) {
+      params.set("region_id", String(regionId));
+    }
+    source = new EventSource(`${BASE_URL}/bookings/stream?${params}`, { withCredentials: true });
+
+    source.addEventListener("booking", (event) => {
+      const booking: Booking = JSON.parse((event as MessageEvent).data);
+      bookingSyncStates.get(url)?.bookings.set(booking.bookingId, booking);
+    });
+
+    source.addEventListener("booking_deleted", (event) => {
+      const { bookingId } = JSON.parse((event as MessageEvent).data);
+      bookingSyncStates.get(url)?.bookings.delete(bookingId);
+    });
+
+    source.addEventListener("sync", (event) => {
+      const state = bookingSyncStates.get(url);
+      if (state) {
+        state.token = JSON.parse((event as MessageEvent).data).sync_token;
+        onBookings(syncedBookings(state));
+      }
+    });
+
+    source.addEventListener("resync", async () => {
+      bookingSyncStates.delete(url);
+      try {
+        const bookings = await getAllBookings(regionId);
+        if (!unsubscribed) {
+          onBookings(bookings);
+        }
+      } catch (err) {
+        console.error("Error reloading bookings:", err);
+      }
+    });
+
+    source.onerror = () => {
+      // EventSource reconnects on its own (resuming from Last-Event-ID) unless the server refused it
+      if (source?.readyState === EventSource.CLOSED && !unsubscribed) {
+        onClosed();
+      }
+    };
+  };
+
+  open().catch((err) => {
+    console.error("Error opening booking stream:", err);
+    if (!unsubscribed) {
+      onClosed();
+    }
+  });
+
+  return () => {
+    unsubscribed = true;
+    source?.close();
+  };
+}
+
+export async function getAgentBookings(agentId: number): Promise<Booking[]> {
+  const { bookings } = await fetchAllBookingPages(`${BASE_URL}/agents/${agentId}/bookings`, (res) => {
     if (res.status === 401) {
       throw new Error("Authentication required");
     }
@@ -59,16 +235,13 @@ export async function getAgentBookings(agentId: number): Promise<Booking[]> {
       throw new Error("Agent not found");
     }
     throw new Error("Failed to fetch bookings");
-  }
+  });
 
-  const result = await res.json();
-  return result.success ? result.data : [];
+  return bookings;
 }
 
 export async function getDispatcherBookings(dispatcherId: number): Promise<Booking[]> {
-  const res = await authenticatedFetch(`${BASE_URL}/dispatchers/${dispatcherId}/bookings`);
-
-  if (!res.ok) {
+  const { bookings } = await fetchAllBookingPages(`${BASE_URL}/dispatchers/${dispatcherId}/bookings`, (res) => {
     if (res.status === 401) {
       throw new Error("Authentication required");
     }
@@ -79,10 +252,9 @@ export async function getDispatcherBookings(dispatcherId: number): Promise<Booki
       throw new Error("Dispatcher not found");
     }
     throw new Error("Failed to fetch dispatcher bookings");
-  }
+  });
 
-  const result = await res.json();
-  return result.success ? result.data : [];
+  return bookings;
 }
 
 export async function updateBooking(bookingId: number, updates: { 
@@ -183,6 +355,83 @@ export async function searchAgents(params: {
   return Array.isArray(result) ? result : (result.success ? result.data : []);
 }
 
+export interface AvailabilityDay {
+  date: string;
+  counts: number[];    // Available agents per slot, aligned with AvailabilityGrid.slots
+  agents: number[][];  // Available agent IDs per slot
+}
+
+export interface AvailabilityGrid {
+  from: string;
+  to: string;
+  slot_minutes: number;
+  slots: string[];     // Slot start times (HH:MM:SS)
+  days: AvailabilityDay[];
+}
+
+export async function getAvailability(params: {
+  from: string;
+  to: string;
+  team_id?: number;
+  region_id?: number;
+}): Promise<AvailabilityGrid> {
+  const queryParams = new URLSearchParams();
+  queryParams.append('from', params.from);
+  queryParams.append('to', params.to);
+  if (params.team_id) queryParams.append('team_id', params.team_id.toString());
+  if (params.region_id) queryParams.append('region_id', params.region_id.toString());
+  const res = await authenticatedFetch(`${BASE_URL}/availability?${queryParams.toString()}`);
+
+  if (!res.ok) {
+    if (res.status === 401) {
+      throw new Error("Authentication required");
+    }
+    throw new Error("Failed to load availability");
+  }
+
+  const { success, ...grid } = await res.json();
+  if (!success) throw new Error("Failed to load availability");
+  return grid;
+}
+
+export interface AssignmentPlan {
+  booking_date: string;
+  committed: boolean;
+  assignments: {
+    bookingId: number;
+    booking_time: string;
+    customer_name: string;
+    agentId: number;
+    agent_name: string;
+    distance: number | null;
+  }[];
+  unassigned: { bookingId: number; booking_time: string; customer_name: string }[];
+  total_distance_km: number;
+}
+
+export async function optimizeAssignments(params: {
+  booking_date: string;
+  region_id?: number;
+  team_id?: number;
+  commit?: boolean;
+  assignments?: { bookingId: number; agentId: number }[];
+}): Promise<AssignmentPlan> {
+  const res = await authenticatedFetch(`${BASE_URL}/assignments/optimize`, {
+    method: "POST",
+    body: JSON.stringify(params),
+  });
+
+  const result = await res.json();
+  if (!res.ok || !result.success) {
+    if (res.status === 401) {
+      throw new Error("Authentication required");
+    }
+    throw new Error(result.error || "Failed to optimize assignments");
+  }
+
+  return result;
+}
+
 export async function deleteBooking(bookingId: number): Promise<{ success: boolean; message?: string; error?: string }> {
   const res = await authenticatedFetch(`${BASE_URL}/bookings/${bookingId}`, {
     method: 'DELETE',
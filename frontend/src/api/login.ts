@@ -1,3 +1,5 @@
+import { resetBookingSync } from "./crud";
+
 const BASE_URL = import.meta.env.VITE_BASE_API_URL;
 console.log('LOGIN API - BASE_URL:', BASE_URL);
 console.log('LOGIN API - All env vars:', import.meta.env);
@@ -20,10 +22,14 @@ export async function login(email: string, password: string, role: "dispatcher"
     throw new Error("Login failed");
   }
 
+  resetBookingSync();
   return res.json();
 }
 
 export async function logout(): Promise<void> {
+  // Cached booking lists belong to the signed-in user
+  resetBookingSync();
+
   const res = await fetch(`${BASE_URL}/logout`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
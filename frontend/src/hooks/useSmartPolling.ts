@@ -1,8 +1,16 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
 import { type Booking } from '../api/crud';
 
+type SubscribeFunction = (
+  onData: (data: Booking[]) => void,
+  onClosed: () => void
+) => () => void;
+
 interface UseSmartPollingOptions {
   fetchFunction: () => Promise<Booking[]>;
+  // When given, updates are pushed through this subscription and interval polling
+  // only runs as a fallback after the subscription closes
+  subscribe?: SubscribeFunction;
   pollingInterval?: number;
   onLogout: () => void;
   enabled?: boolean;
@@ -20,6 +28,7 @@ interface UseSmartPollingReturn {
 
 export function useSmartPolling({
   fetchFunction,
+  subscribe,
   pollingInterval = 30000,
   onLogout,
   enabled = true
@@ -86,12 +95,13 @@ export function useSmartPolling({
       pauseTimeoutRef.current = undefined;
     }
     
-    if (!intervalRef.current && enabled) {
+    // With a subscription the effect re-subscribes once isPaused flips back
+    if (!intervalRef.current && enabled && !subscribe) {
       intervalRef.current = setInterval(() => {
         fetchData();
       }, pollingInterval);
     }
-  }, [fetchData, pollingInterval, enabled]);
+  }, [fetchData, subscribe, pollingInterval, enabled]);
 
   const pausePolling = useCallback(() => {
     setIsPaused(true);
@@ -140,21 +150,36 @@ export function useSmartPolling({
       return;
     }
 
-    // Set up polling interval
-    console.log("Setting up polling interval:", pollingInterval);
-    intervalRef.current = setInterval(() => {
-      console.log("Interval tick - fetching data");
-      fetchData();
-    }, pollingInterval);
+    const startInterval = () => {
+      if (intervalRef.current || !mountedRef.current) return;
+      console.log("Setting up polling interval:", pollingInterval);
+      intervalRef.current = setInterval(() => {
+        console.log("Interval tick - fetching data");
+        fetchData();
+      }, pollingInterval);
+    };
+
+    // Prefer pushed updates; fall back to polling if the stream is unavailable
+    let unsubscribe: (() => void) | undefined;
+    if (subscribe) {
+      unsubscribe = subscribe((result) => {
+        if (mountedRef.current) {
+          setData(result);
+        }
+      }, startInterval);
+    } else {
+      startInterval();
+    }
 
     return () => {
       console.log("Cleaning up interval");
+      unsubscribe?.();
       if (intervalRef.current) {
         clearInterval(intervalRef.current);
         intervalRef.current = undefined;
       }
     };
-  }, [fetchData, pollingInterval, enabled, isPaused]);
+  }, [fetchData, subscribe, pollingInterval, enabled, isPaused]);
 
   // Cleanup on unmount
   useEffect(() => {
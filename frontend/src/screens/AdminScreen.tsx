@@ -7,7 +7,7 @@ import AppointmentCard from "../components/AppointmentCard";
 import NewAppointmentModal from "../components/NewAppointmentModal";
 import AdminManagement from "../components/AdminManagement";
 import TimeOffManagement from "../components/TimeOffManagement";
-import { getAllBookings } from "../api/crud";
+import { getAllBookings, subscribeToBookings, type Booking } from "../api/crud";
 import { FormControl, InputLabel, Select, MenuItem } from "@mui/material";
 import { useSmartPolling } from "../hooks/useSmartPolling";
 
@@ -61,6 +61,13 @@ export default function AdminScreen({ onLogout }: AdminScreenProps) {
   const fetchBookingsWithRegion = useCallback(() => {
     return getAllBookings(selectedRegionFilter === 'all' ? undefined : selectedRegionFilter);
   }, [selectedRegionFilter]);
+
+  const subscribeBookingsWithRegion = useCallback(
+    (onData: (data: Booking[]) => void, onClosed: () => void) => subscribeToBookings(
+      selectedRegionFilter === 'all' ? undefined : selectedRegionFilter, onData, onClosed
+    ),
+    [selectedRegionFilter]
+  );
   
   const {
     data: bookings,
@@ -71,6 +78,7 @@ export default function AdminScreen({ onLogout }: AdminScreenProps) {
     resumePolling
   } = useSmartPolling({
     fetchFunction: fetchBookingsWithRegion,
+    subscribe: subscribeBookingsWithRegion,
     onLogout
   });
 
@@ -8,7 +8,7 @@ import NewAppointmentModal from "../components/NewAppointmentModal";
 import TimeOffManagement from "../components/TimeOffManagement";
 import TimesheetManagement from "../components/TimesheetManagement";
 import TimesheetHistory from "../components/TimesheetHistory";
-import { getAllBookings, getDispatcherBookings, updateBooking, saveDisposition, type Booking } from "../api/crud";
+import { getAllBookings, getDispatcherBookings, subscribeToBookings, updateBooking, saveDisposition, type Booking } from "../api/crud";
 import { useSmartPolling } from "../hooks/useSmartPolling";
 
 interface DispatcherScreenProps {
@@ -20,6 +20,12 @@ export default function DispatcherScreen({ dispatcherId, onLogout }: DispatcherS
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [tabValue, setTabValue] = useState(0);
   
+  // Region bookings are pushed over the booking stream
+  const subscribeAllBookings = useCallback(
+    (onData: (data: Booking[]) => void, onClosed: () => void) => subscribeToBookings(undefined, onData, onClosed),
+    []
+  );
+
   const {
     data: bookings,
     loading,
@@ -29,6 +35,7 @@ export default function DispatcherScreen({ dispatcherId, onLogout }: DispatcherS
     resumePolling
   } = useSmartPolling({
     fetchFunction: getAllBookings,
+    subscribe: subscribeAllBookings,
     onLogout
   });
 
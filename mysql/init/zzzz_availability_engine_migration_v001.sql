@@ -0,0 +1,21 @@
+-- Availability Engine Migration v001
+-- Description: Adds an index for loading a week of approved time-off into the
+--              in-memory availability engine behind GET /api/search
+-- Date: 2026-10-16
+-- Rollback: DROP INDEX idx_time_off_status_date ON time_off_requests;
+
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'time_off_requests'
+    AND index_name = 'idx_time_off_status_date');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_time_off_status_date ON time_off_requests(status, request_date)',
+    'SELECT "Index idx_time_off_status_date already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+SELECT "Availability engine migration completed successfully" as migration_status;
@@ -0,0 +1,55 @@
+-- Booking Delta Sync Migration v001
+-- Description: Adds change tracking for GET /api/bookings?since=<token>.
+--              bookings.sync_version is stamped from a single counter row on every
+--              change, and deleted bookings are logged as tombstones.
+-- Date: 2026-10-16
+-- Rollback: DROP TABLE booking_deletions; DROP TABLE booking_sync_state;
+--           DROP INDEX idx_bookings_sync_version ON bookings;
+--           ALTER TABLE bookings DROP COLUMN sync_version;
+
+-- Counter handing out sync versions (single row, id = 1)
+CREATE TABLE IF NOT EXISTS booking_sync_state (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO booking_sync_state (id, version) VALUES (1, 0);
+
+-- Tombstones for deleted bookings
+CREATE TABLE IF NOT EXISTS booking_deletions (
+    bookingId INT PRIMARY KEY,
+    sync_version BIGINT NOT NULL,
+    deleted_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_booking_deletions_version (sync_version)
+);
+
+-- Version of the last change to each booking (0 = unchanged since tracking began)
+SET @column_exists = (SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'bookings'
+    AND column_name = 'sync_version');
+
+SET @column_sql = IF(@column_exists = 0,
+    'ALTER TABLE bookings ADD COLUMN sync_version BIGINT NOT NULL DEFAULT 0 COMMENT ''Version of the last change, see booking_sync_state''',
+    'SELECT "Column sync_version already exists" as status'
+);
+
+PREPARE column_stmt FROM @column_sql;
+EXECUTE column_stmt;
+DEALLOCATE PREPARE column_stmt;
+
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'bookings'
+    AND index_name = 'idx_bookings_sync_version');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_bookings_sync_version ON bookings(sync_version)',
+    'SELECT "Index idx_bookings_sync_version already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+SELECT "Booking delta sync migration completed successfully" as migration_status;
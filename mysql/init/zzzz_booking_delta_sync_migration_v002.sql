@@ -0,0 +1,22 @@
+-- Booking Delta Sync Migration v002
+-- Description: Tombstone retention. Deleted-booking tombstones older than
+--              BOOKING_TOMBSTONE_RETENTION_DAYS are pruned; pruned_version is
+--              the newest version removed, and older sync tokens get 410.
+-- Date: 2026-10-16
+-- Rollback: ALTER TABLE booking_sync_state DROP COLUMN pruned_version;
+
+SET @column_exists = (SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'booking_sync_state'
+    AND column_name = 'pruned_version');
+
+SET @column_sql = IF(@column_exists = 0,
+    'ALTER TABLE booking_sync_state ADD COLUMN pruned_version BIGINT NOT NULL DEFAULT 0 COMMENT ''Newest version whose tombstones may be pruned''',
+    'SELECT "Column pruned_version already exists" as status'
+);
+
+PREPARE column_stmt FROM @column_sql;
+EXECUTE column_stmt;
+DEALLOCATE PREPARE column_stmt;
+
+SELECT "Booking delta sync v002 migration completed successfully" as migration_status;
@@ -0,0 +1,54 @@
+-- Booking Pagination Migration v001
+-- Description: Adds composite indexes backing keyset pagination of booking lists,
+--              ordered by (booking_date, booking_time, bookingId)
+-- Date: 2026-10-16
+-- Rollback: DROP INDEX idx_bookings_keyset ON bookings;
+--           DROP INDEX idx_bookings_agent_keyset ON bookings;
+--           DROP INDEX idx_bookings_dispatcher_keyset ON bookings;
+
+-- Index for GET /api/bookings (all bookings, optionally filtered by region)
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'bookings'
+    AND index_name = 'idx_bookings_keyset');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_bookings_keyset ON bookings(booking_date, booking_time, bookingId)',
+    'SELECT "Index idx_bookings_keyset already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+-- Index for GET /api/agents/{agentId}/bookings
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'bookings'
+    AND index_name = 'idx_bookings_agent_keyset');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_bookings_agent_keyset ON bookings(agentId, booking_date, booking_time, bookingId)',
+    'SELECT "Index idx_bookings_agent_keyset already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+-- Index for GET /api/dispatchers/{dispatcherId}/bookings
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'bookings'
+    AND index_name = 'idx_bookings_dispatcher_keyset');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_bookings_dispatcher_keyset ON bookings(dispatcherId, booking_date, booking_time, bookingId)',
+    'SELECT "Index idx_bookings_dispatcher_keyset already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+SELECT "Booking pagination migration completed successfully" as migration_status;
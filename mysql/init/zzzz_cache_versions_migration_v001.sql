@@ -0,0 +1,14 @@
+-- Cache Versions Migration v001
+-- Description: Adds per-scope version counters used to build ETags for list endpoints
+--              (bookings per region, regions, teams, disposition types)
+-- Date: 2026-10-16
+-- Rollback: DROP TABLE cache_versions;
+
+-- One row per cache scope, bumped in the same transaction as the write it covers
+CREATE TABLE IF NOT EXISTS cache_versions (
+    scope VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+SELECT "Cache versions migration completed successfully" as migration_status;
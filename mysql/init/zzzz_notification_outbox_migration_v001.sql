@@ -0,0 +1,24 @@
+-- Notification Outbox Migration v001
+-- Description: Notifications written in the same transaction as the booking
+--              change that causes them, and delivered (with retries) by the
+--              separate notification sender process (backend/notification_sender.py).
+-- Date: 2026-10-16
+-- Rollback: DROP TABLE notification_outbox;
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    channel ENUM('sms', 'email') NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NULL,
+    body TEXT NOT NULL,
+    booking_id INT NULL,
+    status ENUM('pending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT NULL,
+    created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_time DATETIME NULL,
+    INDEX idx_notification_outbox_due (status, next_attempt_at)
+);
+
+SELECT "Notification outbox migration completed successfully" as migration_status;
@@ -0,0 +1,39 @@
+-- Notification Outbox Migration v002
+-- Description: Coalescing window. A newer notification for the same booking,
+--              channel and recipient marks the unsent older one 'superseded'.
+-- Date: 2026-10-16
+-- Rollback: DROP INDEX idx_notification_outbox_booking ON notification_outbox;
+--           UPDATE notification_outbox SET status = 'sent' WHERE status = 'superseded';
+--           ALTER TABLE notification_outbox MODIFY COLUMN status ENUM('pending', 'sent', 'failed') NOT NULL DEFAULT 'pending';
+
+SET @status_exists = (SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'notification_outbox'
+    AND column_name = 'status'
+    AND column_type LIKE '%''superseded''%');
+
+SET @status_sql = IF(@status_exists = 0,
+    'ALTER TABLE notification_outbox MODIFY COLUMN status ENUM(''pending'', ''sent'', ''failed'', ''superseded'') NOT NULL DEFAULT ''pending''',
+    'SELECT "Status superseded already exists" as status'
+);
+
+PREPARE status_stmt FROM @status_sql;
+EXECUTE status_stmt;
+DEALLOCATE PREPARE status_stmt;
+
+-- Pending notifications of a booking, looked up on every enqueue
+SET @index_exists = (SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE()
+    AND table_name = 'notification_outbox'
+    AND index_name = 'idx_notification_outbox_booking');
+
+SET @index_sql = IF(@index_exists = 0,
+    'CREATE INDEX idx_notification_outbox_booking ON notification_outbox(booking_id, status)',
+    'SELECT "Index idx_notification_outbox_booking already exists" as status'
+);
+
+PREPARE index_stmt FROM @index_sql;
+EXECUTE index_stmt;
+DEALLOCATE PREPARE index_stmt;
+
+SELECT "Notification outbox v002 migration completed successfully" as migration_status;
@@ -0,0 +1,19 @@
+-- Password Rehash Migration v001
+-- Description: Checkpoints for the background job behind
+--              POST /api/hash-existing-passwords, one row per user table,
+--              so an interrupted run resumes after the last committed batch.
+-- Date: 2026-10-16
+-- Rollback: DROP TABLE password_rehash_progress;
+
+CREATE TABLE IF NOT EXISTS password_rehash_progress (
+    table_name VARCHAR(64) PRIMARY KEY,
+    last_id INT NOT NULL DEFAULT 0,
+    rows_scanned INT NOT NULL DEFAULT 0,
+    rows_hashed INT NOT NULL DEFAULT 0,
+    completed_time TIMESTAMP NULL,
+    last_error TEXT NULL,
+    started_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+SELECT "Password rehash migration completed successfully" as migration_status;
@@ -0,0 +1,25 @@
+-- Region Counters Migration v001
+-- Description: Adds per-region team and booking counts for GET /api/regions,
+--              maintained by the application on every team and booking write
+--              instead of a COUNT(*) per region on each request.
+-- Date: 2026-10-16
+-- Rollback: DROP TABLE region_counters;
+
+CREATE TABLE IF NOT EXISTS region_counters (
+    region_id INT PRIMARY KEY,
+    team_count INT NOT NULL DEFAULT 0,
+    booking_count INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (region_id) REFERENCES regions(regionId) ON DELETE CASCADE
+);
+
+-- Backfill from the live tables (re-running recounts)
+INSERT INTO region_counters (region_id, team_count, booking_count)
+SELECT r.regionId,
+       (SELECT COUNT(*) FROM teams t WHERE t.region_id = r.regionId),
+       (SELECT COUNT(*) FROM bookings b WHERE b.region_id = r.regionId)
+FROM regions r
+ON DUPLICATE KEY UPDATE
+    team_count = VALUES(team_count),
+    booking_count = VALUES(booking_count);
+
+SELECT "Region counters migration completed successfully" as migration_status;